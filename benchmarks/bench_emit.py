@@ -0,0 +1,105 @@
+# Throughput of the text emitter on deeply nested and very wide trees, against a
+# recursive writer that does one write call per line (the previous output_parse).
+#
+# > python3 -m benchmarks.bench_emit
+
+import argparse
+import io
+import time
+
+from tph_parser import (
+    AssignNode, BinOpNode, IDNode, NumberNode, PropNode, RegisterOpNode, TokenType, TupleNode, WhileNode,
+    token_names, write_ast
+)
+
+def recursive_output(node, depth, out_file):
+    pad = '  ' * depth
+    cls = type(node)
+    if cls is NumberNode:
+        out_file.write(pad + f"NumberNode(value={node.value})\n")
+    elif cls is IDNode:
+        out_file.write(pad + f"IDNode(name={node.name})\n")
+    elif cls is BinOpNode:
+        out_file.write(pad + f"BinOpNode(operator={token_names[node.operator]})\n")
+        out_file.write('  ' * (depth + 1) + "left:\n")
+        recursive_output(node.left, depth + 2, out_file)
+        out_file.write('  ' * (depth + 1) + "right:\n")
+        recursive_output(node.right, depth + 2, out_file)
+    elif cls is AssignNode:
+        out_file.write(pad + "AssignNode(=)\n")
+        out_file.write('  ' * (depth + 1) + "variable:\n")
+        recursive_output(node.variable, depth + 2, out_file)
+        out_file.write('  ' * (depth + 1) + "expression:\n")
+        recursive_output(node.expression, depth + 2, out_file)
+    elif cls is WhileNode:
+        out_file.write(pad + "WhileNode\n")
+        out_file.write('  ' * (depth + 1) + "condition:\n")
+        recursive_output(node.condition, depth + 2, out_file)
+        out_file.write('  ' * (depth + 1) + "statements:\n")
+        for stmt in node.statements:
+            recursive_output(stmt, depth + 2, out_file)
+    elif cls is RegisterOpNode:
+        out_file.write(pad + f"RegisterOpNode({node.op_name})\n")
+        out_file.write('  ' * (depth + 1) + "operation_type:\n")
+        recursive_output(node.id_name, depth + 2, out_file)
+        out_file.write('  ' * (depth + 1) + "properties:\n")
+        for prop in node.props:
+            recursive_output(prop, depth + 2, out_file)
+    elif cls is PropNode:
+        out_file.write(pad + "PropNode\n")
+        out_file.write('  ' * (depth + 1) + "name:\n")
+        recursive_output(node.name, depth + 2, out_file)
+        out_file.write('  ' * (depth + 1) + "value:\n")
+        recursive_output(node.value, depth + 2, out_file)
+    elif cls is TupleNode:
+        out_file.write(pad + "TupleNode\n")
+        out_file.write('  ' * (depth + 1) + "values:\n")
+        for value in node.values:
+            recursive_output(value, depth + 2, out_file)
+
+def deep_tree(length):
+    # i = i + 1 + 1 + ... as parse_expr builds it, a left-deep BinOpNode chain
+    expression = IDNode("i")
+    for _ in range(length):
+        expression = BinOpNode(expression, TokenType.PLUS, NumberNode(1.0))
+    return [WhileNode(IDNode("i"), [AssignNode(IDNode("i"), expression)])]
+
+def wide_tree(statements, tuple_length):
+    return [RegisterOpNode("register_op", IDNode("Conv"), [
+                PropNode(IDNode("kernel"), TupleNode([NumberNode(float(i)) for i in range(tuple_length)])),
+                PropNode(IDNode("stride"), NumberNode(1.0))])
+            for _ in range(statements)]
+
+def measure(write, statements):
+    out_file = io.StringIO()
+    start = time.perf_counter()
+    try:
+        write(statements, out_file)
+    except RecursionError:
+        return None, 0
+    return time.perf_counter() - start, out_file.tell()
+
+def write_recursive(statements, out_file):
+    for node in statements:
+        recursive_output(node, 0, out_file)
+        out_file.write("\n")
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Text emitter throughput")
+    arg_parse.add_argument("--depth", type=int, default=5000, help="Length of the BinOpNode chain")
+    arg_parse.add_argument("--statements", type=int, default=20000, help="Statements in the wide tree")
+    arg_parse.add_argument("--tuple-length", type=int, default=64, help="Numbers per tuple in the wide tree")
+    args = arg_parse.parse_args()
+
+    trees = (("deep", deep_tree(args.depth)), ("wide", wide_tree(args.statements, args.tuple_length)))
+    print(f"{'tree':6} {'writer':10} {'seconds':>9} {'MB/s':>8}")
+    for name, statements in trees:
+        for writer_name, write in (("recursive", write_recursive), ("emitter", write_ast)):
+            seconds, size = measure(write, statements)
+            if seconds is None:
+                print(f"{name:6} {writer_name:10} {'RecursionError':>18}")
+            else:
+                print(f"{name:6} {writer_name:10} {seconds:9.3f} {size / seconds / 1e6:8.1f}")
+
+if __name__ == "__main__":
+    main()
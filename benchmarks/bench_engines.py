@@ -0,0 +1,55 @@
+# Parse time of the recursive-descent Parser against the table-driven LL1Parser,
+# per workload, to pick the faster engine for an input shape.
+#
+# > python3 -m benchmarks.bench_engines
+
+import argparse
+import gc
+import time
+
+from benchmarks.bench_lists import prop_tokens, tuple_tokens
+from benchmarks.bench_memory import synthetic_program
+from tph_ll1 import LL1Parser, default_table
+from tph_parser import Parser, tokenize_source
+
+def chain_tokens(n):
+    # while i != 3 { i = i + 1 + ... + 1 }
+    return tokenize_source("while i != 3 {\n    i = i" + " + 1" * n + "\n}\n")
+
+def time_parse(make_parser, tokens, repeat):
+    # best of 3, gc paused like timeit does
+    best = float("inf")
+    for _ in range(3):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                make_parser(tokens).parse()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best / repeat
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Parse time: recursive descent vs LL(1) table")
+    arg_parse.add_argument("--size", type=int, default=20000, help="Elements per workload")
+    arg_parse.add_argument("--repeat", type=int, default=3, help="Parses per measurement")
+    args = arg_parse.parse_args()
+
+    default_table()  # load the table outside the timed region
+    workloads = (
+        ("mixed", tokenize_source(synthetic_program(max(1, args.size // 50), 8))),
+        ("tuple", tuple_tokens(args.size)),
+        ("props", prop_tokens(args.size)),
+        ("chain", chain_tokens(args.size)),
+    )
+    print(f"{'workload':9} {'tokens':>8} {'rd ns/tok':>10} {'ll1 ns/tok':>11} {'faster':>7}")
+    for name, tokens in workloads:
+        rd = time_parse(Parser, tokens, args.repeat) / len(tokens)
+        ll1 = time_parse(LL1Parser, tokens, args.repeat) / len(tokens)
+        faster = "rd" if rd <= ll1 else "ll1"
+        print(f"{name:9} {len(tokens):8} {rd * 1e9:10.1f} {ll1 * 1e9:11.1f} {faster:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Closure-compiled tph_exec.Program against a reference tree-walking interpreter on
+# loop-heavy programs; both have to end with the same variables and op counts.
+#
+# > python3 -m benchmarks.bench_exec
+
+import argparse
+import time
+
+from tph_exec import Program, default_flags
+from tph_parser import (
+    AssignNode, BinOpNode, BreakNode, IDNode, IfNode, KeyWordNode, NumberNode, RegisterOpNode,
+    TokenType, TupleNode, WhileNode, parse_source
+)
+
+programs = {
+    "counter": "while i != {n} {{ i = i + 1 }}",
+    "branches": """while i != {n} {{
+        i = i + 1
+        if j == 3 {{ j = 0 }} else {{ j = j + 1  total = total + j + 2 }}
+    }}""",
+    "register_op": """while i != {n} {{
+        i = i + 1
+        register_op Conv (kernel: (3, 3), stride: 1)
+    }}""",
+    "break": """while true {{
+        i = i + 1  k = i + i
+        if i == {n} {{ break }}
+    }}""",
+}
+
+class Break(Exception):
+    pass
+
+class TreeWalker:
+    # reference: dispatches on the node class at every step, variables in a dict
+    def __init__(self):
+        self.variables = {}
+        self.flags = dict(default_flags)
+        self.op_counts = {}
+
+    def run(self, statements):
+        try:
+            self.block(statements)
+        except Break:
+            pass
+        return self.variables
+
+    def block(self, statements):
+        for statement in statements:
+            self.statement(statement)
+
+    def statement(self, node):
+        if isinstance(node, AssignNode):
+            self.variables[node.variable.name] = self.value(node.expression)
+        elif isinstance(node, WhileNode):
+            try:
+                while self.condition(node.condition):
+                    self.block(node.statements)
+            except Break:
+                pass
+        elif isinstance(node, IfNode):
+            self.block(node.true_branch if self.condition(node.condition) else node.false_branch)
+        elif isinstance(node, BreakNode):
+            raise Break()
+        elif isinstance(node, RegisterOpNode):
+            props = {}
+            for prop in node.props:
+                if isinstance(prop.value, TupleNode):
+                    props[prop.name.name] = tuple(number.value for number in prop.value.values)
+                else:
+                    props[prop.name.name] = prop.value.value
+            self.op_counts[node.id_name.name] = self.op_counts.get(node.id_name.name, 0) + 1
+
+    def value(self, node):
+        if isinstance(node, NumberNode):
+            return node.value
+        if isinstance(node, IDNode):
+            return self.variables.get(node.name, 0.0)
+        return self.value(node.left) + self.value(node.right)
+
+    def condition(self, node):
+        if isinstance(node, KeyWordNode):
+            return self.flags.get(node.name, False)
+        if isinstance(node, BinOpNode):
+            equal = self.value(node.left) == self.value(node.right)
+            return equal if node.operator == TokenType.CompEqual else not equal
+        return self.value(node) != 0
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Closure-compiled executor vs tree-walker")
+    arg_parse.add_argument("--iterations", type=int, default=200000, help="Loop iterations per program")
+    args = arg_parse.parse_args()
+
+    print(f"{'program':12} {'walker ms':>10} {'compiled ms':>12} {'compile ms':>11} {'speedup':>8}")
+    for name, template in programs.items():
+        statements = parse_source(template.format(n=args.iterations))
+        walker = TreeWalker()
+        walker_seconds, walker_variables = timed(lambda: walker.run(statements))
+        compile_seconds, program = timed(lambda: Program(statements))
+        run_seconds, variables = timed(program.run)
+        if variables != walker_variables or program.op_counts != walker.op_counts:
+            raise AssertionError(f"{name}: {variables} {program.op_counts} != {walker_variables} {walker.op_counts}")
+        print(f"{name:12} {walker_seconds * 1e3:10.1f} {run_seconds * 1e3:12.1f} {compile_seconds * 1e3:11.3f} "
+              f"{walker_seconds / run_seconds:7.1f}x")
+
+if __name__ == "__main__":
+    main()
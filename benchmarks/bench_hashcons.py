@@ -0,0 +1,67 @@
+# Hash-consed ASTs (tph_hashcons.py) against plain trees on model definitions that
+# repeat the same register_op blocks: memory held by the AST, binary size, and the
+# time to parse and to share.
+#
+# > python3 -m benchmarks.bench_hashcons
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_program
+from tph_hashcons import share_iter
+from tph_parser import Parser, decode_ast, encode_ast, tokenize_source
+
+block = "register_op Conv (kernel: (3, 3), channels: (2, 4), stride: 1)\n"
+
+def model_source(repeats, blocks):
+    # a model that repeats `blocks` identical register_op lines at top level and in a
+    # loop, followed by a generated program of distinct statements
+    loop = "while i != 3 {\n    i = i + 1\n" + block * blocks + "}\n"
+    return (block * blocks + loop) * repeats + generate_program(statements=repeats, depth=1, props=4,
+                                                               tuple_length=8, chain_length=2, seed=1)
+
+def timed(function):
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def retained_bytes(function):
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Hash-consed vs plain ASTs")
+    arg_parse.add_argument("--repeats", type=int, default=200, help="Repeated model sections")
+    arg_parse.add_argument("--blocks", type=int, default=20, help="Identical register_op lines per section")
+    args = arg_parse.parse_args()
+
+    tokens = tokenize_source(model_source(args.repeats, args.blocks))
+    parse = lambda: Parser(tokens).parse()
+    parse_shared = lambda: list(share_iter(Parser(tokens).parse()))
+
+    parse_seconds, plain = timed(parse)
+    shared_seconds, shared = timed(parse_shared)
+    plain_bytes = retained_bytes(parse)
+    shared_bytes = retained_bytes(parse_shared)
+    plain_file = encode_ast(plain)
+    shared_file = encode_ast(shared, shared=True)
+    if encode_ast(decode_ast(shared_file)) != plain_file:
+        raise AssertionError("shared binary AST does not load to the same tree")
+
+    print(f"{len(tokens)} tokens, {len(plain)} statements")
+    print(f"{'case':8} {'parse ms':>9} {'retained':>12} {'bin bytes':>10}")
+    print(f"{'plain':8} {parse_seconds * 1e3:9.1f} {plain_bytes:12} {len(plain_file):10}")
+    print(f"{'shared':8} {shared_seconds * 1e3:9.1f} {shared_bytes:12} {len(shared_file):10}")
+    print(f"hash-consing keeps {shared_bytes / plain_bytes:.0%} of the memory and "
+          f"{len(shared_file) / len(plain_file):.0%} of the binary size")
+
+if __name__ == "__main__":
+    main()
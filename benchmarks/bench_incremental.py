@@ -0,0 +1,44 @@
+# Edit latency of IncrementalDocument against lexing and parsing the whole file again.
+# The latency of an edit should stay about the same as the file grows.
+#
+# > python3 -m benchmarks.bench_incremental
+
+import argparse
+import time
+
+from benchmarks.bench_memory import synthetic_program
+from tph_incremental import IncrementalDocument
+from tph_parser import parse_source
+
+def time_edits(doc, offset, edits):
+    # alternately insert and remove one character in the middle of the document
+    start = time.perf_counter()
+    for i in range(edits):
+        if i % 2:
+            doc.apply_edit(offset, 1, "")
+        else:
+            doc.apply_edit(offset, 0, "7")
+    return (time.perf_counter() - start) / edits
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Incremental edit latency vs full reparse")
+    arg_parse.add_argument("--max", type=int, default=10000, help="Largest number of top-level statements")
+    arg_parse.add_argument("--edits", type=int, default=200, help="Edits per size")
+    args = arg_parse.parse_args()
+
+    print(f"{'statements':>10} {'chars':>9} {'edit us':>9} {'full ms':>9}")
+    n = 10
+    while n <= args.max:
+        text = synthetic_program(n, 8)
+        doc = IncrementalDocument(text)
+        # in front of a number of the stride in the middle statement
+        offset = text.index("stride: ", len(text) // 2) + len("stride: ")
+        edit = time_edits(doc, offset, args.edits)
+        start = time.perf_counter()
+        parse_source(text)
+        full = time.perf_counter() - start
+        print(f"{n:10} {len(text):9} {edit * 1e6:9.1f} {full * 1e3:9.1f}")
+        n *= 10
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Answering queries with tph_index.py against a full walk of the AST per query, on a
+# generated program: time to build the index, time per query, and the memory and
+# JSON size of the index.
+#
+# > python3 -m benchmarks.bench_index
+# > python3 -m benchmarks.bench_index --statements 100000
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_program
+from tph_index import build_index
+from tph_parser import AssignNode, IfNode, Parser, RegisterOpNode, WhileNode, tokenize_source
+
+def walk(statements, visit):
+    # visit(node, loops) for every statement, loops is the number of while loops around it
+    stack = [(statement, 0) for statement in reversed(statements)]
+    while stack:
+        node, loops = stack.pop()
+        visit(node, loops)
+        cls = type(node)
+        if cls is WhileNode:
+            stack.extend((statement, loops + 1) for statement in reversed(node.statements))
+        elif cls is IfNode:
+            stack.extend((statement, loops) for statement in reversed(node.true_branch + node.false_branch))
+
+def walk_ops(statements, op, prop):
+    found = []
+    def visit(node, loops):
+        if type(node) is RegisterOpNode and node.id_name.name == op and \
+                any(item.name.name == prop for item in node.props):
+            found.append(node)
+    walk(statements, visit)
+    return found
+
+def walk_assignments(statements, variable):
+    found = []
+    def visit(node, loops):
+        if type(node) is AssignNode and node.variable.name == variable:
+            found.append(node)
+    walk(statements, visit)
+    return found
+
+def walk_ops_in_loops(statements):
+    found = []
+    def visit(node, loops):
+        if loops and type(node) is RegisterOpNode:
+            found.append(node)
+    walk(statements, visit)
+    return found
+
+def best_seconds(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Indexed queries vs AST walks")
+    arg_parse.add_argument("--statements", type=int, default=20000, help="Top-level statements")
+    arg_parse.add_argument("--repeat", type=int, default=5, help="Runs per query, the best is kept")
+    args = arg_parse.parse_args()
+
+    source = generate_program(statements=args.statements, depth=2, props=4, tuple_length=8,
+                              chain_length=3, seed=11)
+    statements = Parser(tokenize_source(source)).parse()
+    # build time untraced, then the bytes a second build retains
+    gc.collect()
+    start = time.perf_counter()
+    index = build_index(statements)
+    build_seconds = time.perf_counter() - start
+    del index
+    gc.collect()
+    tracemalloc.start()
+    index = build_index(statements)
+    index_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    json_bytes = len(json.dumps(index.to_dict(), separators=(",", ":")))
+    print(f"{args.statements} statements, {len(index)} nodes: index built in {build_seconds * 1e3:.1f} ms, "
+          f"{index_bytes / 1e6:.1f} MB, {json_bytes / 1e6:.1f} MB as JSON")
+
+    queries = (
+        ("Op7 with p1", lambda: walk_ops(statements, "Op7", "p1"),
+         lambda: index.register_ops("Op7", "p1")),
+        ("assignments to v3", lambda: walk_assignments(statements, "v3"),
+         lambda: index.assignments("v3")),
+        ("ops inside while", lambda: walk_ops_in_loops(statements),
+         lambda: index.register_ops(inside="while")),
+    )
+    print(f"{'query':20} {'found':>7} {'walk ms':>9} {'index ms':>9} {'speedup':>8}")
+    for name, walked, indexed in queries:
+        walk_seconds, expected = best_seconds(walked, args.repeat)
+        index_seconds, found = best_seconds(indexed, args.repeat)
+        if found != expected:
+            raise AssertionError(f"{name}: the index found {len(found)} nodes, the walk {len(expected)}")
+        print(f"{name:20} {len(found):7} {walk_seconds * 1e3:9.2f} {index_seconds * 1e3:9.3f} "
+              f"{walk_seconds / index_seconds:7.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Scaling check for long property lists and number tuples.
+# The per-element parse cost should stay flat from 10 to 1,000,000 elements: each tenfold
+# step is checked on its own, a quadratic step would cost about 10 times more per element.
+# The step from 10 is left out, the fixed cost of a statement dominates there.
+#
+# > python3 -m benchmarks.bench_lists
+
+import argparse
+import gc
+import sys
+import time
+
+from tph_parser import Parser, Token, TokenType
+
+def tuple_tokens(n):
+    # register_op Big (shape: (1, 1, ..., 1))
+    tokens = [Token(TokenType.REGISTER_OP, "register_op"), Token(TokenType.ID, "Big"),
+              Token(TokenType.LPAREN, "("), Token(TokenType.ID, "shape"), Token(TokenType.COLON, ":"),
+              Token(TokenType.LPAREN, "("), Token(TokenType.NUM, "1")]
+    comma = Token(TokenType.COMMA, ",")
+    num = Token(TokenType.NUM, "1")
+    for _ in range(n - 1):
+        tokens.append(comma)
+        tokens.append(num)
+    tokens.append(Token(TokenType.RPAREN, ")"))
+    tokens.append(Token(TokenType.RPAREN, ")"))
+    return tokens
+
+def prop_tokens(n):
+    # register_op Big (p: 1, p: 1, ..., p: 1)
+    tokens = [Token(TokenType.REGISTER_OP, "register_op"), Token(TokenType.ID, "Big"),
+              Token(TokenType.LPAREN, "(")]
+    prop = [Token(TokenType.ID, "p"), Token(TokenType.COLON, ":"), Token(TokenType.NUM, "1")]
+    comma = Token(TokenType.COMMA, ",")
+    tokens.extend(prop)
+    for _ in range(n - 1):
+        tokens.append(comma)
+        tokens.extend(prop)
+    tokens.append(Token(TokenType.RPAREN, ")"))
+    return tokens
+
+def time_per_element(make_tokens, n, budget, runs):
+    # repeat small inputs so every size parses roughly `budget` elements, the best of
+    # `runs` is kept; the cyclic gc is paused like timeit does so heap size doesn't skew
+    # the curve
+    tokens = make_tokens(n)
+    repeat = max(1, budget // n)
+    best = float("inf")
+    for _ in range(runs):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                Parser(tokens).parse()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best / (repeat * n)
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Per-element cost of long lists")
+    arg_parse.add_argument("--max", type=int, default=1000000, help="Largest list length")
+    arg_parse.add_argument("--budget", type=int, default=200000, help="Elements parsed per size")
+    arg_parse.add_argument("--runs", type=int, default=5, help="Runs per size, the best is kept")
+    arg_parse.add_argument("--tolerance", type=float, default=2.5,
+                           help="Allowed per-element cost ratio between two sizes a tenfold step apart")
+    args = arg_parse.parse_args()
+
+    sizes = []
+    n = 10
+    while n <= args.max:
+        sizes.append(n)
+        n *= 10
+
+    flat = True
+    for name, make_tokens in (("tuple", tuple_tokens), ("props", prop_tokens)):
+        costs = [time_per_element(make_tokens, n, args.budget, args.runs) for n in sizes]
+        for n, cost in zip(sizes, costs):
+            print(f"{name:6} n={n:<8} {cost * 1e9:8.1f} ns/element")
+        steps = [larger / smaller for smaller, larger in zip(costs[1:], costs[2:])]
+        if steps:
+            print(f"{name:6} largest tenfold step = {max(steps):.2f}")
+            flat = flat and max(steps) <= args.tolerance
+
+    if not flat:
+        print("per-element cost is not flat")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
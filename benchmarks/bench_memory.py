@@ -0,0 +1,56 @@
+# Memory of the AST: node objects (Parser.parse) against the array-backed NodeArena.
+#
+# > python3 -m benchmarks.bench_memory
+
+import argparse
+import gc
+import tracemalloc
+
+from tph_arena import build_arena
+from tph_parser import Parser, tokenize_source
+
+def synthetic_program(statements, tuple_length):
+    numbers = ", ".join(str(i % 97) for i in range(tuple_length))
+    block = (
+        "while i != 3 {\n"
+        "    i = i + 1 + j + 2\n"
+        f"    register_op Conv (kernel: ({numbers}), channels: (2, 4), stride: 1)\n"
+        "    if i == 3 {\n"
+        "        break\n"
+        "    } else {\n"
+        "        j = j + 1\n"
+        "    }\n"
+        "}\n"
+    )
+    return block * statements
+
+def measure(build):
+    # (bytes still allocated after the build, peak bytes during it, result)
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, result
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="AST memory: node objects vs NodeArena")
+    arg_parse.add_argument("--statements", type=int, default=5000, help="Number of top-level while loops")
+    arg_parse.add_argument("--tuple-length", type=int, default=32, help="Numbers in the kernel tuple")
+    args = arg_parse.parse_args()
+
+    tokens = tokenize_source(synthetic_program(args.statements, args.tuple_length))
+
+    objects_current, objects_peak, ast = measure(lambda: Parser(tokens).parse())
+    del ast
+    arena_current, arena_peak, arena = measure(lambda: build_arena(Parser(tokens).parse_iter()))
+    nodes = len(arena)
+
+    print(f"{len(tokens)} tokens, {nodes} nodes")
+    print(f"{'representation':16} {'retained':>12} {'peak':>12} {'bytes/node':>11}")
+    print(f"{'node objects':16} {objects_current:12} {objects_peak:12} {objects_current / nodes:11.1f}")
+    print(f"{'arena':16} {arena_current:12} {arena_peak:12} {arena_current / nodes:11.1f}")
+    print(f"arena uses {objects_current / arena_current:.1f}x less memory")
+
+if __name__ == "__main__":
+    main()
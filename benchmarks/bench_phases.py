@@ -0,0 +1,110 @@
+# Time of every pipeline phase on generated programs, as scaling curves over each
+# generator parameter: scanning (in-process lexer), loading a scanner token file
+# (parse_file), Parser.parse and text emission of the AST.
+#
+# > python3 -m benchmarks.bench_phases -o bench_results.json
+# > python3 -m benchmarks.compare old.json bench_results.json
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+from benchmarks.generator import generate_program
+from tph_parser import Parser, parse_file, scan_source, tokenize_source, write_ast
+
+base_options = {"statements": 1000, "depth": 2, "props": 3, "tuple_length": 4, "chain_length": 2, "seed": 0}
+sweeps = {
+    "statements": (100, 1000, 10000),
+    "depth": (0, 1, 2),
+    "props": (1, 10, 100),
+    "tuple_length": (1, 100, 1000),
+    "chain_length": (1, 10, 100),
+}
+phases = ("scan", "load", "parse", "emit")
+
+def best_time(function, repeat):
+    # best of `repeat` runs, the cyclic gc is paused like timeit does
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+def write_token_file(source, path):
+    # the text format of the scanner: <Kind, "value"> per line
+    with open(path, 'w') as file:
+        for kind, value in scan_source(source):
+            file.write(f'<{kind}, "{value}">\n')
+
+def time_phases(options, repeat, token_path):
+    source = generate_program(**options)
+    tokens = tokenize_source(source)
+    write_token_file(source, token_path)
+    ast = Parser(tokens).parse()
+    timings = {
+        "scan": best_time(lambda: tokenize_source(source), repeat),
+        "load": best_time(lambda: parse_file(token_path), repeat),
+        "parse": best_time(lambda: Parser(tokens).parse(), repeat),
+        "emit": best_time(lambda: write_ast(ast, io.StringIO()), repeat),
+    }
+    return {"chars": len(source), "tokens": len(tokens), "seconds": timings}
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_sweeps(repeat, scale=1.0, report=print):
+    results = []
+    fd, token_path = tempfile.mkstemp(suffix=".tok")
+    os.close(fd)
+    try:
+        report(f"{'case':22} {'tokens':>9} " + " ".join(f"{phase + ' ms':>9}" for phase in phases))
+        for parameter, values in sweeps.items():
+            for value in values:
+                options = dict(base_options)
+                options[parameter] = value
+                options["statements"] = max(1, int(options["statements"] * scale))
+                result = time_phases(options, repeat, token_path)
+                result.update({"case": f"{parameter}={value}", "options": options})
+                results.append(result)
+                report(f"{result['case']:22} {result['tokens']:9} "
+                       + " ".join(f"{result['seconds'][phase] * 1e3:9.2f}" for phase in phases))
+    finally:
+        os.remove(token_path)
+    return results
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Per-phase timings on generated programs")
+    arg_parse.add_argument("-o", "--output", type=str, help="Write the results as JSON")
+    arg_parse.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best is kept")
+    arg_parse.add_argument("--scale", type=float, default=1.0, help="Multiplier for the statement counts")
+    args = arg_parse.parse_args()
+
+    results = run_sweeps(args.repeat, args.scale)
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({
+                "commit": current_commit(),
+                "python": platform.python_version(),
+                "repeat": args.repeat,
+                "scale": args.scale,
+                "results": results,
+            }, file, indent=2)
+
+if __name__ == "__main__":
+    main()
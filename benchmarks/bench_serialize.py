@@ -0,0 +1,50 @@
+# Load time of a serialized AST against parsing the program again.
+#
+# > python3 -m benchmarks.bench_serialize
+
+import argparse
+import io
+import json
+import time
+
+from benchmarks.bench_memory import synthetic_program
+from tph_parser import ASTNode, Parser, decode_ast, encode_ast, tokenize_source, write_ast_json
+
+def best_time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="AST load time: reparse vs JSON vs binary")
+    arg_parse.add_argument("--statements", type=int, default=3000, help="Number of top-level while loops")
+    arg_parse.add_argument("--tuple-length", type=int, default=32, help="Numbers in the kernel tuple")
+    arg_parse.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best is kept")
+    args = arg_parse.parse_args()
+
+    source = synthetic_program(args.statements, args.tuple_length)
+    tokens = tokenize_source(source)
+    ast = Parser(tokens).parse()
+    json_buffer = io.StringIO()
+    write_ast_json(ast, json_buffer)
+    json_text = json_buffer.getvalue()
+    binary = encode_ast(ast)
+
+    cases = (
+        ("scan + parse", len(source), lambda: Parser(tokenize_source(source)).parse()),
+        ("parse tokens", None, lambda: Parser(tokens).parse()),
+        ("json load", len(json_text), lambda: [ASTNode.from_dict(data) for data in json.loads(json_text)]),
+        ("binary load", len(binary), lambda: decode_ast(binary)),
+    )
+    print(f"{'case':14} {'bytes':>10} {'seconds':>9}")
+    timings = {}
+    for name, size, function in cases:
+        timings[name] = best_time(function, args.repeat)
+        print(f"{name:14} {size if size is not None else '-':>10} {timings[name]:9.3f}")
+    print(f"binary load is {timings['scan + parse'] / timings['binary load']:.1f}x faster than scan + parse")
+
+if __name__ == "__main__":
+    main()
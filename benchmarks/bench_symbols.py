@@ -0,0 +1,77 @@
+# Per-chunk interning of identifiers and number literals: the peak memory of a streamed
+# parse on programs where every register_op has new names (it stays flat as the input
+# grows, the values of a chunk are freed with it), then the time, retained memory and
+# distinct name strings of a whole AST of a generated program.
+#
+# > python3 -m benchmarks.bench_symbols
+# > python3 -m benchmarks.bench_symbols --max 1000000
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_program
+from tph_index import preorder
+from tph_parser import IDNode, KeyWordNode, Parser, iter_source_file, tokenize_source
+
+def distinct_program(statements):
+    # a register_op per line, no name or literal is used twice
+    return "".join(f"register_op Op{i} (size{i}: {i}, kernel{i}: ({i}, {i + 1}))\n"
+                   for i in range(statements))
+
+def streamed(path):
+    for _ in Parser(iter_source_file(path)).parse_iter():
+        pass
+
+def measure(build, repeat):
+    # (best seconds, (bytes allocated after one build, peak bytes during it))
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = build()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, traced
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Memory of per-chunk interning of names and literals")
+    arg_parse.add_argument("--max", type=int, default=100000, help="Largest number of distinct statements")
+    arg_parse.add_argument("--statements", type=int, default=20000, help="Top-level statements of the AST case")
+    arg_parse.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best is kept")
+    args = arg_parse.parse_args()
+
+    print(f"{'statements':>10} {'peak MB':>8} {'seconds':>8}")
+    n = 1000
+    while n <= args.max:
+        with tempfile.NamedTemporaryFile('w', suffix=".hl", delete=False) as source_file:
+            source_file.write(distinct_program(n))
+        try:
+            seconds, (_, peak) = measure(lambda: streamed(source_file.name), args.repeat)
+        finally:
+            os.remove(source_file.name)
+        print(f"{n:10} {peak / 1e6:8.1f} {seconds:8.2f}")
+        n *= 10
+
+    tokens = tokenize_source(generate_program(statements=args.statements, depth=2, props=6, tuple_length=16,
+                                              chain_length=4))
+    seconds, (retained, _) = measure(lambda: Parser(tokens).parse(), args.repeat)
+    names = [node.name for node in preorder(Parser(tokens).parse()) if type(node) in (IDNode, KeyWordNode)]
+    print(f"\nwhole AST of {args.statements} generated statements")
+    print(f"{'seconds':>9} {'retained':>12} {'names':>9} {'strings':>9}")
+    print(f"{seconds:9.3f} {retained:12} {len(names):9} {len(set(map(id, names))):9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Tokens as a TokenBuffer (a byte of kind and an index into the value strings per
+# token) against a list with one Token object per token read through a Token cursor,
+# on a program of --tokens tokens: time to build, memory retained and parse time.
+#
+# > python3 -m benchmarks.bench_tokens
+# > python3 -m benchmarks.bench_tokens --tokens 1000000
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import deque
+
+from benchmarks.generator import generate_program
+from tph_parser import NumberNode, Parser, Token, TokenType, join_token_buffers, tokenize_source, token_names
+
+class ObjectParser(Parser):
+    # reference: the lookahead is a Token object taken from an iterator of them
+    def __init__(self, tokens):
+        super().__init__(())
+        self.eof_token = Token(TokenType.EOF)
+        self.tokens = iter(tokens)
+        self.token = next(self.tokens, self.eof_token)
+        self.kind = self.token.type
+
+    def advance(self):
+        self.pos += 1
+        self.token = next(self.tokens, self.eof_token)
+        self.kind = self.token.type
+
+    def expect(self, token_type):
+        if isinstance(token_type, list):
+            if self.kind not in token_type:
+                names = [token_names[kind] for kind in token_type]
+                raise self.error(f"Expected {names}, got {token_names[self.kind]}")
+        elif self.kind != token_type:
+            raise self.error(f"Expected {token_names[token_type]}, got {token_names[self.kind]}")
+        self.advance()
+
+    def take(self, token_type):
+        value = self.token.value
+        self.expect(token_type)
+        return value
+
+    def take_id(self):
+        node = self.id_node(self.take(TokenType.ID))
+        node.start, node.end = self.pos - 1, self.pos
+        return node
+
+    def take_number(self):
+        node = NumberNode(self.number_values[self.take(TokenType.NUM)])
+        node.start, node.end = self.pos - 1, self.pos
+        return node
+
+    @property
+    def value(self):
+        return self.token.value
+
+def program_tokens(count):
+    # a generated program repeated until it has at least count tokens, as one TokenBuffer
+    program = tokenize_source(generate_program(statements=500, depth=2, props=4, tuple_length=8,
+                                               chain_length=3, seed=7))
+    return join_token_buffers([program] * -(-count // len(program)))
+
+def token_objects(buffer):
+    strings = buffer.strings
+    return [Token(kind, strings[value]) for kind, value in zip(buffer.kinds, buffer.values)]
+
+def token_buffer(buffer):
+    return join_token_buffers([buffer])
+
+def measure(build, source):
+    # build time untraced, then the bytes a second build retains
+    gc.collect()
+    start = time.perf_counter()
+    tokens = build(source)
+    seconds = time.perf_counter() - start
+    del tokens
+    gc.collect()
+    tracemalloc.start()
+    tokens = build(source)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tokens, seconds, retained
+
+def parse_seconds(parser_class, tokens, repeat):
+    # best of repeat parses; statements are dropped as they are parsed, so only the
+    # tokens stay in memory
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            deque(parser_class(tokens).parse_iter(), 0)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="TokenBuffer vs Token objects")
+    arg_parse.add_argument("--tokens", type=int, default=10000000, help="Tokens in the input")
+    arg_parse.add_argument("--repeat", type=int, default=3, help="Parses per layout, the best is kept")
+    args = arg_parse.parse_args()
+
+    source = program_tokens(args.tokens)
+    count = len(source)
+    print(f"{count} tokens, {len(source.strings)} distinct values")
+    print(f"{'layout':8} {'build s':>8} {'retained MB':>12} {'bytes/token':>12} {'parse s':>8}")
+    results = {}
+    for name, build, parser_class in (("objects", token_objects, ObjectParser),
+                                      ("buffer", token_buffer, Parser)):
+        tokens, build_seconds, retained = measure(build, source)
+        seconds = parse_seconds(parser_class, tokens, args.repeat)
+        del tokens
+        results[name] = retained, seconds
+        print(f"{name:8} {build_seconds:8.2f} {retained / 1e6:12.1f} {retained / count:12.1f} {seconds:8.2f}")
+    (object_bytes, object_seconds), (buffer_bytes, buffer_seconds) = results["objects"], results["buffer"]
+    print(f"the buffer uses {object_bytes / buffer_bytes:.1f}x less memory, "
+          f"parsing takes {buffer_seconds / object_seconds:.2f}x the time")
+
+if __name__ == "__main__":
+    main()
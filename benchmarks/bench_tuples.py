@@ -0,0 +1,79 @@
+# Tuple values packed in a NumberColumn against one NumberNode per element, for
+# register_op statements with long tuples: parse time, parse + text output time, and
+# memory held by the AST.
+#
+# > python3 -m benchmarks.bench_tuples
+
+import argparse
+import gc
+import io
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_program
+from tph_parser import NumberNode, Parser, TokenType, numpy, tokenize_source, write_ast
+
+class ListParser(Parser):
+    # reference: a list with one NumberNode per tuple element
+    def parse_list_num_a(self):
+        nums = [NumberNode(self.number_values[self.take(TokenType.NUM)])]
+        nums.extend(self.parse_list_num_b())
+        return nums
+
+    def parse_list_num_b(self):
+        nums = []
+        number_values = self.number_values
+        while self.kind == TokenType.COMMA:
+            self.expect(TokenType.COMMA)
+            nums.append(NumberNode(number_values[self.take(TokenType.NUM)]))
+        return nums
+
+def best_time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+def retained_bytes(function):
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Packed tuple values vs NumberNode lists")
+    arg_parse.add_argument("--statements", type=int, default=500, help="Top-level statements")
+    arg_parse.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best is kept")
+    args = arg_parse.parse_args()
+
+    print(f"numpy {'available' if numpy is not None else 'not installed'}")
+    print(f"{'tuple length':>12} {'case':8} {'parse ms':>9} {'+ emit ms':>12} {'retained':>12}")
+    for tuple_length in (16, 256, 4096):
+        source = generate_program(statements=args.statements, depth=0, props=4,
+                                  tuple_length=tuple_length, chain_length=1)
+        tokens = tokenize_source(source)
+        for name, parser_class in (("list", ListParser), ("packed", Parser)):
+            # packed tuples are decoded when they are first read, so emission of
+            # freshly parsed statements is timed together with the parse
+            def parse_and_emit():
+                statements = parser_class(tokens).parse()
+                write_ast(statements, io.StringIO())
+                return statements
+            parse_seconds = best_time(lambda: parser_class(tokens).parse(), args.repeat)
+            total_seconds = best_time(parse_and_emit, args.repeat)
+            retained = retained_bytes(parse_and_emit)
+            print(f"{tuple_length:12} {name:8} {parse_seconds * 1e3:9.2f} {total_seconds * 1e3:12.2f} "
+                  f"{retained:12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Compare two result files of bench_phases and flag phases that got slower.
+#
+# > python3 -m benchmarks.compare baseline.json bench_results.json --threshold 1.10
+#
+# Exits with status 1 if any phase is slower than threshold x baseline.
+
+import argparse
+import json
+import sys
+
+from benchmarks.bench_phases import phases
+
+def load_results(path):
+    with open(path, 'r') as file:
+        data = json.load(file)
+    return data, {result["case"]: result for result in data["results"]}
+
+def compare(baseline, current, threshold, min_seconds=1e-4, report=print):
+    # returns the (case, phase, ratio) of every regression, phases faster than
+    # min_seconds in both runs are too noisy to judge
+    regressions = []
+    report(f"{'case':22} {'phase':6} {'base ms':>9} {'new ms':>9} {'ratio':>6}")
+    for case, result in current.items():
+        if case not in baseline:
+            continue
+        for phase in phases:
+            old = baseline[case]["seconds"].get(phase)
+            new = result["seconds"].get(phase)
+            if old is None or new is None:
+                continue
+            ratio = new / old if old > 0 else float("inf")
+            flag = ""
+            if ratio > threshold and max(old, new) >= min_seconds:
+                regressions.append((case, phase, ratio))
+                flag = "  REGRESSION"
+            report(f"{case:22} {phase:6} {old * 1e3:9.2f} {new * 1e3:9.2f} {ratio:6.2f}{flag}")
+    return regressions
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Flag regressions between two bench_phases runs")
+    arg_parse.add_argument("baseline", type=str, help="Results of the baseline commit")
+    arg_parse.add_argument("current", type=str, help="Results to check")
+    arg_parse.add_argument("--threshold", type=float, default=1.10,
+                           help="Allowed ratio of new to baseline time")
+    args = arg_parse.parse_args()
+
+    baseline_data, baseline = load_results(args.baseline)
+    current_data, current = load_results(args.current)
+    print(f"baseline {baseline_data.get('commit')}, current {current_data.get('commit')}")
+    if baseline_data.get("scale") != current_data.get("scale"):
+        print(f"warning: runs use different --scale ({baseline_data.get('scale')} and {current_data.get('scale')})")
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.threshold:.2f}x")
+        sys.exit(1)
+    print("no regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Seeded generator of valid .hl programs for the benchmarks.
+#
+# > python3 -m benchmarks.generator --statements 1000 --depth 2 -o big.hl
+#
+# depth 0 only has register_op statements, depth 1 adds while / if blocks at the top
+# level and depth 2 puts if blocks inside the while loops, the deepest nesting the
+# grammar allows (an if body can't hold another block).
+
+import argparse
+import random
+import sys
+
+max_depth = 2
+condition_keywords = ("true", "false")
+
+def generate_program(statements=100, depth=1, props=3, tuple_length=4, chain_length=2, seed=0):
+    # statements: top-level statements, props: properties per register_op (every other
+    # one is a tuple of tuple_length numbers, at least one of each is generated),
+    # chain_length: `+` operators per assignment
+    rng = random.Random(seed)
+    depth = min(depth, max_depth)
+    props = max(1, props)
+    tuple_length = max(1, tuple_length)
+    lines = []
+
+    def name():
+        return f"v{rng.randrange(16)}"
+
+    def number():
+        return str(rng.randrange(1000))
+
+    def operand():
+        return name() if rng.random() < 0.5 else number()
+
+    def condition():
+        choice = rng.randrange(4)
+        if choice == 0:
+            return operand()
+        if choice == 1:
+            return rng.choice(condition_keywords)
+        return f"{operand()} {'==' if choice == 2 else '!='} {operand()}"
+
+    def register_op(indent):
+        prop_list = []
+        for i in range(props):
+            if i % 2:
+                value = "(" + ", ".join(number() for _ in range(tuple_length)) + ")"
+            else:
+                value = number()
+            prop_list.append(f"p{i}: {value}")
+        lines.append(f"{indent}register_op Op{rng.randrange(100)} ({', '.join(prop_list)})")
+
+    def assignment(indent):
+        lines.append(f"{indent}{name()} = " + " + ".join(operand() for _ in range(chain_length + 1)))
+
+    def simple_statement(indent):
+        # statement -> BREAK | assignment | reg_stmt
+        choice = rng.randrange(5)
+        if choice == 0:
+            lines.append(f"{indent}break")
+        elif choice < 3:
+            assignment(indent)
+        else:
+            register_op(indent)
+
+    def if_stmt(indent):
+        lines.append(f"{indent}if {condition()} {{")
+        for _ in range(rng.randrange(1, 4)):
+            simple_statement(indent + "    ")
+        if rng.random() < 0.5:
+            lines.append(f"{indent}}} else {{")
+            for _ in range(rng.randrange(1, 4)):
+                simple_statement(indent + "    ")
+        lines.append(f"{indent}}}")
+
+    def while_stmt(indent):
+        lines.append(f"{indent}while {condition()} {{")
+        for _ in range(rng.randrange(1, 5)):
+            if depth >= 2 and rng.random() < 0.4:
+                if_stmt(indent + "    ")
+            else:
+                simple_statement(indent + "    ")
+        lines.append(f"{indent}}}")
+
+    for _ in range(statements):
+        choice = rng.randrange(3) if depth >= 1 else 0
+        if choice == 0:
+            register_op("")
+        elif choice == 1:
+            if_stmt("")
+        else:
+            while_stmt("")
+    lines.append("")
+    return "\n".join(lines)
+
+def add_program_arguments(arg_parse):
+    arg_parse.add_argument("--statements", type=int, default=100, help="Top-level statements")
+    arg_parse.add_argument("--depth", type=int, default=1, help=f"Block nesting depth (0 to {max_depth})")
+    arg_parse.add_argument("--props", type=int, default=3, help="Properties per register_op")
+    arg_parse.add_argument("--tuple-length", type=int, default=4, help="Numbers per tuple property")
+    arg_parse.add_argument("--chain-length", type=int, default=2, help="'+' operators per assignment")
+    arg_parse.add_argument("--seed", type=int, default=0, help="Random seed")
+
+def program_options(args):
+    return {"statements": args.statements, "depth": args.depth, "props": args.props,
+            "tuple_length": args.tuple_length, "chain_length": args.chain_length, "seed": args.seed}
+
+def main():
+    arg_parse = argparse.ArgumentParser(description="Generate a valid .hl program")
+    add_program_arguments(arg_parse)
+    arg_parse.add_argument("-o", "--output", type=str, help="Output file (default stdout)")
+    args = arg_parse.parse_args()
+
+    source = generate_program(**program_options(args))
+    if args.output is None:
+        sys.stdout.write(source)
+    else:
+        with open(args.output, 'w') as file:
+            file.write(source)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@
 #include <unordered_set>
 #include <fstream>
 #include <sstream>
+#include <unordered_map>
+#include <cstdint>
 #include <getopt.h>
 
 // token types
@@ -25,10 +27,11 @@ enum TokenType {
     Unknown
 };
 
-// token struct
+// token struct, offset is the byte offset of the token in the input
 struct Token {
     TokenType type;
     std::string value;
+    size_t offset;
 };
 
 // key words
@@ -73,6 +76,22 @@ public:
     Scanner(const std::string& input) : input(input), position(0), raised_error(false) {}
 
     Token get_next_token() {
+        // a token ends where the scanner stopped and its value is the text it matched
+        Token token = scan_token();
+        token.offset = position - token.value.size();
+        return token;
+    }
+
+    bool hasError() {
+        return raised_error;
+    }
+
+private:
+    std::string input;
+    size_t position;
+    bool raised_error;
+
+    Token scan_token() {
         // decide the starting point of the token, filter out the invalid characters
         while (position < input.size()) {
             char current = input[position];
@@ -164,15 +183,6 @@ public:
         return {TokenType::EndOfFile, ""};
     }
 
-    bool hasError() {
-        return raised_error;
-    }
-
-private:
-    std::string input;
-    size_t position;
-    bool raised_error;
-
     Token scan_number() {
         size_t start = position;
         // while (position < input.size() && !special_chars.count(std::string(1, input[position]))) {
@@ -236,7 +246,7 @@ private:
 };
 
 // output to stdout
-void print_token(const Token& token) {
+void print_token(const Token& token, bool positions) {
     std::string typeStr;
     switch (token.type) {
         case TokenType::Keyword: typeStr = "Keyword"; break;
@@ -260,13 +270,17 @@ void print_token(const Token& token) {
         
     } else {
         // std::cout << "Token: " << typeStr << ", Value: " << token.value << std::endl;
-        std::cout << "<" << typeStr << ", \"" << token.value << "\">" << std::endl;
+        std::cout << "<" << typeStr << ", \"" << token.value << "\">";
+        if (positions) {
+            std::cout << " " << token.offset;
+        }
+        std::cout << std::endl;
     }
     
 }
 
 // file option
-void dump_token( std::fstream& outfile , const Token& token) {
+void dump_token( std::fstream& outfile , const Token& token, bool positions) {
     std::string typeStr;
     switch (token.type) {
         case TokenType::Keyword: typeStr = "Keyword"; break;
@@ -290,26 +304,90 @@ void dump_token( std::fstream& outfile , const Token& token) {
         
     } else {
         // std::cout << "Token: " << typeStr << ", Value: " << token.value << std::endl;
-        outfile << "<" << typeStr << ", \"" << token.value << "\">" << std::endl;
+        outfile << "<" << typeStr << ", \"" << token.value << "\">";
+        if (positions) {
+            outfile << " " << token.offset;
+        }
+        outfile << std::endl;
     }
     
 }
 
 
+// binary token stream:
+//   "TPHT" | u8 version | u32 string count | u32 token count
+//   string table: u32 length + bytes, per string
+//   tokens: u8 type code (TokenType value) + u32 string index, per token
+//   version 3 only (-p): u64 byte offset, per token (version 2 had u32 offsets)
+// all integers are little-endian
+void write_u32(std::ostream& out, uint32_t value) {
+    char bytes[4] = {
+        static_cast<char>(value & 0xff),
+        static_cast<char>((value >> 8) & 0xff),
+        static_cast<char>((value >> 16) & 0xff),
+        static_cast<char>((value >> 24) & 0xff)
+    };
+    out.write(bytes, 4);
+}
+
+void write_u64(std::ostream& out, uint64_t value) {
+    write_u32(out, static_cast<uint32_t>(value & 0xffffffff));
+    write_u32(out, static_cast<uint32_t>(value >> 32));
+}
+
+void dump_tokens_binary(std::fstream& outfile, const std::vector<Token>& tokens, bool positions) {
+    std::vector<std::string> strings;
+    std::unordered_map<std::string, uint32_t> string_index;
+    std::vector<uint32_t> value_index;
+    value_index.reserve(tokens.size());
+    for (const Token& token : tokens) {
+        auto found = string_index.find(token.value);
+        if (found == string_index.end()) {
+            found = string_index.emplace(token.value, static_cast<uint32_t>(strings.size())).first;
+            strings.push_back(token.value);
+        }
+        value_index.push_back(found->second);
+    }
+
+    outfile.write("TPHT", 4);
+    outfile.put(positions ? 3 : 1);
+    write_u32(outfile, static_cast<uint32_t>(strings.size()));
+    write_u32(outfile, static_cast<uint32_t>(tokens.size()));
+    for (const std::string& value : strings) {
+        write_u32(outfile, static_cast<uint32_t>(value.size()));
+        outfile.write(value.data(), value.size());
+    }
+    for (size_t i = 0; i < tokens.size(); i++) {
+        outfile.put(static_cast<char>(tokens[i].type));
+        write_u32(outfile, value_index[i]);
+    }
+    if (positions) {
+        for (const Token& token : tokens) {
+            write_u64(outfile, static_cast<uint64_t>(token.offset));
+        }
+    }
+}
+
+
 void show_help() {
     std::cout << "Usage: ./scanner [options] input_file\n"
               << "Options:\n"
               << "  -o, --output [file]     Specify the output file\n"
+              << "  -b, --binary            Write the binary token format (needs -o)\n"
+              << "  -p, --positions         Write the byte offset of every token\n"
               << "  -c, --config [file]     Specify the config file\n"
               << "  -h, --help              Show help message\n";
 }
 
 
 
-int parse_options(std::string& in_file_name, std::string& out_file_name, int argc, char *argv[]) {
+int parse_options(std::string& in_file_name, std::string& out_file_name, bool& binary, bool& positions,
+                  int argc, char *argv[]) {
     
     static struct option long_options[] = {
         {"output", required_argument, 0, 'o'},
+        {"binary", no_argument,       0, 'b'},
+        {"positions", no_argument,    0, 'p'},
         {"help",   no_argument,       0, 'h'},
         {0, 0, 0, 0}
     };
@@ -318,11 +396,17 @@ int parse_options(std::string& in_file_name, std::string& out_file_name, int arg
     int option_index = 0;
     
     
-    while ((opt = getopt_long(argc, argv, "o:c:h", long_options, &option_index)) != -1) {
+    while ((opt = getopt_long(argc, argv, "o:c:bph", long_options, &option_index)) != -1) {
         switch (opt) {
             case 'o':
                 out_file_name = optarg;
                 break;
+            case 'b':
+                binary = true;
+                break;
+            case 'p':
+                positions = true;
+                break;
             case 'h':
                 show_help();
                 return -1;
@@ -348,8 +432,15 @@ int main(int argc, char *argv[]) {
     std::string in_file_name;
     std::string out_file_name;
     std::fstream output_file;
+    bool binary = false;
+    bool positions = false;
     
-    if (parse_options(in_file_name, out_file_name, argc, argv) == -1) {
+    if (parse_options(in_file_name, out_file_name, binary, positions, argc, argv) == -1) {
+        return 1;
+    }
+
+    if (binary && out_file_name.empty()) {
+        std::cerr << "Error: binary output needs an output file (-o)" << std::endl;
         return 1;
     }
 
@@ -368,7 +459,7 @@ int main(int argc, char *argv[]) {
     if (out_file_name.empty()) {
         std::cerr << "output file not specified, use stdout as default\n";
     } else {
-        output_file.open(out_file_name, std::ios::out);
+        output_file.open(out_file_name, binary ? std::ios::out | std::ios::binary : std::ios::out);
         if (!output_file.is_open()) {
             std::cerr << "Error: Could not open output file" << std::endl;
             return 1;
@@ -387,15 +478,27 @@ int main(int argc, char *argv[]) {
     Scanner scanner(input);
     
     Token token;
-    do {
-        
-        token = scanner.get_next_token();
-        if (out_file_name.empty()) {
-            print_token(token);
-        } else {
-            dump_token(output_file, token);
+    if (binary) {
+        std::vector<Token> tokens;
+        while ((token = scanner.get_next_token()).type != TokenType::EndOfFile) {
+            if (token.type == TokenType::Unknown) {
+                std::cerr << "Warning -- Unknown token: \"" << token.value << "\""<< std::endl;
+            } else {
+                tokens.push_back(token);
+            }
         }
-    } while (token.type != TokenType::EndOfFile);
+        dump_tokens_binary(output_file, tokens, positions);
+    } else {
+        do {
+            
+            token = scanner.get_next_token();
+            if (out_file_name.empty()) {
+                print_token(token, positions);
+            } else {
+                dump_token(output_file, token, positions);
+            }
+        } while (token.type != TokenType::EndOfFile);
+    }
 
 
     if (!out_file_name.empty()) {
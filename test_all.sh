@@ -4,4 +4,6 @@ make clean
 make
 make tokens
 make ast
-make ast-files
\ No newline at end of file
+make ast-files
+make check-recover
+make check-token-files
@@ -0,0 +1,296 @@
+# Array-backed storage for the AST of tph_parser.py
+#
+# Every node is a row in a set of parallel typed arrays:
+#   kinds       node kind (index into arena_node_classes)
+#   data        interned string index (op_name, operator, names), index into
+#               `values` for NumberNode, length of true_branch for IfNode, -1 otherwise
+#   first_child offset of the node's first child in `children`
+# `values` holds the float of every NumberNode, and `children` holds the child
+# node indices of every node back to back. Nodes are stored after their children,
+# so the children of node i end where the children of node i + 1 start.
+# Node objects are only created as lightweight views when the tree is read.
+
+from array import array
+
+from tph_parser import (
+    AssignNode, BinOpNode, BreakNode, IDNode, IfNode, KeyWordNode, NumberNode,
+    Parser, PropNode, RegisterOpNode, TupleNode, VarNode, WhileNode
+)
+
+arena_node_classes = (
+    RegisterOpNode, PropNode, NumberNode, TupleNode, WhileNode, IfNode,
+    BreakNode, AssignNode, BinOpNode, VarNode, KeyWordNode, IDNode
+)
+arena_node_kinds = {cls: kind for kind, cls in enumerate(arena_node_classes)}
+
+def node_fields(node):
+    # (string, children, IfNode split) of a node that isn't a NumberNode
+    cls = type(node)
+    if cls is IDNode or cls is VarNode or cls is KeyWordNode:
+        return node.name, (), None
+    elif cls is BinOpNode:
+        return node.operator, (node.left, node.right), None
+    elif cls is RegisterOpNode:
+        return node.op_name, [node.id_name] + node.props, None
+    elif cls is PropNode:
+        return None, (node.name, node.value), None
+    elif cls is TupleNode:
+        return None, node.values, None
+    elif cls is AssignNode:
+        return None, (node.variable, node.expression), None
+    elif cls is WhileNode:
+        return None, [node.condition] + node.statements, None
+    elif cls is IfNode:
+        return None, [node.condition] + node.true_branch + node.false_branch, len(node.true_branch)
+    elif cls is BreakNode:
+        return None, (), None
+    else:
+        raise TypeError(f"Unsupported node: {node!r}")
+
+
+class NodeArena:
+    def __init__(self):
+        self.kinds = array('B')
+        self.data = array('i')
+        self.first_child = array('I')
+        self.values = array('d')
+        self.children = array('I')
+        self.roots = array('I')
+        self.strings = []
+        self.string_index = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def intern(self, value):
+        index = self.string_index.get(value)
+        if index is None:
+            index = self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def add(self, root):
+        # store a node tree and return its index, children are stored before their parent
+        # (post-order with an explicit stack, so deep BinOpNode chains don't recurse)
+        stack = [(root, None)]
+        built = []
+        while stack:
+            node, fields = stack.pop()
+            index = len(self.kinds)
+            if type(node) is NumberNode:
+                self.kinds.append(arena_node_kinds[NumberNode])
+                self.data.append(len(self.values))
+                self.values.append(node.value)
+                self.first_child.append(len(self.children))
+                built.append(index)
+                continue
+            if fields is None:
+                fields = node_fields(node)
+                stack.append((node, fields))
+                for child in reversed(fields[1]):
+                    stack.append((child, None))
+                continue
+            string, children, data = fields
+            count = len(children)
+            self.kinds.append(arena_node_kinds[type(node)])
+            if data is None:
+                data = -1 if string is None else self.intern(string)
+            self.data.append(data)
+            self.first_child.append(len(self.children))
+            if count:
+                self.children.extend(built[-count:])
+                del built[-count:]
+            built.append(index)
+        return built[0]
+
+    def add_statement(self, node):
+        index = self.add(node)
+        self.roots.append(index)
+        return index
+
+    def view(self, index):
+        return arena_view_classes[self.kinds[index]](self, index)
+
+    def statements(self):
+        return [self.view(index) for index in self.roots]
+
+    def __iter__(self):
+        for index in self.roots:
+            yield self.view(index)
+
+    def nbytes(self):
+        # memory held by the arrays, strings excluded
+        return sum(column.itemsize * len(column) for column in (
+            self.kinds, self.data, self.first_child, self.values,
+            self.children, self.roots))
+
+    def child_range(self, index):
+        # (start, stop) of the children of a node in `children`
+        stop = self.first_child[index + 1] if index + 1 < len(self.kinds) else len(self.children)
+        return self.first_child[index], stop
+
+def build_arena(statements):
+    # statements can be a generator such as Parser.parse_iter(), each statement
+    # is copied into the arena and its node objects can be freed right away
+    arena = NodeArena()
+    for node in statements:
+        arena.add_statement(node)
+    return arena
+
+def parse_arena(tokens):
+    return build_arena(Parser(tokens).parse_iter())
+
+
+###### views
+class NodeView:
+    __slots__ = ('arena', 'index')
+    node_class = None
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    def child(self, offset):
+        arena = self.arena
+        return arena.view(arena.children[arena.first_child[self.index] + offset])
+
+    def child_list(self, start=0, stop=None):
+        arena = self.arena
+        first, end = arena.child_range(self.index)
+        if stop is not None:
+            end = first + stop
+        return [arena.view(index) for index in arena.children[first + start:end]]
+
+    def string(self):
+        return self.arena.strings[self.arena.data[self.index]]
+
+    def __eq__(self, other):
+        return isinstance(other, NodeView) and self.arena is other.arena and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+    def __repr__(self):
+        return self.node_class.__repr__(self)
+
+    def print_parse(self, depth=0):
+        self.node_class.print_parse(self, depth)
+
+    def output_parse(self, depth=0, out_file=None):
+        self.node_class.output_parse(self, depth, out_file)
+
+    def to_node(self):
+        # materialize the subtree as regular node objects
+        arena = self.arena
+        nodes = {}
+        order = [self.index]
+        for index in order:
+            first, stop = arena.child_range(index)
+            order.extend(arena.children[first:stop])
+        for index in reversed(order):
+            view = arena.view(index)
+            nodes[index] = view.build([nodes[child] for child in view.child_indices()])
+        return nodes[self.index]
+
+    def child_indices(self):
+        first, stop = self.arena.child_range(self.index)
+        return self.arena.children[first:stop]
+
+class RegisterOpView(NodeView):
+    __slots__ = ()
+    node_class = RegisterOpNode
+    op_name = property(NodeView.string)
+    id_name = property(lambda self: self.child(0))
+    props = property(lambda self: self.child_list(1))
+    def build(self, children):
+        return RegisterOpNode(self.op_name, children[0], children[1:])
+
+class PropView(NodeView):
+    __slots__ = ()
+    node_class = PropNode
+    name = property(lambda self: self.child(0))
+    value = property(lambda self: self.child(1))
+    def build(self, children):
+        return PropNode(children[0], children[1])
+
+class NumberView(NodeView):
+    __slots__ = ()
+    node_class = NumberNode
+    value = property(lambda self: self.arena.values[self.arena.data[self.index]])
+    def build(self, children):
+        return NumberNode(self.value)
+
+class TupleView(NodeView):
+    __slots__ = ()
+    node_class = TupleNode
+    values = property(lambda self: self.child_list())
+    def build(self, children):
+        return TupleNode(children)
+
+class WhileView(NodeView):
+    __slots__ = ()
+    node_class = WhileNode
+    condition = property(lambda self: self.child(0))
+    statements = property(lambda self: self.child_list(1))
+    def build(self, children):
+        return WhileNode(children[0], children[1:])
+
+class IfView(NodeView):
+    __slots__ = ()
+    node_class = IfNode
+    condition = property(lambda self: self.child(0))
+    true_branch = property(lambda self: self.child_list(1, 1 + self.arena.data[self.index]))
+    false_branch = property(lambda self: self.child_list(1 + self.arena.data[self.index]))
+    def build(self, children):
+        split = 1 + self.arena.data[self.index]
+        return IfNode(children[0], children[1:split], children[split:])
+
+class BreakView(NodeView):
+    __slots__ = ()
+    node_class = BreakNode
+    def build(self, children):
+        return BreakNode()
+
+class AssignView(NodeView):
+    __slots__ = ()
+    node_class = AssignNode
+    variable = property(lambda self: self.child(0))
+    expression = property(lambda self: self.child(1))
+    def build(self, children):
+        return AssignNode(children[0], children[1])
+
+class BinOpView(NodeView):
+    __slots__ = ()
+    node_class = BinOpNode
+    left = property(lambda self: self.child(0))
+    operator = property(NodeView.string)
+    right = property(lambda self: self.child(1))
+    def build(self, children):
+        return BinOpNode(children[0], self.operator, children[1])
+
+class VarView(NodeView):
+    __slots__ = ()
+    node_class = VarNode
+    name = property(NodeView.string)
+    def build(self, children):
+        return VarNode(self.name)
+
+class KeyWordView(NodeView):
+    __slots__ = ()
+    node_class = KeyWordNode
+    name = property(NodeView.string)
+    def build(self, children):
+        return KeyWordNode(self.name)
+
+class IDView(NodeView):
+    __slots__ = ()
+    node_class = IDNode
+    name = property(NodeView.string)
+    def build(self, children):
+        return IDNode(self.name)
+
+### indexed by node kind, same order as arena_node_classes
+arena_view_classes = (
+    RegisterOpView, PropView, NumberView, TupleView, WhileView, IfView,
+    BreakView, AssignView, BinOpView, VarView, KeyWordView, IDView
+)
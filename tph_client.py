@@ -0,0 +1,90 @@
+# Client of a parser daemon (`tph_parser.py --serve --socket PATH`), takes the same
+# options as a single-file tph_parser.py run. It imports nothing of the parser, so a
+# call costs interpreter startup plus the parse time in the already warm server.
+#
+# > python3 tph_parser.py --serve --socket /tmp/tph.sock &
+# > python3 tph_client.py --socket /tmp/tph.sock example_inputs/simple1.hl -o ast_outputs/output1.txt
+
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+
+class ParserClient:
+    # one connection, requests are answered in order
+    def __init__(self, socket_path):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(socket_path)
+        self.reader = self.connection.makefile('rb')
+        self.next_id = 0
+
+    def request(self, request):
+        self.next_id += 1
+        request = dict(request, id=self.next_id)
+        self.connection.sendall(json.dumps(request).encode() + b"\n")
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Parser server closed the connection")
+        return json.loads(line)
+
+    def parse(self, path=None, source=None, output_format="text", recover=False, engine="rd"):
+        # paths are sent absolute, the server may run in another directory
+        request = {"format": output_format, "recover": recover, "engine": engine}
+        if source is not None:
+            request["source"] = source
+        else:
+            request["path"] = os.path.abspath(path)
+        return self.request(request)
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+def response_ast(response):
+    # the AST of a response as str, or bytes for the binary format
+    ast = response.get("ast", "")
+    if response.get("encoding") == "base64":
+        return base64.b64decode(ast)
+    return ast
+
+def main(argv=None):
+    arg_parse = argparse.ArgumentParser(description="Parse a file through a running tph_parser.py --serve")
+    arg_parse.add_argument("--socket", type=str, required=True, help="Unix socket of the server")
+    arg_parse.add_argument("-o", "--output", type=str, help="Output file name")
+    arg_parse.add_argument("filename", type=str, help="Input token file or .hl source")
+    arg_parse.add_argument("--format", choices=("text", "json", "bin"), default="text",
+                           help="AST output format: indented text, JSON, or the binary AST format")
+    arg_parse.add_argument("--recover", action="store_true",
+                           help="Report every syntax error and keep the partial AST instead of stopping at the first")
+    arg_parse.add_argument("--engine", choices=("rd", "ll1"), default="rd",
+                           help="Parsing engine: recursive descent or the table-driven LL(1) parser")
+    args = arg_parse.parse_args(argv)
+
+    with ParserClient(args.socket) as client:
+        response = client.parse(args.filename, output_format=args.format, recover=args.recover,
+                                engine=args.engine)
+
+    ast = response_ast(response)
+    if args.output is not None:
+        with open(args.output, 'wb' if isinstance(ast, bytes) else 'w') as out_file:
+            out_file.write(ast)
+    elif isinstance(ast, bytes):
+        sys.stdout.buffer.write(ast)
+    else:
+        sys.stdout.write(ast)
+    sys.stdout.flush()
+    for error in response.get("errors", ()):
+        print(error, file=sys.stderr)
+    sys.exit(0 if response.get("ok") else 1)
+
+if __name__ == "__main__":
+    main()
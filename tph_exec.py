@@ -0,0 +1,260 @@
+# Runs parsed .hl programs
+#
+#   program = Program(statements)
+#   program.register_op("Conv", lambda op_name, props: ...)
+#   variables = program.run()
+#
+# The AST is compiled once into nested closures: every variable gets an index in a
+# list of slots, conditions, assignments and '+' chains are specialized by the kind of
+# their operands (slot or constant), and blocks return True when a `break` leaves
+# them, so running a program never inspects a node.
+#
+# Semantics
+#   values are floats and variables start at 0.0, a condition is true when it is not 0
+#   `+` adds, `==` / `!=` compare
+#   a keyword condition (generate_success, true, ...) reads Program.flags, which
+#   register_op handlers may change; `true` starts true, every other keyword false
+#   break leaves the innermost while, outside of a loop it ends the program
+#   register_op ID (...) calls handlers[ID](ID, props) with props as
+#   {name: float or tuple of floats}, built once and shared by every call; IDs
+#   without a handler go to default_handler, which counts them in op_counts
+#
+# > python3 tph_exec.py example_inputs/simple3.hl --flag generate_success
+
+import argparse
+import sys
+
+from tph_parser import (
+    AssignNode, BinOpNode, BreakNode, IDNode, IfNode, KeyWordNode, NumberNode, ParseError,
+    RegisterOpNode, TokenType, TupleNode, VarNode, WhileNode, ast_node_classes,
+    iter_tokens, make_parser, parser_engines, token_names
+)
+
+node_classes = set(ast_node_classes.values())
+default_flags = {"true": True}
+
+def node_class(node):
+    # duck-typed nodes such as arena views name the class they stand for
+    cls = type(node)
+    return cls if cls in node_classes else node.node_class
+
+def stop(slots):
+    # a compiled `break`
+    return True
+
+def run_nothing(slots):
+    return False
+
+class Program:
+    def __init__(self, statements, handlers=None, flags=None):
+        # variable name -> slot index
+        self.slot_of = {}
+        self.handlers = dict(handlers or {})
+        self.flags = dict(default_flags)
+        self.flags.update(flags or {})
+        self.op_counts = {}
+        self.slots = None
+        self.block = self.compile_block(list(statements))
+
+    def register_op(self, op_name, handler):
+        self.handlers[op_name] = handler
+
+    def default_handler(self, op_name, props):
+        self.op_counts[op_name] = self.op_counts.get(op_name, 0) + 1
+
+    def run(self):
+        # runs the program from fresh variables and returns them by name
+        self.slots = [0.0] * len(self.slot_of)
+        self.block(self.slots)
+        return self.variables()
+
+    def variables(self):
+        return {name: self.slots[slot] for name, slot in self.slot_of.items()}
+
+    def slot(self, name):
+        slot = self.slot_of.get(name)
+        if slot is None:
+            slot = self.slot_of[name] = len(self.slot_of)
+        return slot
+
+    ###### compilation, every compile_* returns a closure over the list of slots
+    def compile_block(self, statements):
+        runs = [self.compile_statement(statement) for statement in statements]
+        if not runs:
+            return run_nothing
+        if len(runs) == 1:
+            return runs[0]
+        if len(runs) == 2:
+            first, second = runs
+            def block(slots):
+                return first(slots) or second(slots)
+            return block
+        runs = tuple(runs)
+        def block(slots):
+            for run in runs:
+                if run(slots):
+                    return True
+            return False
+        return block
+
+    def compile_statement(self, node):
+        cls = node_class(node)
+        if cls is AssignNode:
+            return self.compile_assign(node)
+        if cls is WhileNode:
+            condition = self.compile_condition(node.condition)
+            body = self.compile_block(node.statements)
+            def run_while(slots):
+                while condition(slots):
+                    if body(slots):
+                        break
+                return False
+            return run_while
+        if cls is IfNode:
+            condition = self.compile_condition(node.condition)
+            true_branch = self.compile_block(node.true_branch)
+            false_branch = self.compile_block(node.false_branch)
+            def run_if(slots):
+                if condition(slots):
+                    return true_branch(slots)
+                return false_branch(slots)
+            return run_if
+        if cls is BreakNode:
+            return stop
+        if cls is RegisterOpNode:
+            return self.compile_register_op(node)
+        raise TypeError(f"Cannot execute {node!r}")
+
+    def compile_register_op(self, node):
+        op_name = node.id_name.name
+        props = {}
+        for prop in node.props:
+            value = prop.value
+            if node_class(value) is TupleNode:
+                props[prop.name.name] = tuple(number.value for number in value.values)
+            else:
+                props[prop.name.name] = value.value
+        handlers = self.handlers
+        default_handler = self.default_handler
+        def run_register_op(slots):
+            handlers.get(op_name, default_handler)(op_name, props)
+        return run_register_op
+
+    def operand(self, node):
+        # ("slot", index) or ("constant", value) of a leaf
+        cls = node_class(node)
+        if cls is IDNode or cls is VarNode:
+            return "slot", self.slot(node.name)
+        if cls is NumberNode:
+            return "constant", node.value
+        raise TypeError(f"Cannot evaluate {node!r}")
+
+    def sum_terms(self, node):
+        # the operands of a left-nested '+' chain, in evaluation order
+        terms = []
+        while node_class(node) is BinOpNode:
+            if node.operator != TokenType.PLUS:
+                raise TypeError(f"Cannot evaluate operator {token_names[node.operator]}")
+            terms.append(self.operand(node.right))
+            node = node.left
+        terms.append(self.operand(node))
+        terms.reverse()
+        return terms
+
+    def compile_assign(self, node):
+        target = self.slot(node.variable.name)
+        terms = self.sum_terms(node.expression)
+        (kind, a) = terms[0]
+        if len(terms) == 1:
+            if kind == "constant":
+                def assign(slots):
+                    slots[target] = a
+            else:
+                def assign(slots):
+                    slots[target] = slots[a]
+            return assign
+        if len(terms) == 2:
+            (right_kind, b) = terms[1]
+            if kind == "slot" and right_kind == "constant":
+                def assign(slots):
+                    slots[target] = slots[a] + b
+            elif kind == "slot":
+                def assign(slots):
+                    slots[target] = slots[a] + slots[b]
+            elif right_kind == "slot":
+                def assign(slots):
+                    slots[target] = a + slots[b]
+            else:
+                value = a + b
+                def assign(slots):
+                    slots[target] = value
+            return assign
+        # longer chains: constants are added in place, slots are read in order
+        first_is_slot = kind == "slot"
+        rest = tuple((term_kind == "slot", term) for term_kind, term in terms[1:])
+        def assign(slots):
+            total = slots[a] if first_is_slot else a
+            for is_slot, term in rest:
+                total += slots[term] if is_slot else term
+            slots[target] = total
+        return assign
+
+    def compile_condition(self, node):
+        cls = node_class(node)
+        if cls is KeyWordNode:
+            flags = self.flags
+            name = node.name
+            def condition(slots):
+                return flags.get(name, False)
+            return condition
+        if cls is BinOpNode:
+            if node.operator not in (TokenType.CompEqual, TokenType.CompNotEqual):
+                raise TypeError(f"Cannot compare with operator {token_names[node.operator]}")
+            equal = node.operator == TokenType.CompEqual
+            (left_kind, a), (right_kind, b) = self.operand(node.left), self.operand(node.right)
+            if left_kind == "constant" and right_kind == "slot":
+                (left_kind, a), (right_kind, b) = (right_kind, b), (left_kind, a)
+            if left_kind == "constant":
+                value = (a == b) == equal
+                return lambda slots: value
+            if right_kind == "constant":
+                if equal:
+                    return lambda slots: slots[a] == b
+                return lambda slots: slots[a] != b
+            if equal:
+                return lambda slots: slots[a] == slots[b]
+            return lambda slots: slots[a] != slots[b]
+        kind, a = self.operand(node)
+        if kind == "constant":
+            value = a != 0
+            return lambda slots: value
+        return lambda slots: slots[a] != 0
+
+def run_program(statements, handlers=None, flags=None):
+    # compiles and runs statements, returns the Program with its variables and op counts
+    program = Program(statements, handlers, flags)
+    program.run()
+    return program
+
+def main(argv=None):
+    arg_parse = argparse.ArgumentParser(description="Run a .hl program or token file")
+    arg_parse.add_argument("filename", type=str, help="Input token file or .hl source")
+    arg_parse.add_argument("--engine", choices=parser_engines, default="rd",
+                           help="Parsing engine: recursive descent or the table-driven LL(1) parser")
+    arg_parse.add_argument("--flag", action="append", default=[],
+                           help="Keyword condition that is true (repeatable)")
+    args = arg_parse.parse_args(argv)
+
+    try:
+        statements = make_parser(iter_tokens(args.filename), engine=args.engine).parse()
+    except ParseError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+    program = run_program(statements, flags=dict.fromkeys(args.flag, True))
+    for name, value in program.variables().items():
+        print(f"{name} = {value}")
+    for op_name, count in program.op_counts.items():
+        print(f"register_op {op_name}: {count}")
+
+if __name__ == "__main__":
+    main()
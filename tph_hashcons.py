@@ -0,0 +1,133 @@
+# Hash-consing of the AST (tph_parser.py --hash-cons)
+#
+#   table = NodeTable()
+#   statements = [table.share(statement) for statement in parser.parse_iter()]
+#
+# The table is a canonicalizing factory: it keeps one node per structure, keyed by the
+# class, the plain fields and the identity of the (already canonical) children, so a
+# repeated `register_op Conv (kernel: (3, 3), channels: (2, 4))` is built once and
+# every occurrence refers to the same RegisterOpNode / PropNode / TupleNode objects.
+# Within one table two subtrees are structurally equal exactly when they are the same
+# object. Shared nodes are immutable by contract: code that rewrites an AST (such as
+# tph_optimize.py) builds new nodes instead of assigning to fields.
+# encode_ast(statements, shared=True) and the AST cache write a shared subtree once
+# and refer back to it; decode_ast restores the sharing.
+
+from array import array
+
+from tph_parser import (
+    AssignNode, BinOpNode, BreakNode, IDNode, IfNode, KeyWordNode, NumberArray, NumberNode,
+    PropNode, RegisterOpNode, TupleNode, VarNode, WhileNode
+)
+
+def child_nodes(node):
+    cls = type(node)
+    if cls is PropNode:
+        return (node.name, node.value)
+    if cls is RegisterOpNode:
+        return [node.id_name] + node.props
+    if cls is BinOpNode:
+        return (node.left, node.right)
+    if cls is AssignNode:
+        return (node.variable, node.expression)
+    if cls is WhileNode:
+        return [node.condition] + node.statements
+    if cls is IfNode:
+        return [node.condition] + node.true_branch + node.false_branch
+    return ()
+
+def rebuild(node, children):
+    # a copy of node with other children, in the order of child_nodes
+    cls = type(node)
+    if cls is PropNode:
+        return PropNode(children[0], children[1])
+    if cls is RegisterOpNode:
+        return RegisterOpNode(node.op_name, children[0], children[1:])
+    if cls is BinOpNode:
+        return BinOpNode(children[0], node.operator, children[1])
+    if cls is AssignNode:
+        return AssignNode(children[0], children[1])
+    if cls is WhileNode:
+        return WhileNode(children[0], children[1:])
+    if cls is IfNode:
+        split = 1 + len(node.true_branch)
+        return IfNode(children[0], children[1:split], children[split:])
+    raise TypeError(f"Cannot share {node!r}")
+
+def node_key(node):
+    # structure of a node whose children are canonical
+    cls = type(node)
+    if cls is NumberNode:
+        return cls, node.value
+    if cls is IDNode or cls is KeyWordNode or cls is VarNode:
+        return cls, node.name
+    if cls is TupleNode:
+        values = node.values
+        # keyed by the packed float64 values, not a tuple of boxed floats
+        if type(values) is NumberArray:
+            return cls, values.tobytes()
+        return cls, array('d', [value.value for value in values]).tobytes()
+    if cls is PropNode:
+        return cls, id(node.name), id(node.value)
+    if cls is RegisterOpNode:
+        return cls, node.op_name, id(node.id_name), tuple(map(id, node.props))
+    if cls is BinOpNode:
+        return cls, node.operator, id(node.left), id(node.right)
+    if cls is AssignNode:
+        return cls, id(node.variable), id(node.expression)
+    if cls is WhileNode:
+        return cls, id(node.condition), tuple(map(id, node.statements))
+    if cls is IfNode:
+        return cls, id(node.condition), tuple(map(id, node.true_branch)), tuple(map(id, node.false_branch))
+    if cls is BreakNode:
+        return (cls,)
+    raise TypeError(f"Cannot share {node!r}")
+
+class NodeTable:
+    def __init__(self):
+        # structure -> canonical node; the table keeps every canonical node alive, so
+        # their ids in `canonical` and in the keys stay valid
+        self.nodes = {}
+        self.canonical = set()
+        # nodes that were replaced by an existing canonical node
+        self.reused = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def share(self, root):
+        # the canonical node of root's structure; nodes are visited children first with
+        # an explicit stack, a canonical subtree is not entered again
+        canonical = self.canonical
+        nodes = self.nodes
+        # id of an input node -> its canonical node, for inputs that share subtrees
+        done = {}
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in canonical or id(node) in done:
+                continue
+            children = child_nodes(node)
+            if children and not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children))
+                continue
+            shared = node
+            if children:
+                shared_children = [child if id(child) in canonical else done[id(child)] for child in children]
+                if any(new is not child for new, child in zip(shared_children, children)):
+                    shared = rebuild(node, shared_children)
+            key = node_key(shared)
+            found = nodes.get(key)
+            if found is None:
+                found = nodes[key] = shared
+                canonical.add(id(shared))
+            else:
+                self.reused += 1
+            done[id(node)] = found
+        return root if id(root) in canonical else done[id(root)]
+
+def share_iter(statements, table=None):
+    table = NodeTable() if table is None else table
+    for statement in statements:
+        yield table.share(statement)
@@ -0,0 +1,234 @@
+# Incremental re-parsing of an edited source text
+#
+# An IncrementalDocument keeps the source split into segments, one per top-level
+# statement (RegisterOpNode / IfNode / WhileNode). A segment starts at its first token
+# (the first segment at 0) and runs to the start of the next one, so the comments and
+# white space after a statement belong to it. Each segment keeps its text, its tokens,
+# their offsets relative to the segment start and the parsed statement; the document
+# text is never stored in one piece.
+#
+# Tokens never span lines and the lexer has no state, so after an edit only the
+# segments from the edit to the end of its last line are lexed and parsed again. The
+# damaged region grows by whole segments while the statement in it is still open at its
+# end (e.g. a '}' was deleted), and segments that failed to parse are always taken into
+# the region of a neighbouring edit. Statements in the region whose tokens did not
+# change keep their node objects, the segments after it only have their start moved.
+# That move is lazy: the starts from shift_index on are stored shift characters short,
+# and an edit only writes the starts between its region and the pending shift, so a
+# run of edits in one place costs the same however many statements follow.
+
+from array import array
+from bisect import bisect_right
+
+from tph_parser import ParseError, Parser, TokenType, make_token, scan_source_spans, write_ast
+
+class Segment:
+    __slots__ = ('text', 'tokens', 'offsets', 'statement', 'error')
+
+    def __init__(self, text, tokens, offsets, statement=None, error=None):
+        self.text = text
+        self.tokens = tokens
+        self.offsets = offsets
+        self.statement = statement
+        self.error = error
+
+    def key(self):
+        return tuple((token.type, token.value) for token in self.tokens)
+
+class IncrementalDocument:
+    def __init__(self, text=""):
+        self.segments = []
+        self.starts = []
+        self.shift_index = 0
+        self.shift = 0
+        # shared by every re-lex, so equal tokens are one object across edits
+        self.converted = {}
+        # counters of the last edit: tokens lexed, statements parsed, statements reused
+        self.last_edit = {}
+        self.apply_edit(0, 0, text)
+
+    def __len__(self):
+        return self.start(len(self.segments) - 1) + len(self.segments[-1].text) if self.segments else 0
+
+    def start(self, index):
+        # offset of segment index in the text
+        return self.starts[index] + (self.shift if index >= self.shift_index else 0)
+
+    def segment_starts(self):
+        starts = self.starts
+        yield from starts[:self.shift_index]
+        shift = self.shift
+        for start in starts[self.shift_index:]:
+            yield start + shift
+
+    def find(self, offset):
+        # index of the segment holding offset, bisect_right - 1 over the real starts
+        starts = self.starts
+        pending = min(self.shift_index, len(starts))
+        index = bisect_right(starts, offset, 0, pending)
+        if index == pending:
+            index = bisect_right(starts, offset - self.shift, pending)
+        return index - 1
+
+    def shift_from(self, index, delta):
+        # move the starts from index on by delta; only the starts between index and
+        # shift_index are written, the pending shift then starts at the later of both
+        starts = self.starts
+        if not self.shift or self.shift_index >= len(starts):
+            self.shift_index = index
+            self.shift = delta
+        elif index < self.shift_index:
+            for i in range(index, self.shift_index):
+                starts[i] += delta
+            self.shift += delta
+        else:
+            shift = self.shift
+            for i in range(self.shift_index, index):
+                starts[i] += shift
+            self.shift_index = index
+            self.shift += delta
+
+    @property
+    def text(self):
+        return "".join(segment.text for segment in self.segments)
+
+    def apply_edit(self, offset, removed, inserted):
+        # replace `removed` characters at `offset` with the string `inserted`
+        length = len(self)
+        if offset < 0 or removed < 0 or offset + removed > length:
+            raise ValueError(f"Edit {offset}+{removed} out of range for {length} characters")
+        delta = len(inserted) - removed
+        segments = self.segments
+        starts = self.starts
+
+        # the damaged region: from the segment of the edit (or the one before, when the
+        # edit is at its start) to the segment holding the end of the edit's last line
+        first = last = 0
+        if segments:
+            first = self.find(offset)
+            if first > 0 and self.start(first) == offset:
+                first -= 1
+            last = self.find(offset + removed)
+            local = offset + removed - self.start(last)
+            while segments[last].text.find("\n", local) == -1 and last + 1 < len(segments):
+                last += 1
+                local = 0
+            while first > 0 and segments[first - 1].error is not None:
+                first -= 1
+            while last + 1 < len(segments) and segments[last + 1].error is not None:
+                last += 1
+        region_start = self.start(first) if segments else 0
+        text = "".join(segment.text for segment in segments[first:last + 1])
+        local = offset - region_start
+        text = text[:local] + inserted + text[local + removed:]
+
+        tokens = []
+        offsets = array('Q')
+        converted = self.converted
+        for kind, value, token_offset in scan_source_spans(text):
+            token = converted.get((kind, value))
+            if token is None:
+                token = converted[kind, value] = make_token(kind, value)
+            tokens.append(token)
+            offsets.append(token_offset)
+        lexed = len(tokens)
+
+        # parse the region, taking in the next segment while the last statement is unfinished
+        while True:
+            parser = Parser(tokens)
+            ends = []
+            statements = []
+            error = None
+            try:
+                for statement in parser.parse_iter():
+                    statements.append(statement)
+                    ends.append(parser.pos)
+            except ParseError as exception:
+                error = exception
+            if error is None or parser.kind != TokenType.EOF or last + 1 >= len(segments):
+                break
+            last += 1
+            following = segments[last]
+            shift = len(text)
+            text += following.text
+            tokens.extend(following.tokens)
+            offsets.extend(shift + token_offset for token_offset in following.offsets)
+        parsed = len(statements)
+
+        # new segments for the region, unchanged statements keep their nodes
+        old_statements = {segment.key(): segment.statement for segment in segments[first:last + 1]
+                          if segment.statement is not None}
+        pieces = list(zip(ends, statements))
+        if error is not None:
+            pieces.append((len(tokens), None))
+        bounds = [offsets[begin] for begin in ([0] + ends)[:len(pieces)]]
+        if bounds and first == 0:
+            bounds[0] = 0
+        elif not bounds and (first == 0 or not segments):
+            # nothing but comments and white space before the next statement
+            bounds = [0]
+            pieces = [(0, None)]
+        new_segments = []
+        new_starts = []
+        begin = 0
+        reused = 0
+        for i, (end, statement) in enumerate(pieces):
+            segment_start = bounds[i]
+            segment_end = bounds[i + 1] if i + 1 < len(bounds) else len(text)
+            segment = Segment(text[segment_start:segment_end], tokens[begin:end],
+                              array('Q', (token_offset - segment_start for token_offset in offsets[begin:end])))
+            if statement is not None:
+                previous = old_statements.get(segment.key())
+                if previous is not None:
+                    statement = previous
+                    reused += 1
+                segment.statement = statement
+            elif error is not None:
+                # the position of the error becomes an index into the segment's tokens
+                segment.error = ParseError(error.message, error.position - begin, error.token)
+            new_segments.append(segment)
+            new_starts.append(region_start + segment_start)
+            begin = end
+
+        # text before the first new statement stays with the segment before the region
+        leading = text[:bounds[0]] if bounds else text
+        if leading:
+            segments[first - 1].text += leading
+        # the segments after the region only move, which leaves the pending shift
+        # behind the region
+        self.shift_from(last + 1, delta)
+        count = len(segments)
+        segments[first:last + 1] = new_segments
+        starts[first:last + 1] = new_starts
+        self.shift_index += len(segments) - count
+        self.last_edit = {"lexed": lexed, "parsed": parsed, "reused": reused,
+                          "segments": len(new_segments)}
+        return self.last_edit
+
+    @property
+    def statements(self):
+        return [segment.statement for segment in self.segments if segment.statement is not None]
+
+    @property
+    def errors(self):
+        # (offset in the text, ParseError) of every segment that did not parse
+        errors = []
+        for start, segment in zip(self.segment_starts(), self.segments):
+            if segment.error is not None:
+                position = segment.error.position
+                if position < len(segment.offsets):
+                    start += segment.offsets[position]
+                errors.append((start, segment.error))
+        return errors
+
+    def tokens(self):
+        for segment in self.segments:
+            yield from segment.tokens
+
+    def token_offsets(self):
+        for start, segment in zip(self.segment_starts(), self.segments):
+            for token_offset in segment.offsets:
+                yield start + token_offset
+
+    def write_ast(self, out_file):
+        write_ast(self.statements, out_file)
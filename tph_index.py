@@ -0,0 +1,290 @@
+# Query index over a parsed program (tph_parser.py --index)
+#
+#   index = build_index(statements)              # index_iter for a stream
+#   index.register_ops(op="Conv", prop="kernel")
+#   index.assignments("i")
+#   index.register_ops(inside="while")
+#
+# One traversal numbers every node in preorder (tuple values are not nodes) and files
+# the numbers under what the queries ask for:
+#   kind_numbers    "register_op", "assign", "while", "if", "break" -> statements
+#   op_numbers      register_op ID (Conv, ...) -> RegisterOpNodes
+#   prop_numbers    prop name -> RegisterOpNodes that have the prop
+#   assign_numbers  variable -> AssignNodes that assign it
+#   read_numbers    variable -> IDNodes that read it (in an expression or a condition)
+# Every list is sorted. The subtree of node n is numbered n .. ends[n] - 1, so "inside
+# a while loop" (its condition included) is a range of numbers, and parents[n] is the
+# innermost while / if around node n. A query is a dict lookup plus a bisection per
+# range; nothing is walked again.
+# In a hash-consed AST a shared subtree is numbered at each of its occurrences, and
+# a node given to a query stands for its first one.
+# to_dict() holds only numbers, so the index is stored next to the AST (write_index)
+# and load_index() reattaches it to the same statements loaded from that AST.
+
+import argparse
+import json
+import sys
+from array import array
+from bisect import bisect_left
+
+from tph_hashcons import child_nodes
+from tph_parser import (
+    AssignNode, BreakNode, IDNode, IfNode, ParseError, Parser, RegisterOpNode, SourceMap, VarNode, WhileNode,
+    load_tokens, locate_errors
+)
+
+index_version = 1
+### statement classes and their kinds, the kinds a query can be restricted to with inside
+statement_kinds = {
+    RegisterOpNode: "register_op", AssignNode: "assign", WhileNode: "while", IfNode: "if", BreakNode: "break"
+}
+block_kinds = ("while", "if")
+
+def preorder(statements):
+    # the nodes of statements in index order
+    for statement in statements:
+        stack = [statement]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(child_nodes(node)))
+
+class ASTIndex:
+    def __init__(self):
+        self.nodes = []
+        self.ends = array('I')
+        self.parents = array('i')
+        self.kind_numbers = {kind: [] for kind in statement_kinds.values()}
+        self.op_numbers = {}
+        self.prop_numbers = {}
+        self.assign_numbers = {}
+        self.read_numbers = {}
+        # built on first use, reset by add
+        self.block_ranges = {}
+        self.node_numbers = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, statement):
+        # index one top-level statement; the stack holds (node, parent, reading) and
+        # the number of a node whose subtree ends when it is popped
+        nodes = self.nodes
+        ends = self.ends
+        parents = self.parents
+        kind_numbers = self.kind_numbers
+        read_numbers = self.read_numbers
+        stack = [(statement, -1, False)]
+        while stack:
+            entry = stack.pop()
+            if type(entry) is int:
+                ends[entry] = len(nodes)
+                continue
+            node, parent, reading = entry
+            number = len(nodes)
+            nodes.append(node)
+            ends.append(number + 1)
+            parents.append(parent)
+            cls = type(node)
+            if cls is IDNode or cls is VarNode:
+                if reading:
+                    read_numbers.setdefault(node.name, []).append(number)
+                continue
+            children = child_nodes(node)
+            if not children:
+                if cls is BreakNode:
+                    kind_numbers["break"].append(number)
+                continue
+            stack.append(number)
+            if cls is RegisterOpNode:
+                kind_numbers["register_op"].append(number)
+                self.op_numbers.setdefault(node.id_name.name, []).append(number)
+                for name in dict.fromkeys(prop.name.name for prop in node.props):
+                    self.prop_numbers.setdefault(name, []).append(number)
+                stack.extend((child, parent, False) for child in reversed(children))
+            elif cls is AssignNode:
+                kind_numbers["assign"].append(number)
+                self.assign_numbers.setdefault(node.variable.name, []).append(number)
+                stack.append((node.expression, parent, True))
+                stack.append((node.variable, parent, False))
+            elif cls is WhileNode or cls is IfNode:
+                kind_numbers[statement_kinds[cls]].append(number)
+                stack.extend((child, number, False) for child in reversed(children[1:]))
+                stack.append((children[0], number, True))
+            else:
+                stack.extend((child, parent, reading) for child in reversed(children))
+        self.block_ranges = {}
+        self.node_numbers = None
+
+    def number(self, node):
+        # preorder number of node
+        if self.node_numbers is None:
+            self.node_numbers = {}
+            for number, indexed in enumerate(self.nodes):
+                self.node_numbers.setdefault(id(indexed), number)
+        number = self.node_numbers.get(id(node))
+        if number is None:
+            raise KeyError(f"Node is not indexed: {node!r}")
+        return number
+
+    def ranges(self, inside):
+        # (starts, stops) of the ranges a query is restricted to: the outermost blocks
+        # of a kind, or one node
+        if inside in block_kinds:
+            if inside not in self.block_ranges:
+                starts, stops = [], []
+                for number in self.kind_numbers[inside]:
+                    if not stops or number >= stops[-1]:
+                        starts.append(number)
+                        stops.append(self.ends[number])
+                self.block_ranges[inside] = starts, stops
+            return self.block_ranges[inside]
+        number = self.number(inside)
+        return [number], [self.ends[number]]
+
+    def within(self, numbers, inside=None):
+        # the numbers (sorted) that are strictly inside the ranges of inside
+        if inside is None:
+            return numbers
+        result = []
+        for start, stop in zip(*self.ranges(inside)):
+            result.extend(numbers[bisect_left(numbers, start + 1):bisect_left(numbers, stop)])
+        return result
+
+    def select(self, numbers, inside=None):
+        nodes = self.nodes
+        return [nodes[number] for number in self.within(numbers, inside)]
+
+    ###### queries, inside is None, "while", "if" or an indexed node
+    def statements_of(self, kind, inside=None):
+        return self.select(self.kind_numbers[kind], inside)
+
+    def register_ops(self, op=None, prop=None, inside=None):
+        # RegisterOpNodes with ID op that have a prop named prop
+        numbers = self.kind_numbers["register_op"] if op is None else self.op_numbers.get(op, [])
+        if prop is not None:
+            having = self.prop_numbers.get(prop, [])
+            if op is None:
+                numbers = having
+            else:
+                numbers = sorted(set(numbers).intersection(having))
+        return self.select(numbers, inside)
+
+    def assignments(self, variable=None, inside=None):
+        numbers = self.kind_numbers["assign"] if variable is None else self.assign_numbers.get(variable, [])
+        return self.select(numbers, inside)
+
+    def reads(self, variable, inside=None):
+        return self.select(self.read_numbers.get(variable, []), inside)
+
+    def enclosing(self, node):
+        # innermost while / if around node, None at the top level
+        parent = self.parents[self.number(node)]
+        return self.nodes[parent] if parent >= 0 else None
+
+    ###### storage
+    def to_dict(self):
+        return {
+            "version": index_version,
+            "nodes": len(self.nodes),
+            "ends": self.ends.tolist(),
+            "parents": self.parents.tolist(),
+            "kinds": self.kind_numbers,
+            "ops": self.op_numbers,
+            "props": self.prop_numbers,
+            "assigned": self.assign_numbers,
+            "reads": self.read_numbers,
+        }
+
+    @classmethod
+    def from_dict(cls, data, statements):
+        # the index of data attached to statements, which must be the AST it was built on
+        if data.get("version") != index_version:
+            raise ValueError(f"Unsupported index version: {data.get('version')}")
+        index = cls()
+        index.nodes = list(preorder(statements))
+        if len(index.nodes) != data["nodes"]:
+            raise ValueError(f"Index of {data['nodes']} nodes does not match an AST of {len(index.nodes)}")
+        index.ends = array('I', data["ends"])
+        index.parents = array('i', data["parents"])
+        index.kind_numbers = data["kinds"]
+        index.op_numbers = data["ops"]
+        index.prop_numbers = data["props"]
+        index.assign_numbers = data["assigned"]
+        index.read_numbers = data["reads"]
+        return index
+
+def index_iter(statements, index=None):
+    # indexes a stream of statements as they pass through
+    index = ASTIndex() if index is None else index
+    for statement in statements:
+        index.add(statement)
+        yield statement
+
+def build_index(statements):
+    index = ASTIndex()
+    for statement in statements:
+        index.add(statement)
+    return index
+
+def write_index(index, out_file):
+    json.dump(index.to_dict(), out_file, separators=(",", ":"))
+
+def load_index(file_path, statements):
+    with open(file_path, 'r') as index_file:
+        return ASTIndex.from_dict(json.load(index_file), statements)
+
+def describe(node):
+    cls = type(node)
+    if cls is RegisterOpNode:
+        return f"register_op {node.id_name.name}"
+    if cls is AssignNode:
+        return f"assign {node.variable.name}"
+    if cls is IDNode or cls is VarNode:
+        return f"read {node.name}"
+    return statement_kinds.get(cls, cls.__name__)
+
+def main(argv=None):
+    arg_parse = argparse.ArgumentParser(description="Query the statements of a .hl program or token file")
+    arg_parse.add_argument("filename", type=str, help="Input token file or .hl source")
+    arg_parse.add_argument("--source", type=str, help="Source of a token file written by `scanner -p`")
+    arg_parse.add_argument("--op", type=str, help="register_op statements with this ID")
+    arg_parse.add_argument("--prop", type=str, help="register_op statements with this prop")
+    arg_parse.add_argument("--assigned", type=str, help="Assignments to this variable")
+    arg_parse.add_argument("--read", type=str, help="Reads of this variable")
+    arg_parse.add_argument("--inside", choices=block_kinds, help="Only inside while loops / if statements")
+    args = arg_parse.parse_args(argv)
+
+    # a missing input or a syntax error is reported like tph_parser.py does, with the
+    # line and column of the error when the source is known
+    source_path = args.filename if args.filename.endswith(".hl") else args.source
+    try:
+        tokens = load_tokens(args.filename)
+        index = build_index(Parser(tokens).parse_iter())
+    except (OSError, ParseError) as error:
+        locate_errors([error], source_path, binary=not args.filename.endswith(".hl"))
+        print(error, file=sys.stderr)
+        sys.exit(1)
+    if args.assigned is not None:
+        found = index.assignments(args.assigned, args.inside)
+    elif args.read is not None:
+        found = index.reads(args.read, args.inside)
+    else:
+        found = index.register_ops(args.op, args.prop, args.inside)
+
+    source_map = None
+    if source_path is not None and tokens.offsets:
+        try:
+            with open(source_path, 'r' if args.filename.endswith(".hl") else 'rb') as source_file:
+                source_map = SourceMap(tokens.offsets, source_file.read())
+        except OSError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+    for node in found:
+        span = source_map.span(node) if source_map is not None else None
+        where = f"{span[0][0]}:{span[0][1]}" if span else f"token {node.start}"
+        print(f"{where} {describe(node)}")
+    print(f"{len(found)} found", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# Table-driven LL(1) engine for the language of tph_parser.py
+#
+# The grammar below is the one in README.txt, rewritten to be LL(1):
+#   - expr is left-recursive in the README, here it is `operand expr_tail`
+#   - condition is left-factored into `ID comparison | NUM comparison | KeyWord`
+#   - ε is written as `ε`, terminals are TokenType names, `#name` is a semantic action
+# FIRST/FOLLOW sets and the parse table are computed once per process from this text,
+# and kept in the cache directory when the AST cache is on (--cache). Parsing runs on
+# an explicit symbol stack and the actions build the same node classes as the
+# recursive-descent Parser, on a value stack.
+
+import hashlib
+import json
+import os
+import tempfile
+from itertools import chain
+
+from tph_parser import (
+    AssignNode, BinOpNode, BreakNode, IDNode, IfNode, KeyWordNode, NumberColumn, NumberNode, NumberValues,
+    Parser, PropNode, RegisterOpNode, TokenType, TupleNode, WhileNode,
+    token_buffers, token_kinds, token_names
+)
+
+LL1_GRAMMAR = """
+S -> PSs
+PSs -> PS #statement PSs | ε
+PS -> reg_stmt | if_stmt | while_stmt
+
+reg_stmt -> REGISTER_OP #value ID #id LPAREN #mark tu_prop_a RPAREN #register_op
+tu_prop_a -> prop tu_prop_b
+tu_prop_b -> COMMA prop tu_prop_b | ε
+prop -> ID #id COLON num_or_tuple #prop
+num_or_tuple -> NUM #number | LPAREN #mark list_num_a RPAREN #tuple
+list_num_a -> NUM #number list_num_b
+list_num_b -> COMMA NUM #number list_num_b | ε
+
+while_stmt -> While condition LBRACE #mark general_statements RBRACE #while
+general_statements -> general_statement general_statements | ε
+general_statement -> if_stmt | BREAK #break | assignment | reg_stmt
+
+if_stmt -> IF condition LBRACE #mark statements RBRACE #mark else_stmt #if
+else_stmt -> ELSE LBRACE statements RBRACE | ε
+condition -> ID #id comparison | NUM #number comparison | KeyWord #keyword
+comparison -> CompEqual #operator operand #binop | CompNotEqual #operator operand #binop | ε
+operand -> ID #id | NUM #number
+statements -> statement statements | ε
+statement -> BREAK #break | assignment | reg_stmt
+assignment -> ID #id EQUALS expr #assign
+expr -> operand expr_tail
+expr_tail -> PLUS #operator operand #binop expr_tail | ε
+"""
+
+EPSILON = "ε"
+END = token_names[TokenType.EOF]
+
+class GrammarError(ValueError):
+    pass
+
+def load_grammar(text):
+    # (start symbol, productions) with productions as (lhs, [symbols]) in text order
+    productions = []
+    start = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        lhs, _, rhs = line.partition("->")
+        lhs = lhs.strip()
+        if not rhs:
+            raise GrammarError(f"Missing '->' in: {line}")
+        start = start or lhs
+        for alternative in rhs.split("|"):
+            symbols = [symbol for symbol in alternative.split() if symbol != EPSILON]
+            productions.append((lhs, symbols))
+    return start, productions
+
+def is_action(symbol):
+    return symbol.startswith("#")
+
+def compute_first_follow(start, productions):
+    nonterminals = {lhs for lhs, _ in productions}
+    first = {lhs: set() for lhs in nonterminals}
+    nullable = set()
+
+    def first_of(symbols):
+        # (FIRST set, nullable) of a symbol sequence, actions derive ε
+        result = set()
+        for symbol in symbols:
+            if is_action(symbol):
+                continue
+            if symbol not in nonterminals:
+                result.add(symbol)
+                return result, False
+            result |= first[symbol]
+            if symbol not in nullable:
+                return result, False
+        return result, True
+
+    changed = True
+    while changed:
+        changed = False
+        for lhs, symbols in productions:
+            symbols_first, symbols_nullable = first_of(symbols)
+            if not symbols_first <= first[lhs]:
+                first[lhs] |= symbols_first
+                changed = True
+            if symbols_nullable and lhs not in nullable:
+                nullable.add(lhs)
+                changed = True
+
+    follow = {lhs: set() for lhs in nonterminals}
+    follow[start].add(END)
+    changed = True
+    while changed:
+        changed = False
+        for lhs, symbols in productions:
+            for i, symbol in enumerate(symbols):
+                if symbol not in nonterminals:
+                    continue
+                rest_first, rest_nullable = first_of(symbols[i + 1:])
+                addition = rest_first | (follow[lhs] if rest_nullable else set())
+                if not addition <= follow[symbol]:
+                    follow[symbol] |= addition
+                    changed = True
+    return first, follow, first_of
+
+def build_table(start, productions):
+    # {nonterminal: {terminal: production index}}, raises GrammarError on conflicts
+    first, follow, first_of = compute_first_follow(start, productions)
+    table = {lhs: {} for lhs, _ in productions}
+    for index, (lhs, symbols) in enumerate(productions):
+        symbols_first, symbols_nullable = first_of(symbols)
+        lookaheads = symbols_first | (follow[lhs] if symbols_nullable else set())
+        for terminal in lookaheads:
+            if terminal in table[lhs] and table[lhs][terminal] != index:
+                raise GrammarError(f"LL(1) conflict in {lhs} on {terminal}")
+            table[lhs][terminal] = index
+    return {
+        "start": start,
+        "productions": productions,
+        "table": table,
+        "first": {lhs: sorted(symbols) for lhs, symbols in first.items()},
+        "follow": {lhs: sorted(symbols) for lhs, symbols in follow.items()},
+    }
+
+def load_ll1_table(grammar_text=LL1_GRAMMAR, cache_dir=None):
+    # the table is stored in cache_dir as JSON named by a hash of the grammar text,
+    # cache_dir=None computes it without touching the disk
+    digest = hashlib.sha256(grammar_text.encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"ll1-{digest}.json") if cache_dir is not None else None
+    if path is not None:
+        try:
+            with open(path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            pass
+    tables = build_table(*load_grammar(grammar_text))
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w') as file:
+            json.dump(tables, file)
+        os.replace(temp_path, path)
+    return tables
+
+
+###### parser
+MARK = object()
+
+### terminals whose value an action reads (after the terminal, as last_value)
+valued_kinds = {TokenType.ID, TokenType.NUM, TokenType.KeyWord, TokenType.REGISTER_OP}
+
+def pop_to_mark(values):
+    i = len(values) - 1
+    while values[i] is not MARK:
+        i -= 1
+    items = values[i + 1:]
+    del values[i:]
+    return items
+
+class LL1Parser:
+    # same interface as tph_parser.Parser (parse / parse_iter) without error recovery
+    def __init__(self, tokens, table=None, cache_dir=None):
+        # table is a compiled start table, the default one is read from / written to
+        # cache_dir when that is set
+        self.number_values = NumberValues()
+        self.pos = 0
+        self.chunk_start = 0
+        self.chunk_values = self.chunk_strings = self.chunk_offsets = ()
+        self.tokens = chain.from_iterable(map(self.enter_chunk, token_buffers(tokens)))
+        self.kind = next(self.tokens, TokenType.EOF)
+        self.errors = []
+        self.start = table or default_table(cache_dir)
+        self.numbers = NumberColumn()
+
+    pack_numbers = Parser.pack_numbers
+    enter_chunk = Parser.enter_chunk
+    value = Parser.value
+    current_token = Parser.current_token
+    error = Parser.error
+
+    def parse(self):
+        return list(self.parse_iter())
+
+    def parse_iter(self):
+        values = []
+        push_value = values.append
+        pop_value = values.pop
+        tokens = self.tokens
+        kind = self.kind
+        last_kind = last_value = None
+        eof = TokenType.EOF
+
+        # the symbol stack holds terminals (TokenType kinds, >= 0), nonterminals (dict of
+        # lookahead -> reversed right-hand side) and actions (negative ints)
+        stack = [self.start]
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            symbol = pop()
+            if type(symbol) is dict:
+                rhs = symbol.get(kind)
+                if rhs is None:
+                    self.kind = kind
+                    expected = sorted(token_names[terminal] for terminal in symbol)
+                    raise self.error(f"Expected {expected}, got {token_names[kind]}")
+                extend(rhs)
+            elif symbol >= 0:
+                if kind != symbol:
+                    self.kind = kind
+                    raise self.error(f"Expected {token_names[symbol]}, got {token_names[kind]}")
+                last_kind = kind
+                if kind in valued_kinds:
+                    last_value = self.chunk_strings[self.chunk_values[self.pos - self.chunk_start]]
+                self.pos += 1
+                kind = next(tokens, eof)
+            elif symbol == ACTION_NUMBER:
+                push_value(NumberNode(self.number_values[last_value]))
+            elif symbol == ACTION_ID:
+                push_value(IDNode(last_value))
+            elif symbol == ACTION_MARK:
+                push_value(MARK)
+            elif symbol == ACTION_PROP:
+                prop_value = pop_value()
+                values[-1] = PropNode(values[-1], prop_value)
+            elif symbol == ACTION_TUPLE:
+                push_value(TupleNode(self.pack_numbers([number.value for number in pop_to_mark(values)])))
+            elif symbol == ACTION_BINOP:
+                right = pop_value()
+                operator = pop_value()
+                values[-1] = BinOpNode(values[-1], operator, right)
+            elif symbol == ACTION_OPERATOR:
+                push_value(last_kind)
+            elif symbol == ACTION_ASSIGN:
+                expression = pop_value()
+                values[-1] = AssignNode(values[-1], expression)
+            elif symbol == ACTION_VALUE:
+                push_value(last_value)
+            elif symbol == ACTION_REGISTER_OP:
+                props = pop_to_mark(values)
+                id_name = pop_value()
+                values[-1] = RegisterOpNode(values[-1], id_name, props)
+            elif symbol == ACTION_BREAK:
+                push_value(BreakNode())
+            elif symbol == ACTION_KEYWORD:
+                push_value(KeyWordNode(last_value))
+            elif symbol == ACTION_WHILE:
+                statements = pop_to_mark(values)
+                values[-1] = WhileNode(values[-1], statements)
+            elif symbol == ACTION_IF:
+                false_branch = pop_to_mark(values)
+                true_branch = pop_to_mark(values)
+                values[-1] = IfNode(values[-1], true_branch, false_branch)
+            elif symbol == ACTION_STATEMENT:
+                self.kind = kind
+                yield pop_value()
+        self.kind = kind
+        if kind != TokenType.EOF:
+            raise self.error(f"Expected EOF, got {token_names[kind]}")
+
+### actions are negative ints on the symbol stack, the driver tests the common ones first
+action_codes = {
+    "#number": -1, "#id": -2, "#mark": -3, "#prop": -4, "#tuple": -5, "#binop": -6, "#operator": -7,
+    "#assign": -8, "#value": -9, "#register_op": -10, "#break": -11, "#keyword": -12, "#while": -13,
+    "#if": -14, "#statement": -15
+}
+(ACTION_NUMBER, ACTION_ID, ACTION_MARK, ACTION_PROP, ACTION_TUPLE, ACTION_BINOP, ACTION_OPERATOR,
+ ACTION_ASSIGN, ACTION_VALUE, ACTION_REGISTER_OP, ACTION_BREAK, ACTION_KEYWORD, ACTION_WHILE,
+ ACTION_IF, ACTION_STATEMENT) = range(-1, -1 - len(action_codes), -1)
+
+def compile_table(tables):
+    # turn the JSON tables into linked dicts: every nonterminal becomes one dict from
+    # lookahead kind to its reversed right-hand side, where nonterminals are replaced by
+    # their own dicts and terminal names by their kinds. Returns the dict of the start symbol.
+    nonterminals = {lhs: {} for lhs in tables["table"]}
+    for lhs, row in tables["table"].items():
+        for terminal, index in row.items():
+            rhs = []
+            for symbol in reversed(tables["productions"][index][1]):
+                if symbol in nonterminals:
+                    rhs.append(nonterminals[symbol])
+                elif is_action(symbol):
+                    rhs.append(action_codes[symbol])
+                else:
+                    rhs.append(token_kinds[symbol])
+            nonterminals[lhs][token_kinds[terminal]] = tuple(rhs)
+    return nonterminals[tables["start"]]
+
+### the compiled default table per cache directory (None: in memory only), loaded on first use
+default_tables = {}
+
+def default_table(cache_dir=None):
+    if cache_dir not in default_tables:
+        default_tables[cache_dir] = compile_table(load_ll1_table(cache_dir=cache_dir))
+    return default_tables[cache_dir]
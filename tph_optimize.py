@@ -0,0 +1,197 @@
+# Optional optimization pass over the AST (tph_parser.py --optimize)
+#
+#   report = OptimizeReport()
+#   statements = optimize(statements, report)     # optimize_iter for a stream
+#   report.print()
+#
+# One pass over every node, so the time is linear in the size of the AST:
+#   '+' chains  constants are added up and moved to the end, `1 + x + 2 + y` becomes
+#               `x + y + 3.0` and a chain of constants one NumberNode (values are
+#               integers, so reassociating them is exact below 2**53)
+#   conditions  NUM ==/!= NUM and literal NUM conditions are evaluated
+#   if          a static condition keeps only the live branch, spliced into the
+#               enclosing block; at the top level, where no block encloses it, the if
+#               stays with its folded condition. An if with two empty branches is
+#               dropped
+#   while       a loop whose condition is statically false, or whose body starts
+#               with `break`, is deleted
+#   break       statements after a `break` in the same block never run
+# Conditions have no side effects, so removing one never changes what a program
+# does. Keyword conditions (generate_success, ...) are only known at run time and
+# are kept. Truth values are those of tph_exec.py: a condition is true when it is
+# not 0. Input nodes are never modified, changed statements are rebuilt.
+
+import sys
+
+from tph_arena import node_fields
+from tph_parser import (
+    AssignNode, BinOpNode, BreakNode, IfNode, NumberNode, TokenType, TupleNode, WhileNode
+)
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if type(node) is TupleNode:
+            count += len(node.values)
+        elif type(node) is not NumberNode:
+            stack.extend(node_fields(node)[1])
+    return count
+
+def plural(count, word, words=None):
+    return f"{count} {word}" if count == 1 else f"{count} {words or word + 's'}"
+
+class OptimizeReport:
+    def __init__(self):
+        self.additions = 0          # '+' BinOpNodes folded away
+        self.conditions = 0         # conditions evaluated statically
+        self.branches = 0           # dead if branches dropped
+        self.branch_statements = 0  # statements in them
+        self.ifs = 0                # if statements replaced by their live branch or dropped
+        self.loops = 0              # while loops deleted
+        self.loop_statements = 0    # statements in them
+        self.unreachable = 0        # statements after a break
+        self.nodes = 0              # AST nodes removed in total
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        return (f"optimize: {plural(self.additions, 'addition')} folded, "
+                f"{plural(self.conditions, 'condition')} evaluated, "
+                f"{plural(self.ifs, 'if')} removed ({plural(self.branches, 'dead branch', 'dead branches')}, "
+                f"{plural(self.branch_statements, 'statement')}), "
+                f"{plural(self.loops, 'while loop')} removed ({plural(self.loop_statements, 'statement')}), "
+                f"{plural(self.unreachable, 'unreachable statement')} removed, "
+                f"{plural(self.nodes, 'node')} removed in total")
+
+    def print(self, out_file=sys.stderr):
+        print(self, file=out_file)
+
+class Optimizer:
+    def __init__(self, report=None):
+        self.report = report if report is not None else OptimizeReport()
+
+    def removed(self, nodes):
+        for node in nodes:
+            self.report.nodes += count_nodes(node)
+
+    def block(self, statements):
+        # the optimized statements of a block, nothing is kept after a break
+        result = []
+        for index, statement in enumerate(statements):
+            result.extend(self.statement(statement))
+            if result and type(result[-1]) is BreakNode:
+                rest = statements[index + 1:]
+                self.report.unreachable += len(rest)
+                self.removed(rest)
+                break
+        return result
+
+    def statement(self, node, top_level=False):
+        # the statements that replace node, none, one, or a spliced branch
+        cls = type(node)
+        if cls is AssignNode:
+            expression = self.expression(node.expression)
+            if expression is node.expression:
+                return [node]
+            return [AssignNode(node.variable, expression)]
+        if cls is IfNode:
+            condition, static = self.condition(node.condition)
+            if static is not None:
+                live, dead = (node.true_branch, node.false_branch) if static else (node.false_branch, node.true_branch)
+                if dead:
+                    self.report.branches += 1
+                    self.report.branch_statements += len(dead)
+                    self.removed(dead)
+                live = self.block(live)
+                if top_level and live:
+                    return [IfNode(condition, live, []) if static else IfNode(condition, [], live)]
+                self.report.ifs += 1
+                self.report.nodes += 1
+                self.removed([condition])
+                return live
+            true_branch = self.block(node.true_branch)
+            false_branch = self.block(node.false_branch)
+            if not true_branch and not false_branch:
+                self.report.ifs += 1
+                self.report.nodes += 1
+                self.removed([condition])
+                return []
+            return [IfNode(condition, true_branch, false_branch)]
+        if cls is WhileNode:
+            condition, static = self.condition(node.condition)
+            if static is False:
+                self.report.loops += 1
+                self.report.loop_statements += len(node.statements)
+                self.report.nodes += 1
+                self.removed([condition])
+                self.removed(node.statements)
+                return []
+            statements = self.block(node.statements)
+            if statements and type(statements[0]) is BreakNode:
+                self.report.loops += 1
+                self.report.loop_statements += len(statements)
+                self.report.nodes += 1
+                self.removed([condition])
+                self.removed(statements)
+                return []
+            return [WhileNode(condition, statements)]
+        return [node]
+
+    def condition(self, node):
+        # (condition, True / False if it is known statically, None otherwise); a
+        # static comparison is replaced by the NumberNode of its truth value
+        cls = type(node)
+        if cls is NumberNode:
+            self.report.conditions += 1
+            return node, node.value != 0
+        if (cls is BinOpNode and type(node.left) is NumberNode and type(node.right) is NumberNode
+                and node.operator in (TokenType.CompEqual, TokenType.CompNotEqual)):
+            self.report.conditions += 1
+            static = (node.left.value == node.right.value) == (node.operator == TokenType.CompEqual)
+            self.report.nodes += 2
+            return NumberNode(1.0 if static else 0.0), static
+        return node, None
+
+    def expression(self, node):
+        # a '+' chain with its constants added up at the end
+        if type(node) is not BinOpNode:
+            return node
+        terms = []
+        left = node
+        while type(left) is BinOpNode and left.operator == TokenType.PLUS:
+            terms.append(left.right)
+            left = left.left
+        terms.append(left)
+        terms.reverse()
+        variables = [term for term in terms if type(term) is not NumberNode]
+        constants = [term.value for term in terms if type(term) is NumberNode]
+        # nothing to fold: no constant, or a single non-zero one that is already last
+        if not constants or (len(constants) == 1 and type(terms[-1]) is NumberNode and constants[0]):
+            return node
+        total = constants[0]
+        for value in constants[1:]:
+            total += value
+        folded = variables + [NumberNode(total)] if total or not variables else variables
+        self.report.additions += len(terms) - len(folded)
+        self.report.nodes += 2 * (len(terms) - len(folded))
+        return self.rebuild(folded)
+
+    def rebuild(self, terms):
+        result = terms[0]
+        for term in terms[1:]:
+            result = BinOpNode(result, TokenType.PLUS, term)
+        return result
+
+def optimize_iter(statements, report=None):
+    # optimizes a stream of top-level statements one at a time; they are never spliced,
+    # so a break stays inside its block and every later statement is kept
+    optimizer = Optimizer(report)
+    for statement in statements:
+        yield from optimizer.statement(statement, top_level=True)
+
+def optimize(statements, report=None):
+    return list(optimize_iter(statements, report))
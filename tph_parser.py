@@ -7,40 +7,67 @@
 # expr -> ID | expr + ID | expr - ID
 
 import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from itertools import accumulate, chain, islice
+
+### optional, decodes large batches of number literals in C
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class TokenType:
-    IF = 'IF'
-    ELSE = 'ELSE'
-    ID = 'ID'
-    LBRACE = 'LBRACE'
-    RBRACE = 'RBRACE'
-    BREAK = 'BREAK'
-    EQUALS = 'EQUALS'
-    PLUS = 'PLUS'
-    EOF = 'EOF'
-    REGISTER_OP = 'REGISTER_OP'
-    LPAREN = 'LPAREN'
-    RPAREN = 'RPAREN'
-    COLON = 'COLON'
-    COMMA = 'COMMA'
-    NUM = 'NUM'
-    KeyWord = 'KeyWord'
-    While = 'While'
-    CompEqual = 'CompEqual'
-    CompNotEqual = 'CompNotEqual'
+    # token kinds are small ints, so a stream of them fits in an array('B') and the
+    # parser compares ints; token_names has the name of each kind for messages and output
+    IF = 0
+    ELSE = 1
+    ID = 2
+    LBRACE = 3
+    RBRACE = 4
+    BREAK = 5
+    EQUALS = 6
+    PLUS = 7
+    EOF = 8
+    REGISTER_OP = 9
+    LPAREN = 10
+    RPAREN = 11
+    COLON = 12
+    COMMA = 13
+    NUM = 14
+    KeyWord = 15
+    While = 16
+    CompEqual = 17
+    CompNotEqual = 18
+    Operator = 19
+
+### name -> kind and kind -> name
+token_kinds = {name: kind for name, kind in vars(TokenType).items() if not name.startswith("_")}
+token_names = tuple(sorted(token_kinds, key=token_kinds.get))
 
 file_word_to_tokens = {
-    "Keyword": "KeyWord",
-    "Identifier": "ID",
-    "Number": "NUM",
-    "Left Parenthesis": "LPAREN",
-    "Right Parenthesis": "RPAREN",
-    "Comma": "COMMA",
-    "Colon": "COLON",
-    "Left Curly Brace": "LBRACE",
-    "Right Curly Brace": "RBRACE",
-    "Register Operation": "REGISTER_OP",
-    "Operator": "Operator"
+    "Keyword": TokenType.KeyWord,
+    "Identifier": TokenType.ID,
+    "Number": TokenType.NUM,
+    "Left Parenthesis": TokenType.LPAREN,
+    "Right Parenthesis": TokenType.RPAREN,
+    "Comma": TokenType.COMMA,
+    "Colon": TokenType.COLON,
+    "Left Curly Brace": TokenType.LBRACE,
+    "Right Curly Brace": TokenType.RBRACE,
+    "Register Operation": TokenType.REGISTER_OP,
+    "Operator": TokenType.Operator
 }
 
 ### Here we further convert the some keywords to token type with finer granularity
@@ -62,446 +89,965 @@ operator_tokentype_conversion = {
     "!=": TokenType.CompNotEqual
 }
 
+### keyword and operator tables of scanner.cpp, used by the in-process lexer
+scanner_keywords = {
+    "register_sequencial", "for", "to", "begin_generate", "end_generate",
+    "set_seq_attr", "register_op", "break", "report", "if", "else", "while",
+    "return", "set_soc_attr", "generate_success", "true", "false"
+}
+scanner_operators = {
+    "+", "-", "*", "/", "=", "==", "!=", ">=", "<=", ">", "<", "&&", "||"
+}
+scanner_punctuations = {
+    "(": "Left Parenthesis",
+    ")": "Right Parenthesis",
+    "{": "Left Curly Brace",
+    "}": "Right Curly Brace",
+    ":": "Colon",
+    "\"": "Quotation",
+    ",": "Comma"
+}
+
+### one alternation per scanner state, tried in the same order as Scanner::get_next_token
+scanner_pattern = re.compile(r'''
+    (?P<comment>//[^\n]*)
+  | (?P<space>[ \t\n\r\f\v]+)
+  | (?P<number>[0-9][A-Za-z0-9]*)
+  | (?P<word>[A-Za-z][A-Za-z0-9_]*)
+  | (?P<operator>[-+*/=!><&|]+)
+  | (?P<punct>[(){}:",])
+  | (?P<unknown>.)
+''', re.VERBOSE | re.DOTALL)
+
+### binary token files written by `scanner -b`, see dump_tokens_binary in scanner.cpp
+token_file_magic = b"TPHT"
+token_file_version = 1
+### `scanner -b -p` writes version 3, which adds a u64 byte offset per token after the records;
+### version 2 files, whose offsets are u32, are still read
+token_file_offsets_version = 3
+token_file_offset_sizes = {2: 4, token_file_offsets_version: 8}
+token_file_header = struct.Struct("<4sBII")
+token_file_length = struct.Struct("<I")
+token_file_record = struct.Struct("<BI")
+### indexed by the TokenType enum of scanner.cpp
+binary_token_kinds = (
+    "Keyword", "Identifier", "Number", "Operator", "End of File",
+    "Left Parenthesis", "Right Parenthesis", "Left Curly Brace", "Right Curly Brace",
+    "Colon", "Quotation", "Comma", "Unknown"
+)
 
 
 
 
 class Token:
+    # a single token as an object, parsers read TokenBuffer chunks instead
+    __slots__ = ('type', 'value')
     def __init__(self, type, value=None):
         self.type = type
         self.value = value
 
     def __repr__(self):
-        return f"Token({self.type}, {self.value})"
+        return f"Token({token_names[self.type]}, {self.value})"
+
+class SymbolIds(dict):
+    # name -> symbol id, unknown names get the next id
+    __slots__ = ('names',)
+    def __init__(self):
+        self.names = []
+
+    def __missing__(self, name):
+        symbol = self[name] = len(self.names)
+        self.names.append(name)
+        return symbol
+
+class NumberValues(dict):
+    # number literal text -> float, each literal is converted once
+    __slots__ = ()
+    def __missing__(self, text):
+        value = self[text] = float(text)
+        return value
+
+### tokens per TokenBuffer chunk of a streamed input
+token_chunk_size = 1 << 16
+
+class TokenBuffer:
+    # tokens as parallel arrays: kinds[i] is the TokenType of token i and
+    # strings[values[i]] its value. Each streamed chunk has its own SymbolIds (the
+    # chunks of a binary token file share the file's string table), so a distinct value
+    # is stored once per chunk, the tables of a chunk are freed with it, and a token
+    # costs 5 bytes instead of a Token.
+    # Parsers only iterate the kinds and look a value up when they need it, iterating
+    # a buffer makes Token objects for other code.
+    # offsets[i] is where token i starts in the source (see SourceMap), it stays empty
+    # for tokens without positions.
+    __slots__ = ('kinds', 'values', 'offsets', 'ids', 'strings')
+    def __init__(self, ids=None):
+        self.kinds = array('B')
+        self.values = array('I')
+        self.offsets = array('Q')
+        self.ids = ids if ids is not None else SymbolIds()
+        self.strings = self.ids.names
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, kind, value):
+        self.kinds.append(kind)
+        self.values.append(self.ids[value])
+
+    def __getitem__(self, index):
+        return Token(self.kinds[index], self.strings[self.values[index]])
+
+    def __iter__(self):
+        strings = self.strings
+        for kind, value in zip(self.kinds, self.values):
+            yield Token(kind, strings[value])
+
+    def __repr__(self):
+        return f"TokenBuffer({len(self)} tokens, {len(self.strings)} values)"
+
+def token_buffers(tokens):
+    # TokenBuffer chunks of a TokenBuffer, of an iterable of them (the tokenizers) or of
+    # an iterable of Token objects, which are packed into chunks here. Chunks read
+    # before a tokenizer error are passed on first, so the error surfaces at its token.
+    if type(tokens) is TokenBuffer:
+        yield tokens
+        return
+    buffer = TokenBuffer()
+    try:
+        for token in tokens:
+            if type(token) is TokenBuffer:
+                if buffer.kinds:
+                    yield buffer
+                    buffer = TokenBuffer()
+                yield token
+                continue
+            buffer.append(token.type, token.value)
+            if len(buffer.kinds) == token_chunk_size:
+                yield buffer
+                buffer = TokenBuffer()
+    except ParseError:
+        if buffer.kinds:
+            yield buffer
+        raise
+    if buffer.kinds:
+        yield buffer
+
+class LineIndex:
+    # start offset of every line of a source (str or bytes), built once; line_column
+    # finds the line of an offset by bisection
+    __slots__ = ('starts',)
+    def __init__(self, source):
+        lines = source.split(b"\n" if isinstance(source, bytes) else "\n")
+        self.starts = array('Q', accumulate(map((1).__add__, map(len, lines)), initial=0))
+        # the last entry is one past the end of the source
+        self.starts.pop()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line_column(self, offset):
+        # 1-based line and column of offset
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+class SourceMap:
+    # line and column of the tokens and nodes of one input: offsets is its packed offsets
+    # column (TokenBuffer.offsets) and source the text they point into, bytes for token
+    # files of `scanner -p`, characters for the in-process lexer. Nothing is computed
+    # before the first lookup, which builds the LineIndex.
+    __slots__ = ('offsets', 'source', 'lines')
+    def __init__(self, offsets, source):
+        self.offsets = offsets
+        self.source = source
+        self.lines = None
+
+    def line_index(self):
+        if self.lines is None:
+            self.lines = LineIndex(self.source)
+        return self.lines
+
+    def location(self, index):
+        # (line, column) of token index, None for a token without an offset
+        if not 0 <= index < len(self.offsets):
+            return None
+        return self.line_index().line_column(self.offsets[index])
+
+    def span(self, node):
+        # (line, column) of the first and of the last token of node, None for a node
+        # without a token span (built by the ll1 engine or loaded from a file)
+        start = getattr(node, "start", None)
+        if start is None:
+            return None
+        return self.location(start), self.location(node.end - 1)
 
 # AST Nodes
 class ASTNode:
-    pass
+    # nodes use __slots__ to avoid a per-instance __dict__ on large trees. The rd Parser
+    # sets start and end, the [start, end) range of token indices a node was parsed from;
+    # a SourceMap turns them into lines and columns.
+    __slots__ = ('start', 'end')
+
+    @classmethod
+    def from_dict(cls, data):
+        # build any node from the dict of its to_dict(), dispatching on "type"
+        return ast_node_classes[data["type"]].from_dict(data)
+
+    def print_parse(self, depth=0):
+        emitter = ASTEmitter(sys.stdout)
+        emitter.emit(self, depth)
+        emitter.flush()
+
+    def output_parse(self, depth=0, out_file=None):
+        emitter = ASTEmitter(out_file)
+        emitter.emit(self, depth)
+        emitter.flush()
 
 ###### for registering operation
 class RegisterOpNode(ASTNode):
+    __slots__ = ('op_name', 'id_name', 'props')
     def __init__(self, op_name, id_name, props):
         self.op_name = op_name
         self.id_name = id_name
         self.props = props
 
+    def to_dict(self):
+        return {"type": "RegisterOpNode", "op_name": self.op_name, "id_name": self.id_name.to_dict(),
+                "props": [prop.to_dict() for prop in self.props]}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["op_name"], ASTNode.from_dict(data["id_name"]),
+                   [ASTNode.from_dict(prop) for prop in data["props"]])
     def __repr__(self):
         return f"RegisterOpNode(op_name={self.op_name}, id_name={self.id_name}, props={self.props})"
-    def print_parse(self, depth=0):
-        # node type
-        print('  ' * depth + f"RegisterOpNode({self.op_name})")
-        depth += 1
-        # operator and properties
-        print('  ' * depth + f"operation_type:")
-        self.id_name.print_parse(depth+1)
-        print('  ' * depth + f"properties:")
-        for prop in self.props:
-            prop.print_parse(depth+1)
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"RegisterOpNode({self.op_name})\n")
-        depth += 1
-        out_file.write('  ' * depth + f"operation_type:\n")
-        self.id_name.output_parse(depth+1, out_file)
-        out_file.write('  ' * depth + f"properties:\n")
-        for prop in self.props:
-            prop.output_parse(depth+1, out_file)
 
 class PropNode(ASTNode):
+    __slots__ = ('name', 'value')
     def __init__(self, name, value):
         self.name = name
         self.value = value
 
+    def to_dict(self):
+        return {"type": "PropNode", "name": self.name.to_dict(), "value": self.value.to_dict()}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(ASTNode.from_dict(data["name"]), ASTNode.from_dict(data["value"]))
     def __repr__(self):
         return f"PropNode(name={self.name}, value={self.value})"
 
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"PropNode")
-        depth += 1
-        print('  ' * depth + f"name:")
-        self.name.print_parse(depth+1)
-        print('  ' * depth + f"value:")
-        self.value.print_parse(depth+1)
-    
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"PropNode\n")
-        depth += 1
-        out_file.write('  ' * depth + f"name:\n")
-        self.name.output_parse(depth+1, out_file)
-        out_file.write('  ' * depth + f"value:\n")
-        self.value.output_parse(depth+1, out_file)
-
-
 class NumberNode(ASTNode):
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
+    def to_dict(self):
+        return {"type": "NumberNode", "value": self.value}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(float(data["value"]))
     def __repr__(self):
         return f"NumberNode(value={self.value})"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"NumberNode(value={self.value})")
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"NumberNode(value={self.value})\n")
+
+###### packed tuple values
+### literals decoded per numpy call at least, smaller batches don't pay for the conversion
+numpy_min_numbers = 1024
+### values per NumberColumn of a parse, a column is freed once no tuple refers to it
+number_column_size = 1 << 16
+
+def decode_numbers(values):
+    # float64 array of number literal texts (or floats), converted in one call
+    if numpy is not None and len(values) >= numpy_min_numbers:
+        decoded = array('d')
+        decoded.frombytes(numpy.array(values).astype(numpy.float64).tobytes())
+        return decoded
+    return array('d', map(float, values))
+
+class NumberColumn:
+    # append-only float64 buffer shared by the TupleNodes of a parse. Tuple literals are
+    # queued as text and decoded in bulk the first time any tuple of the column is read.
+    __slots__ = ('values', 'texts')
+    def __init__(self, values=None):
+        self.values = array('d') if values is None else values
+        self.texts = []
+
+    def __len__(self):
+        return len(self.values) + len(self.texts)
+
+    def pack(self, texts):
+        start = len(self)
+        self.texts.extend(texts)
+        return NumberArray(self, start, len(self))
+
+    def decode(self):
+        if self.texts:
+            self.values.extend(decode_numbers(self.texts))
+            self.texts = []
+        return self.values
+
+class NumberArray:
+    # TupleNode values as a zero-copy [start, stop) window on a NumberColumn, reads as a
+    # sequence of NumberNode; floats() is the fast path of the emitter and serializer
+    __slots__ = ('column', 'start', 'stop')
+    def __init__(self, column, start, stop):
+        self.column = column
+        self.start = start
+        self.stop = stop
+
+    def floats(self):
+        return self.column.decode()[self.start:self.stop]
+
+    def tobytes(self):
+        # the packed float64 values, a hashable key that boxes no float
+        return self.column.decode()[self.start:self.stop].tobytes()
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return map(NumberNode, self.floats())
+
+    def __reversed__(self):
+        return map(NumberNode, reversed(self.floats()))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return NumberArray(self.column, self.start + start, self.start + max(start, stop))
+            return list(self)[index]
+        length = self.stop - self.start
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("NumberArray index out of range")
+        return NumberNode(self.column.decode()[self.start + index])
+
+    def __repr__(self):
+        return repr(list(self))
 
 class TupleNode(ASTNode):
+    __slots__ = ('values',)
     def __init__(self, values):
         self.values = values
+    def to_dict(self):
+        return {"type": "TupleNode", "values": [value.to_dict() for value in self.values]}
+    @classmethod
+    def from_dict(cls, data):
+        return cls([ASTNode.from_dict(value) for value in data["values"]])
     def __repr__(self):
         return f"TupleNode(values={self.values})"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"TupleNode")
-        depth += 1
-        print('  ' * depth + f"values:")
-        for value in self.values:
-            value.print_parse(depth+1)
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"TupleNode\n")
-        depth += 1
-        out_file.write('  ' * depth + f"values:\n")
-        for value in self.values:
-            value.output_parse(depth+1, out_file)
 
 ##### for while statement 
 class WhileNode(ASTNode):
+    __slots__ = ('condition', 'statements')
     def __init__(self, condition, statements):
         self.condition = condition
         self.statements = statements
 
+    def to_dict(self):
+        return {"type": "WhileNode", "condition": self.condition.to_dict(),
+                "statements": [stmt.to_dict() for stmt in self.statements]}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(ASTNode.from_dict(data["condition"]), [ASTNode.from_dict(stmt) for stmt in data["statements"]])
     def __repr__(self):
         return f"WhileNode(condition={self.condition}, statements={self.statements})"
 
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"WhileNode")
-        depth += 1
-        print('  ' * depth + f"condition:")
-        self.condition.print_parse(depth+1)
-        print('  ' * depth + f"statements:")
-        for stmt in self.statements:
-            stmt.print_parse(depth+1)
-    
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"WhileNode\n")
-        depth += 1
-        out_file.write('  ' * depth + f"condition:\n")
-        self.condition.output_parse(depth+1, out_file)
-        out_file.write('  ' * depth + f"statements:\n")
-        for stmt in self.statements:
-            stmt.output_parse(depth+1, out_file)
-
 ##### for if else statement
 class IfNode(ASTNode):
+    __slots__ = ('condition', 'true_branch', 'false_branch')
     def __init__(self, condition, true_branch, false_branch):
         self.condition = condition
         self.true_branch = true_branch
         self.false_branch = false_branch
 
+    def to_dict(self):
+        return {"type": "IfNode", "condition": self.condition.to_dict(),
+                "true_branch": [stmt.to_dict() for stmt in self.true_branch],
+                "false_branch": [stmt.to_dict() for stmt in self.false_branch]}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(ASTNode.from_dict(data["condition"]),
+                   [ASTNode.from_dict(stmt) for stmt in data["true_branch"]],
+                   [ASTNode.from_dict(stmt) for stmt in data["false_branch"]])
     def __repr__(self):
         return f"IfNode(condition={self.condition}, true_branch={self.true_branch}, false_branch={self.false_branch})"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"IfNode")
-        depth += 1
-        print('  ' * depth + f"condition:")
-        self.condition.print_parse(depth+1)
-        print('  ' * depth + f"true_branch:")
-        for stmt in self.true_branch:
-            stmt.print_parse(depth+1)
-        print('  ' * depth + f"false_branch:")
-        for stmt in self.false_branch:
-            stmt.print_parse(depth+1)
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"IfNode\n")
-        depth += 1
-        out_file.write('  ' * depth + f"condition:\n")
-        self.condition.output_parse(depth+1, out_file)
-        out_file.write('  ' * depth + f"true_branch:\n")
-        for stmt in self.true_branch:
-            stmt.output_parse(depth+1, out_file)
-        out_file.write('  ' * depth + f"false_branch:\n")
-        for stmt in self.false_branch:
-            stmt.output_parse(depth+1, out_file)
 
 class BreakNode(ASTNode):
+    __slots__ = ()
+    def to_dict(self):
+        return {"type": "BreakNode"}
+    @classmethod
+    def from_dict(cls, data):
+        return cls()
     def __repr__(self):
         return "BreakNode()"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"BreakNode()")
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"BreakNode()\n")
 
 class AssignNode(ASTNode):
+    __slots__ = ('variable', 'expression')
     def __init__(self, variable, expression):
         self.variable = variable
         self.expression = expression
+    def to_dict(self):
+        return {"type": "AssignNode", "variable": self.variable.to_dict(), "expression": self.expression.to_dict()}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(ASTNode.from_dict(data["variable"]), ASTNode.from_dict(data["expression"]))
     def __repr__(self):
         return f"AssignNode(variable={self.variable}, expression={self.expression})"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"AssignNode(=)")
-        depth += 1
-        print('  ' * depth + f"variable:")
-        self.variable.print_parse(depth+1)
-        print('  ' * depth + f"expression:")
-        self.expression.print_parse(depth+1)
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"AssignNode(=)\n")
-        depth += 1
-        out_file.write('  ' * depth + f"variable:\n")
-        self.variable.output_parse(depth+1, out_file)
-        out_file.write('  ' * depth + f"expression:\n")
-        self.expression.output_parse(depth+1, out_file)
 
 class BinOpNode(ASTNode):
+    __slots__ = ('left', 'operator', 'right')
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
         self.right = right
 
+    def to_dict(self):
+        return {"type": "BinOpNode", "left": self.left.to_dict(), "operator": token_names[self.operator],
+                "right": self.right.to_dict()}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(ASTNode.from_dict(data["left"]), token_kinds[data["operator"]], ASTNode.from_dict(data["right"]))
     def __repr__(self):
-        return f"BinOpNode(left={self.left}, operator={self.operator}, right={self.right})"
-    
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"BinOpNode(operator={self.operator})")
-        depth += 1
-        print('  ' * depth + f"left:")
-        self.left.print_parse(depth+1)
-        print('  ' * depth + f"right:")
-        self.right.print_parse(depth+1)
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"BinOpNode(operator={self.operator})\n")
-        depth += 1
-        out_file.write('  ' * depth + f"left:\n")
-        self.left.output_parse(depth+1, out_file)
-        out_file.write('  ' * depth + f"right:\n")
-        self.right.output_parse(depth+1, out_file)
+        return f"BinOpNode(left={self.left}, operator={token_names[self.operator]}, right={self.right})"
 
 class VarNode(ASTNode):
+    __slots__ = ('name',)
     def __init__(self, name):
         self.name = name
+    def to_dict(self):
+        return {"type": "VarNode", "name": self.name}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"])
     def __repr__(self):
         return f"VarNode(name={self.name})"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"VarNode(name={self.name})")
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"VarNode(name={self.name})\n")
 
 class KeyWordNode(ASTNode):
+    __slots__ = ('name',)
     def __init__(self, name):
         self.name = name
+    def to_dict(self):
+        return {"type": "KeyWordNode", "name": self.name}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"])
     def __repr__(self):
         return f"KeyWordNode(name={self.name})"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"KeyWordNode(name={self.name})")
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"KeyWordNode(name={self.name})\n")
 
 class IDNode(ASTNode):
+    __slots__ = ('name',)
     def __init__(self, name):
         self.name = name
+    def to_dict(self):
+        return {"type": "IDNode", "name": self.name}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"])
     def __repr__(self):
         return f"IDNode(name={self.name})"
-    def print_parse(self, depth=0):
-        print('  ' * depth + f"IDNode(name={self.name})")
-    def output_parse(self, depth=0, out_file=None):
-        out_file.write('  ' * depth + f"IDNode(name={self.name})\n")
+
+### node classes by name, for from_dict and the binary AST format
+ast_node_classes = {cls.__name__: cls for cls in (
+    RegisterOpNode, PropNode, NumberNode, TupleNode, WhileNode, IfNode,
+    BreakNode, AssignNode, BinOpNode, VarNode, KeyWordNode, IDNode
+)}
+
+###### text output of the AST
+class ASTEmitter:
+    # renders nodes in the indented text format with an explicit stack instead of one
+    # recursive call per node, lines go to a reusable buffer that is written out in
+    # large chunks, and indentation strings are built once per depth
+    def __init__(self, out_file, flush_lines=8192):
+        self.out_file = out_file
+        self.flush_lines = flush_lines
+        self.buffer = []
+        self.indents = ["  " * depth for depth in range(32)]
+        # rendered NumberNode lines by value, configs repeat the same few numbers
+        # (zero is never stored, 0.0 == -0.0 but they print differently); cleared on
+        # every flush, so it holds at most flush_lines entries
+        self.number_lines = {}
+
+    def flush(self):
+        if self.buffer:
+            self.out_file.write("".join(self.buffer))
+            self.buffer.clear()
+        self.number_lines.clear()
+
+    def emit_statements(self, nodes):
+        # each statement is followed by an empty line, output is flushed even if parsing stops
+        try:
+            for node in nodes:
+                self.emit(node)
+                self.buffer.append("\n")
+        finally:
+            self.flush()
+
+    def emit(self, node, depth=0):
+        buffer = self.buffer
+        write = buffer.append
+        indents = self.indents
+        number_lines = self.number_lines
+        flush_lines = self.flush_lines
+        # entries are (node, depth) or (label line, depth)
+        stack = [(node, depth)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node, depth = pop()
+            cls = type(node)
+            if cls is str:
+                write(indents[depth] + node)
+                continue
+            if cls not in emit_classes:
+                # duck-typed nodes such as arena views name the class they render as
+                cls = node.node_class
+            while depth + 2 >= len(indents):
+                indents.append("  " * len(indents))
+            pad = indents[depth]
+            if cls is NumberNode:
+                line = number_lines.get(node.value)
+                if line is None:
+                    line = f"NumberNode(value={node.value})\n"
+                    if node.value:
+                        number_lines[node.value] = line
+                write(pad + line)
+            elif cls is IDNode:
+                write(f"{pad}IDNode(name={node.name})\n")
+            elif cls is PropNode:
+                write(pad + "PropNode\n")
+                push((node.value, depth + 2))
+                push(("value:\n", depth + 1))
+                push((node.name, depth + 2))
+                push(("name:\n", depth + 1))
+            elif cls is TupleNode:
+                write(pad + "TupleNode\n")
+                write(indents[depth + 1] + "values:\n")
+                values = node.values
+                if type(values) is NumberArray:
+                    value_pad = indents[depth + 2]
+                    for value in values.floats():
+                        line = number_lines.get(value)
+                        if line is None:
+                            line = f"NumberNode(value={value})\n"
+                            if value:
+                                number_lines[value] = line
+                        write(value_pad + line)
+                elif all(type(value) is NumberNode for value in values):
+                    value_pad = indents[depth + 2]
+                    for value in values:
+                        line = number_lines.get(value.value)
+                        if line is None:
+                            line = f"NumberNode(value={value.value})\n"
+                            if value.value:
+                                number_lines[value.value] = line
+                        write(value_pad + line)
+                else:
+                    for value in reversed(values):
+                        push((value, depth + 2))
+            elif cls is BinOpNode:
+                write(f"{pad}BinOpNode(operator={token_names[node.operator]})\n")
+                push((node.right, depth + 2))
+                push(("right:\n", depth + 1))
+                push((node.left, depth + 2))
+                push(("left:\n", depth + 1))
+            elif cls is AssignNode:
+                write(pad + "AssignNode(=)\n")
+                push((node.expression, depth + 2))
+                push(("expression:\n", depth + 1))
+                push((node.variable, depth + 2))
+                push(("variable:\n", depth + 1))
+            elif cls is RegisterOpNode:
+                write(f"{pad}RegisterOpNode({node.op_name})\n")
+                for prop in reversed(node.props):
+                    push((prop, depth + 2))
+                push(("properties:\n", depth + 1))
+                push((node.id_name, depth + 2))
+                push(("operation_type:\n", depth + 1))
+            elif cls is IfNode:
+                write(pad + "IfNode\n")
+                for stmt in reversed(node.false_branch):
+                    push((stmt, depth + 2))
+                push(("false_branch:\n", depth + 1))
+                for stmt in reversed(node.true_branch):
+                    push((stmt, depth + 2))
+                push(("true_branch:\n", depth + 1))
+                push((node.condition, depth + 2))
+                push(("condition:\n", depth + 1))
+            elif cls is WhileNode:
+                write(pad + "WhileNode\n")
+                for stmt in reversed(node.statements):
+                    push((stmt, depth + 2))
+                push(("statements:\n", depth + 1))
+                push((node.condition, depth + 2))
+                push(("condition:\n", depth + 1))
+            elif cls is BreakNode:
+                write(pad + "BreakNode()\n")
+            elif cls is KeyWordNode:
+                write(f"{pad}KeyWordNode(name={node.name})\n")
+            elif cls is VarNode:
+                write(f"{pad}VarNode(name={node.name})\n")
+            else:
+                raise TypeError(f"Cannot emit {node!r}")
+            if len(buffer) >= flush_lines:
+                self.flush()
+
+emit_classes = set(ast_node_classes.values())
+
+class ParseError(SyntaxError):
+    # position is the index of the offending token (the line of a text token file),
+    # source_offset where that token starts in the source if the tokens have offsets;
+    # locate() adds its line and column to the message
+    def __init__(self, message, position=None, token=None, source_offset=None):
+        super().__init__(message)
+        self.message = message
+        self.position = position
+        self.token = token
+        self.source_offset = source_offset
+        self.location = None
+
+    def locate(self, lines):
+        # lines is the LineIndex of the source source_offset points into
+        if self.source_offset is not None:
+            self.location = lines.line_column(self.source_offset)
+
+    def __str__(self):
+        if self.position is None:
+            return self.message
+        if self.location is not None:
+            return f"{self.message} (token {self.position}, line {self.location[0]}, column {self.location[1]})"
+        return f"{self.message} (token {self.position})"
+
+### tokens where panic-mode recovery resumes: the end of a block or the start of a statement
+recovery_sync_types = {TokenType.RBRACE, TokenType.REGISTER_OP, TokenType.IF, TokenType.While, TokenType.EOF}
 
 class Parser:
-    def __init__(self, tokens):
-        self.tokens = tokens
+    # tokens is a TokenBuffer, an iterable of TokenBuffer chunks or of Token objects (see
+    # token_buffers), chunks are pulled one at a time. kind is the TokenType of the
+    # lookahead token and value looks its value up in the chunk arrays, no Token is made
+    # per token.
+    # With recover=True syntax errors are collected in self.errors and parsing resumes
+    # at the next recovery_sync_types token outside of the blocks the broken statement
+    # opened, otherwise the first one raises ParseError.
+    def __init__(self, tokens, recover=False):
+        self.number_values = NumberValues()
         self.pos = 0
-        self.current_token = self.tokens[self.pos]
+        self.chunk_start = 0
+        self.chunk_values = self.chunk_strings = self.chunk_offsets = ()
+        self.tokens = chain.from_iterable(map(self.enter_chunk, token_buffers(tokens)))
+        self.kind = next(self.tokens, TokenType.EOF)
+        self.recover = recover
+        self.errors = []
+        # set from an error until a top-level statement parses without one
+        self.recovering = False
+        self.numbers = NumberColumn()
+
+    def spanned(self, node, start):
+        # node was parsed from the tokens between start and the lookahead
+        node.start = start
+        node.end = self.pos
+        return node
+
+    def pack_numbers(self, texts):
+        # tuple values go to the current column, a full one is left to the tuples using it
+        if len(self.numbers) + len(texts) > number_column_size:
+            self.numbers = NumberColumn()
+        return self.numbers.pack(texts)
+
+    def enter_chunk(self, chunk):
+        # self.tokens iterates the kinds of one chunk after the other in C and calls this
+        # when it moves on to a chunk, before its first token is read at self.pos. The
+        # literals of a chunk are converted once and freed with it
+        self.number_values = NumberValues()
+        self.chunk_start = self.pos
+        self.chunk_values = chunk.values
+        self.chunk_strings = chunk.strings
+        self.chunk_offsets = chunk.offsets
+        return chunk.kinds
 
     def advance(self):
         self.pos += 1
-        if self.pos < len(self.tokens):
-            self.current_token = self.tokens[self.pos]
-        else:
-            self.current_token = Token(TokenType.EOF)
+        self.kind = next(self.tokens, TokenType.EOF)
+
+    @property
+    def value(self):
+        # value of the lookahead token, None at the end
+        index = self.pos - self.chunk_start
+        if index < len(self.chunk_values):
+            return self.chunk_strings[self.chunk_values[index]]
+        return None
+
+    @property
+    def current_token(self):
+        return Token(self.kind, self.value)
+
+    def error(self, message):
+        index = self.pos - self.chunk_start
+        offset = self.chunk_offsets[index] if index < len(self.chunk_offsets) else None
+        return ParseError(message, self.pos, self.current_token, offset)
 
     def expect(self, token_type):
         if isinstance(token_type, list):
-            if self.current_token.type in token_type:
-                self.advance()
+            if self.kind in token_type:
+                self.pos += 1
+                self.kind = next(self.tokens, TokenType.EOF)
             else:
-                print(f"Expected {token_type}, got {self.current_token.type}")
-                exit(0)
-                # raise SyntaxError(f"Expected {token_type}, got {self.current_token.type}")
+                names = [token_names[kind] for kind in token_type]
+                raise self.error(f"Expected {names}, got {token_names[self.kind]}")
         else:
-            if self.current_token.type == token_type:
-                self.advance()
+            if self.kind == token_type:
+                self.pos += 1
+                self.kind = next(self.tokens, TokenType.EOF)
             else:
-                print(f"Expected {token_type}, got {self.current_token.type}")
-                exit(0)
-                # raise SyntaxError(f"Expected {token_type}, got {self.current_token.type}")
+                raise self.error(f"Expected {token_names[token_type]}, got {token_names[self.kind]}")
+
+    def take(self, token_type):
+        # expect() for one kind that returns the value of the token
+        if self.kind != token_type:
+            raise self.error(f"Expected {token_names[token_type]}, got {token_names[self.kind]}")
+        value = self.chunk_strings[self.chunk_values[self.pos - self.chunk_start]]
+        self.pos += 1
+        self.kind = next(self.tokens, TokenType.EOF)
+        return value
+
+    def take_id(self):
+        # take() for an ID, as an IDNode spanning its token
+        if self.kind != TokenType.ID:
+            self.expect(TokenType.ID)
+        pos = self.pos
+        node = IDNode(self.chunk_strings[self.chunk_values[pos - self.chunk_start]])
+        node.start = pos
+        node.end = self.pos = pos + 1
+        self.kind = next(self.tokens, TokenType.EOF)
+        return node
+
+    def take_number(self):
+        # take() for a NUM, as a NumberNode spanning its token
+        if self.kind != TokenType.NUM:
+            self.expect(TokenType.NUM)
+        pos = self.pos
+        node = NumberNode(self.number_values[self.chunk_strings[self.chunk_values[pos - self.chunk_start]]])
+        node.start = pos
+        node.end = self.pos = pos + 1
+        self.kind = next(self.tokens, TokenType.EOF)
+        return node
+
+    def recover_from(self, error, start_pos):
+        # panic mode: record the error and skip to the next synchronizing token at the
+        # brace depth of the error, so the blocks opened after it are skipped whole and a
+        # '}' only stops the skip when it closes an enclosing block. A statement that
+        # failed on its first token is skipped so parsing moves on.
+        if not self.recover:
+            raise error
+        self.errors.append(error)
+        self.recovering = True
+        if self.pos == start_pos:
+            self.advance()
+        depth = 0
+        while depth or self.kind not in recovery_sync_types:
+            if self.kind == TokenType.LBRACE:
+                depth += 1
+            elif self.kind == TokenType.RBRACE:
+                depth -= 1
+            elif self.kind == TokenType.EOF:
+                break
+            self.advance()
 
     def parse(self):
+        return list(self.parse_iter())
+
+    def parse_iter(self):
         # program_statements -> statement statements | ε
         # program_statement -> reg_stmt | if_stmt | while_stmt
+        # each top-level statement is yielded as soon as it is complete
         ##### these are the supported starting keywords
         supported_starting_types = {TokenType.REGISTER_OP, TokenType.IF, TokenType.While}
         
-        statements = []
-        while self.current_token.type in supported_starting_types:
-            if self.current_token.type == TokenType.REGISTER_OP:
-                statements.append(self.parse_reg())
-            elif self.current_token.type == TokenType.IF:
-                statements.append(self.parse_if_stmt())
-            elif self.current_token.type == TokenType.While:
-                statements.append(self.parse_while_stmt())
-        return statements
+        while self.kind != TokenType.EOF:
+            start_pos = self.pos
+            error_count = len(self.errors)
+            if self.kind == TokenType.RBRACE and self.recovering:
+                # a '}' left over by a broken statement (one whose '{' was missing) is
+                # part of the error already reported
+                self.advance()
+                continue
+            try:
+                if self.kind == TokenType.REGISTER_OP:
+                    node = self.parse_reg()
+                elif self.kind == TokenType.IF:
+                    node = self.parse_if_stmt()
+                elif self.kind == TokenType.While:
+                    node = self.parse_while_stmt()
+                else:
+                    raise self.error(f"Expected 'register_op', 'if', or 'while', got {token_names[self.kind]}")
+            except ParseError as error:
+                self.recover_from(error, start_pos)
+                continue
+            if len(self.errors) == error_count:
+                self.recovering = False
+            yield node
 
     ### this is for registering operation
     def parse_reg(self):
         # reg_stmt -> register_op ID (tu_prop_a)
-        if self.current_token.type == TokenType.REGISTER_OP:
-            op_name = self.current_token.value
-            self.expect(TokenType.REGISTER_OP)
-            id_name = IDNode(self.current_token.value)
-            self.expect(TokenType.ID)
+        if self.kind == TokenType.REGISTER_OP:
+            start = self.pos
+            op_name = self.take(TokenType.REGISTER_OP)
+            id_name = self.take_id()
             self.expect(TokenType.LPAREN)
             props = self.parse_tu_prop_a()
             self.expect(TokenType.RPAREN)
-            return RegisterOpNode(op_name, id_name, props)
+            node = RegisterOpNode(op_name, id_name, props)
+            node.start = start
+            node.end = self.pos
+            return node
         else:
-            print("Expected 'register_op'")
-            exit(0)
-            # raise SyntaxError("Expected 'register_op'")
+            raise self.error("Expected 'register_op'")
 
     def parse_tu_prop_a(self):
         # tu_prop_a -> prop tu_prop_b
-        prop = self.parse_prop()
-        more_props = self.parse_tu_prop_b()
-        return [prop] + more_props
+        props = [self.parse_prop()]
+        props.extend(self.parse_tu_prop_b())
+        return props
 
     def parse_tu_prop_b(self):
         # tu_prop_b -> $ | , prop tu_prop_b
-        if self.current_token.type == TokenType.COMMA:
+        # the tail recursion is unrolled into a loop to keep long lists linear
+        props = []
+        while self.kind == TokenType.COMMA:
             self.expect(TokenType.COMMA)
-            prop = self.parse_prop()
-            return [prop] + self.parse_tu_prop_b()
-        else:
-            return []
+            props.append(self.parse_prop())
+        return props
 
     def parse_prop(self):
         # prop -> ID: num_or_tuple
-        prop_name = IDNode(self.current_token.value)
-        self.expect(TokenType.ID)
+        start = self.pos
+        prop_name = self.take_id()
         self.expect(TokenType.COLON)
         value = self.parse_num_or_tuple()
-        return PropNode(prop_name, value)
+        node = PropNode(prop_name, value)
+        node.start = start
+        node.end = self.pos
+        return node
 
     def parse_num_or_tuple(self):
         # num_or_tuple -> num | (list_num_a)
-        if self.current_token.type == TokenType.NUM:
-            value = float(self.current_token.value)
-            self.expect(TokenType.NUM)
-            return NumberNode(value)
-        elif self.current_token.type == TokenType.LPAREN:
+        if self.kind == TokenType.NUM:
+            return self.take_number()
+        elif self.kind == TokenType.LPAREN:
+            start = self.pos
             self.expect(TokenType.LPAREN)
             values = self.parse_list_num_a()
             self.expect(TokenType.RPAREN)
-            return TupleNode(values)
+            node = TupleNode(values)
+            node.start = start
+            node.end = self.pos
+            return node
         else:
-            print("Expected a number or '('")
-            exit(0)
-            # raise SyntaxError("Expected a number or '('")
+            raise self.error("Expected a number or '('")
 
     def parse_list_num_a(self):
         # list_num_a -> num list_num_b
-        num = float(self.current_token.value)
-        self.expect(TokenType.NUM)
-        more_nums = self.parse_list_num_b()
-        return [NumberNode(num)] + more_nums
+        # only the literal texts are collected, the number column decodes them in bulk
+        texts = [self.take(TokenType.NUM)]
+        texts.extend(self.parse_list_num_b())
+        return self.pack_numbers(texts)
 
     def parse_list_num_b(self):
         # list_num_b -> $ | , num list_num_b
-        if self.current_token.type == TokenType.COMMA:
+        # the tail recursion is unrolled into a loop to keep long lists linear
+        texts = []
+        while self.kind == TokenType.COMMA:
             self.expect(TokenType.COMMA)
-            num = float(self.current_token.value)
-            self.expect(TokenType.NUM)
-            return [NumberNode(num)] + self.parse_list_num_b()
-        else:
-            return []
+            texts.append(self.take(TokenType.NUM))
+        return texts
 
     #### this is for while statement
     def parse_while_stmt(self):
         # while_stmt -> WHILE condition {general_statements}
         # general_statements -> general_statement general_statements | ε
         # general_statement -> if_stmt | BREAK | assignment | reg_stmt
+        start = self.pos
         self.expect(TokenType.While)
         condition = self.parse_condition()
         self.expect(TokenType.LBRACE)
         statements = self.parse_general_statements()
         self.expect(TokenType.RBRACE)
-        return WhileNode(condition, statements)
+        return self.spanned(WhileNode(condition, statements), start)
     
     def parse_general_statements(self):
         # general_statements -> general_statement general_statements | ε
         statements = []
-        while self.current_token.type in {TokenType.BREAK, TokenType.ID, TokenType.IF, TokenType.REGISTER_OP}:
-            statements.append(self.parse_general_statement())
+        while self.kind in {TokenType.BREAK, TokenType.ID, TokenType.IF, TokenType.REGISTER_OP}:
+            start_pos = self.pos
+            try:
+                statements.append(self.parse_general_statement())
+            except ParseError as error:
+                self.recover_from(error, start_pos)
         return statements
 
     def parse_general_statement(self):
         # general_statement -> if_stmt | BREAK | assignment | reg_stmt
-        if self.current_token.type == TokenType.BREAK:
+        if self.kind == TokenType.BREAK:
             self.advance()
-            return BreakNode()
-        elif self.current_token.type == TokenType.ID:
+            return self.spanned(BreakNode(), self.pos - 1)
+        elif self.kind == TokenType.ID:
             return self.parse_assignment()
-        elif self.current_token.type == TokenType.IF:
+        elif self.kind == TokenType.IF:
             return self.parse_if_stmt()
-        elif self.current_token.type == TokenType.REGISTER_OP:
+        elif self.kind == TokenType.REGISTER_OP:
             return self.parse_reg()
         else:
-            print("Expected either 'break', 'ID', 'if', or 'register_op'")
-            exit(0)
-            # raise SyntaxError("Expected either 'break', 'ID', 'if', or 'register_op'")
+            raise self.error("Expected either 'break', 'ID', 'if', or 'register_op'")
 
     #### this is for if else statement
     def parse_if_stmt(self):
         # if_stmt -> IF condition {statements} else_stmt
         # else_stmt -> ELSE {statements} | ε
+        start = self.pos
         self.expect(TokenType.IF)
         condition = self.parse_condition()
         self.expect(TokenType.LBRACE)
         true_branch = self.parse_statements()
         self.expect(TokenType.RBRACE)
         # optional else branch
-        if self.current_token.type == TokenType.ELSE:
+        if self.kind == TokenType.ELSE:
             self.expect(TokenType.ELSE)
             self.expect(TokenType.LBRACE)
             false_branch = self.parse_statements()
             self.expect(TokenType.RBRACE)
         else:
             false_branch = []
-        return IfNode(condition, true_branch, false_branch)
+        return self.spanned(IfNode(condition, true_branch, false_branch), start)
 
     def parse_condition(self):
         # condition -> ID | NUM | ID/NUM ==/!= ID/NUM | KeyWord
 
-        if self.current_token.type == TokenType.KeyWord:
-            condition = KeyWordNode(self.current_token.value)
-        elif self.current_token.type == TokenType.NUM:
-            condition = NumberNode(float(self.current_token.value))
-        elif self.current_token.type == TokenType.ID:
-            condition = IDNode(self.current_token.value)
+        start = self.pos
+        last_token_type = self.kind
+        if self.kind == TokenType.KeyWord:
+            condition = self.spanned(KeyWordNode(self.take(TokenType.KeyWord)), start)
+        elif self.kind == TokenType.NUM:
+            condition = self.take_number()
+        elif self.kind == TokenType.ID:
+            condition = self.take_id()
         else:
-            pass
-        last_token_type = self.current_token.type
-        self.expect([TokenType.ID, TokenType.NUM, TokenType.KeyWord])
+            # raises
+            self.expect([TokenType.ID, TokenType.NUM, TokenType.KeyWord])
         # Currently we don't support multiple conditions or comparison with complex expressions
-        if last_token_type in {TokenType.ID, TokenType.NUM} and self.current_token.type in {TokenType.CompEqual, TokenType.CompNotEqual}:
-            operator = self.current_token.type
+        if last_token_type in {TokenType.ID, TokenType.NUM} and self.kind in {TokenType.CompEqual, TokenType.CompNotEqual}:
+            operator = self.kind
             self.advance()
-            if self.current_token.type == TokenType.ID:
-                right = IDNode(self.current_token.value)
-            elif self.current_token.type == TokenType.NUM:
-                right = NumberNode(float(self.current_token.value))
+            if self.kind == TokenType.ID:
+                right = self.take_id()
+            elif self.kind == TokenType.NUM:
+                right = self.take_number()
             else:
-                pass
-            self.expect([TokenType.ID, TokenType.NUM])
-            condition = BinOpNode(condition, operator, right)
-        elif last_token_type in {TokenType.KeyWord} and self.current_token.type in {TokenType.CompEqual, TokenType.CompNotEqual}:
-            print("Expected ID or NUM before comparison operator")
-            exit(0)
-            # raise SyntaxError("Expected ID or NUM before comparison operator")
+                # raises
+                self.expect([TokenType.ID, TokenType.NUM])
+            condition = self.spanned(BinOpNode(condition, operator, right), start)
+        elif last_token_type in {TokenType.KeyWord} and self.kind in {TokenType.CompEqual, TokenType.CompNotEqual}:
+            raise self.error("Expected ID or NUM before comparison operator")
         else:
             # print("No comparison operator")
             pass
@@ -510,115 +1056,1353 @@ class Parser:
     def parse_statements(self):
         # statements -> statement statements | ε
         statements = []
-        while self.current_token.type in {TokenType.BREAK, TokenType.ID, TokenType.REGISTER_OP}:
-            statements.append(self.parse_statement())
+        while self.kind in {TokenType.BREAK, TokenType.ID, TokenType.REGISTER_OP}:
+            start_pos = self.pos
+            try:
+                statements.append(self.parse_statement())
+            except ParseError as error:
+                self.recover_from(error, start_pos)
         return statements
 
     def parse_statement(self):
         # statement -> BREAK | assignment | reg_stmt
-        if self.current_token.type == TokenType.BREAK:
+        if self.kind == TokenType.BREAK:
             self.advance()
-            return BreakNode()
-        elif self.current_token.type == TokenType.ID:
+            return self.spanned(BreakNode(), self.pos - 1)
+        elif self.kind == TokenType.ID:
             return self.parse_assignment()
-        elif self.current_token.type == TokenType.REGISTER_OP:
+        elif self.kind == TokenType.REGISTER_OP:
             return self.parse_reg()
         else:
-            print("Expected 'break', 'ID', or 'register_op'")
-            exit(0)
-            # raise SyntaxError("Expected statement")
+            raise self.error("Expected 'break', 'ID', or 'register_op'")
 
     def parse_assignment(self):
         # assignment -> ID = expr
-        variable = IDNode(self.current_token.value)
-        self.expect(TokenType.ID)
+        start = self.pos
+        variable = self.take_id()
         self.expect(TokenType.EQUALS)
         expression = self.parse_expr()
-        return AssignNode(variable, expression)
+        node = AssignNode(variable, expression)
+        node.start = start
+        node.end = self.pos
+        return node
 
     def parse_expr(self):
         # expr -> ID | expr + ID | expr + NUM | NUM
         # currently only support addition
-        if self.current_token.type == TokenType.ID:
-            left = IDNode(self.current_token.value)
-        elif self.current_token.type == TokenType.NUM:
-            left = NumberNode(float(self.current_token.value))
+        start = self.pos
+        if self.kind == TokenType.ID:
+            left = self.take_id()
+        elif self.kind == TokenType.NUM:
+            left = self.take_number()
         else:
-            pass
-        self.expect([TokenType.ID, TokenType.NUM])
-        while self.current_token.type == TokenType.PLUS:
-            operator = self.current_token.type
+            # raises
+            self.expect([TokenType.ID, TokenType.NUM])
+        while self.kind == TokenType.PLUS:
+            operator = self.kind
             self.advance()
-            # right = VarNode(self.current_token.value)
+            # right = VarNode(self.value)
             # self.expect(TokenType.ID)
-            if self.current_token.type == TokenType.ID:
-                right = IDNode(self.current_token.value)
-            elif self.current_token.type == TokenType.NUM:
-                right = NumberNode(float(self.current_token.value))
+            if self.kind == TokenType.ID:
+                right = self.take_id()
+            elif self.kind == TokenType.NUM:
+                right = self.take_number()
             else:
-                pass
-            self.expect([TokenType.ID, TokenType.NUM])
+                # raises
+                self.expect([TokenType.ID, TokenType.NUM])
             left = BinOpNode(left, operator, right)
+            left.start = start
+            left.end = self.pos
         return left
 
+### "rd" is the recursive-descent Parser above, "ll1" the table-driven LL1Parser of tph_ll1.py
+parser_engines = ("rd", "ll1")
 
+### set while a tph_profile.Profile is active, make_parser, start_parse and write_output
+### then report to it; None keeps the pipeline uninstrumented
+active_profile = None
 
+def make_parser(tokens, recover=False, engine="rd", cache_dir=None):
+    # cache_dir is the cache directory when caching is on, where ll1 keeps its table
+    if active_profile is not None:
+        return active_profile.make_parser(tokens, recover, engine, cache_dir)
+    if engine == "ll1":
+        if recover:
+            raise ValueError("the ll1 engine has no error recovery, use the rd engine")
+        from tph_ll1 import LL1Parser
+        return LL1Parser(tokens, cache_dir=cache_dir)
+    return Parser(tokens, recover)
 
-def parse_file(file_path):
+
+
+def token_kind(kind, value):
+    # the TokenType of a scanner token kind ("Keyword", "Identifier", ...) and its value
+    if kind in file_word_to_tokens:
+        token_type = file_word_to_tokens[kind]
+        #### token type conversion to support finer granularity
+        if token_type == TokenType.KeyWord:
+            if value in special_keywords:
+                return keyword_tokentype_conversion[value]
+        elif token_type == TokenType.Operator:
+            if value in special_operators:
+                return operator_tokentype_conversion[value]
+        ### other token types
+        return token_type
+    else:
+        raise ParseError(f"Unknown token: {kind}")
+
+def make_token(kind, value):
+    # convert a scanner token kind and its value to a Token
+    return Token(token_kind(kind, value), value)
+
+def scan_source_spans(text, pos=0, endpos=None):
+    # single pass over text[pos:endpos], yields (scanner kind, value, offset) like scanner.cpp,
+    # offset is the index of the token in text
+    matches = scanner_pattern.finditer(text, pos, len(text) if endpos is None else endpos)
+    for match in matches:
+        group = match.lastgroup
+        if group == "space" or group == "comment":
+            continue
+        value = match.group()
+        if group == "word":
+            yield ("Keyword" if value in scanner_keywords else "Identifier"), value, match.start()
+        elif group == "punct":
+            yield scanner_punctuations[value], value, match.start()
+        elif group == "number":
+            if value.isdigit():
+                yield "Number", value, match.start()
+            else:
+                print(f'Warning -- Unknown token: "{value}"', file=sys.stderr)
+        elif group == "operator":
+            if value in scanner_operators:
+                yield "Operator", value, match.start()
+            else:
+                print(f'Warning -- Unknown token: "{value}"', file=sys.stderr)
+        else:
+            print(f"Warning: Unknown character: {value}", file=sys.stderr)
+
+def scan_source(text):
+    # single pass over the source, yields (scanner kind, value)
+    for kind, value, _ in scan_source_spans(text):
+        yield kind, value
+
+def tokenize_source(text):
+    # all tokens of text in one TokenBuffer
+    buffer = TokenBuffer()
+    tokenize_into(text, buffer, SourceTokenKinds(buffer.ids))
+    return buffer
+
+class SourceTokenKinds(dict):
+    # (scanner kind, value) pair -> TokenType, values maps the pair to its value id in
+    # ids; made per chunk with its SymbolIds, every distinct pair is converted once
+    __slots__ = ('ids', 'values')
+    def __init__(self, ids):
+        self.ids = ids
+        self.values = {}
+
+    def __missing__(self, pair):
+        kind = self[pair] = token_kind(*pair)
+        self.values[pair] = self.ids[pair[1]]
+        return kind
+
+def tokenize_into(text, buffer, pair_kinds, base=0):
+    # append the tokens of text to buffer, converted by two dict lookups per token in C,
+    # with their offsets; text starts at offset base of the source
+    spans = list(scan_source_spans(text))
+    if not spans:
+        return
+    kinds, values, starts = zip(*spans)
+    pairs = list(zip(kinds, values))
+    buffer.kinds.frombytes(bytes(map(pair_kinds.__getitem__, pairs)))
+    buffer.values.extend(map(pair_kinds.values.__getitem__, pairs))
+    buffer.offsets.extend(map(base.__add__, starts) if base else starts)
+
+def parse_source(text):
+    return Parser(tokenize_source(text)).parse()
+
+### characters of source lines scanned at once by iter_source_file
+source_block_size = 1 << 16
+
+def iter_source_file(file_path):
+    # tokens never span lines, so the source is scanned in blocks of whole lines into
+    # chunks of about token_chunk_size tokens; each chunk gets new tables, so memory
+    # does not grow with the number of distinct values in the file
+    buffer = TokenBuffer()
+    pair_kinds = SourceTokenKinds(buffer.ids)
+    base = 0
+    with open(file_path, 'r') as file:
+        while True:
+            lines = file.readlines(source_block_size)
+            if not lines:
+                break
+            text = "".join(lines)
+            tokenize_into(text, buffer, pair_kinds, base)
+            base += len(text)
+            if len(buffer.kinds) >= token_chunk_size:
+                yield buffer
+                buffer = TokenBuffer()
+                pair_kinds = SourceTokenKinds(buffer.ids)
+    if buffer.kinds:
+        yield buffer
+
+def iter_token_file(file_path):
     with open(file_path, 'r') as file:
-        tokens = []
-        for line in file:
-            # print(f"line: [{line}]")
-            parts = line[1:-2].split(", ")
-            # print(f"parts: {parts}")
-            if parts[0] in file_word_to_tokens:
-                token_name = file_word_to_tokens[parts[0]]
-                token_value = parts[1][1:-1]
-                #### token type conversion to support finer granularity
-                if token_name == "KeyWord":
-                    if token_value in special_keywords:
-                        tokens.append(Token(keyword_tokentype_conversion[token_value], token_value))
-                    else:
-                        tokens.append(Token(TokenType.KeyWord, token_value))
-                elif token_name == "Operator":
-                    if token_value in special_operators:
-                        tokens.append(Token(operator_tokentype_conversion[token_value], token_value))
-                    else:
-                        tokens.append(Token(TokenType.Operator, token_value))
+        yield from iter_token_lines(file)
+
+class TokenLineKinds(dict):
+    # line of the scanner's text format -> TokenType, values maps the line to its value
+    # id in ids; made per chunk, every distinct line of it is converted once
+    __slots__ = ('ids', 'values')
+    def __init__(self, ids):
+        self.ids = ids
+        self.values = {}
+
+    def __missing__(self, line):
+        # line is `<kind, "value">` or `<kind>`, with or without its newline
+        body = line[:-1] if line.endswith("\n") else line
+        if not (body.startswith("<") and body.endswith(">")):
+            raise ParseError("Malformed token line")
+        parts = body[1:-1].split(", ", 1)
+        if parts[0] not in file_word_to_tokens:
+            raise ParseError(f"Unknown token: {parts[0]}")
+        if len(parts) > 1 and not (len(parts[1]) >= 2 and parts[1][0] == parts[1][-1] == '"'):
+            raise ParseError("Malformed token line")
+        value = parts[1][1:-1] if len(parts) > 1 else None
+        kind = self[line] = token_kind(parts[0], value)
+        self.values[line] = self.ids[value]
+        return kind
+
+def split_token_offsets(block, position, positioned):
+    # (token lines, offsets, error) of a block that has a bad line; positioned says
+    # whether the lines of the input end in a byte offset. Each line is checked on its
+    # own: the first mixed or malformed one ends the block, and the ParseError naming
+    # its line is returned to be raised after the lines before it
+    lines = []
+    offsets = []
+    for index, line in enumerate(block):
+        head, _, tail = line.rpartition(" ")
+        has_offset = tail[:-1].isdecimal() and head.endswith(">")
+        if has_offset != positioned or not (has_offset or line.endswith(">\n")):
+            if line.endswith(">\n") or has_offset:
+                problem = "has a byte offset" if has_offset else "has no byte offset"
+                message = f"Token line {position + index + 1} {problem}, unlike the lines before it"
+            else:
+                message = f"Malformed token line {position + index + 1}: {line.rstrip()!r}"
+            return lines, offsets, ParseError(message, position + index)
+        if has_offset:
+            lines.append(head)
+            offsets.append(int(tail))
+        else:
+            lines.append(line)
+    return lines, offsets, None
+
+def iter_token_lines(lines):
+    # TokenBuffer chunks of lines in the scanner's text format (the last one may lack its
+    # newline). A chunk of lines is converted by two dict lookups per line in C. Lines of
+    # `scanner -p` end in the byte offset of the token, which is split off into the
+    # offsets column; either every line of an input has one or none has.
+    lines = iter(lines)
+    position = 0
+    positioned = None
+    while True:
+        try:
+            block = list(islice(lines, token_chunk_size))
+        except UnicodeDecodeError:
+            raise ParseError("Malformed token file: not UTF-8 text") from None
+        if not block:
+            return
+        if not block[-1].endswith("\n"):
+            block[-1] += "\n"
+        ids = SymbolIds()
+        line_kinds = TokenLineKinds(ids)
+        offsets = ()
+        split_error = None
+        if positioned is None:
+            positioned = not block[0].endswith(">\n")
+        if positioned:
+            # every offset is checked at once (int() also takes signs, underscores and
+            # spaces, so what is left without the digits and newlines must be empty); the
+            # lines are only looked at one by one to find a bad one
+            heads, tails = zip(*[line.rpartition(" ")[::2] for line in block])
+            try:
+                offsets = list(map(int, tails))
+            except ValueError:
+                offsets = None
+            if offsets is not None and not "".join(tails).encode().translate(None, b"0123456789\n"):
+                block = heads
+            else:
+                block, offsets, split_error = split_token_offsets(block, position, True)
+        elif "".join(block).count(">\n") != len(block):
+            block, offsets, split_error = split_token_offsets(block, position, False)
+        chunk = TokenBuffer(ids)
+        try:
+            chunk.kinds.frombytes(bytes(map(line_kinds.__getitem__, block)))
+        except ParseError as error:
+            # the tokens before the bad line are parsed first
+            known = 0
+            while block[known] in line_kinds:
+                known += 1
+            if known:
+                chunk = TokenBuffer(ids)
+                chunk.kinds.frombytes(bytes(map(line_kinds.__getitem__, block[:known])))
+                chunk.values.extend(map(line_kinds.values.__getitem__, block[:known]))
+                chunk.offsets.extend(offsets[:known])
+                yield chunk
+            message = error.message
+            if message == "Malformed token line":
+                message = f"Malformed token line {position + known + 1}: {block[known].rstrip()!r}"
+            source_offset = offsets[known] if offsets else None
+            raise ParseError(message, position + known, source_offset=source_offset) from None
+        chunk.values.extend(map(line_kinds.values.__getitem__, block))
+        chunk.offsets.extend(offsets)
+        position += len(block)
+        if chunk.kinds:
+            yield chunk
+        if split_error is not None:
+            raise split_error
+
+def parse_file(file_path):
+    return load_tokens(file_path)
+
+class BinaryTokenKinds(dict):
+    # (scanner type code, string index) record of a binary token file -> TokenType,
+    # each distinct record is converted once
+    __slots__ = ('strings',)
+    def __init__(self, strings):
+        self.strings = strings
+
+    def __missing__(self, record):
+        kind = self[record] = token_kind(binary_token_kinds[record[0]], self.strings[record[1]])
+        return kind
+
+def iter_tokens_mmap(file_path):
+    # decode a binary token file in place. The string table of the file becomes the
+    # SymbolIds of its chunks, so the value ids are the string indices of the records and
+    # are copied out of the mmap as bytes; kinds are looked up per record in C (which
+    # also rejects string indices out of range).
+    with open(file_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer, \
+            memoryview(buffer) as view:
+        if len(buffer) < token_file_header.size:
+            raise ParseError(f"Truncated binary token file: {file_path}")
+        magic, version, string_count, token_count = token_file_header.unpack_from(view, 0)
+        if magic != token_file_magic or version != token_file_version and version not in token_file_offset_sizes:
+            raise ParseError(f"Not a binary token file: {file_path}")
+        offset = token_file_header.size
+        ids = SymbolIds()
+        for _ in range(string_count):
+            if offset + token_file_length.size > len(buffer):
+                raise ParseError(f"Truncated binary token file: {file_path}")
+            (length,) = token_file_length.unpack_from(view, offset)
+            offset += token_file_length.size
+            if offset + length > len(buffer):
+                raise ParseError(f"Truncated binary token file: {file_path}")
+            ids.names.append(str(view[offset:offset + length], 'utf-8'))
+            offset += length
+        for index, string in enumerate(ids.names):
+            ids.setdefault(string, index)
+
+        record_kinds = BinaryTokenKinds(ids.names)
+        record_size = token_file_record.size
+        value_size = record_size - 1
+        # the offsets column of versions 2 and 3 follows the records
+        offsets_start = offset + token_count * record_size
+        offset_size = token_file_offset_sizes.get(version, 0)
+        if offsets_start + offset_size * token_count > len(buffer):
+            raise ParseError(f"Truncated binary token file: {file_path}")
+        for first in range(0, token_count, token_chunk_size):
+            start = offset + first * record_size
+            end = offset + min(first + token_chunk_size, token_count) * record_size
+            if end > len(buffer):
+                raise ParseError(f"Truncated binary token file: {file_path}")
+            chunk = TokenBuffer(ids)
+            with view[start:end] as records:
+                chunk.kinds.frombytes(bytes(map(record_kinds.__getitem__,
+                                                 token_file_record.iter_unpack(records))))
+            # the little-endian uint32 after each type byte, gathered into one column
+            value_bytes = bytearray(value_size * ((end - start) // record_size))
+            for byte in range(value_size):
+                value_bytes[byte::value_size] = buffer[start + 1 + byte:end:record_size]
+            chunk.values.frombytes(value_bytes)
+            # u64 offsets are copied as they are, the u32 ones of version 2 are widened
+            offsets = array('Q' if offset_size == 8 else 'I',
+                            buffer[offsets_start + offset_size * first:
+                                   offsets_start + offset_size * (first + len(chunk.kinds))])
+            if sys.byteorder == "big":
+                chunk.values.byteswap()
+                offsets.byteswap()
+            if offset_size == 8:
+                chunk.offsets = offsets
+            elif offsets:
+                chunk.offsets = array('Q', offsets)
+            yield chunk
+
+def load_tokens_mmap(file_path):
+    return join_token_buffers(iter_tokens_mmap(file_path))
+
+def is_binary_token_file(file_path):
+    with open(file_path, 'rb') as file:
+        return file.read(len(token_file_magic)) == token_file_magic
+
+def iter_tokens(file_path):
+    # TokenBuffer chunks of a file: .hl sources are scanned in-process, binary token
+    # files are memory-mapped, and the text format of the scanner is the fallback
+    if file_path.endswith(".hl"):
+        return iter_source_file(file_path)
+    if is_binary_token_file(file_path):
+        return iter_tokens_mmap(file_path)
+    return iter_token_file(file_path)
+
+def join_token_buffers(chunks):
+    # one TokenBuffer holding the chunks of one input; the value ids of a chunk with its
+    # own strings are renumbered into the strings of the first one
+    buffer = None
+    for chunk in chunks:
+        if buffer is None:
+            buffer = TokenBuffer(chunk.ids)
+        if chunk.ids is buffer.ids:
+            buffer.values.extend(chunk.values)
+        else:
+            ids = buffer.ids
+            renumbered = [ids[string] for string in chunk.strings]
+            buffer.values.extend(map(renumbered.__getitem__, chunk.values))
+        buffer.kinds.extend(chunk.kinds)
+        buffer.offsets.extend(chunk.offsets)
+    return buffer if buffer is not None else TokenBuffer()
+
+def load_tokens(file_path):
+    return join_token_buffers(iter_tokens(file_path))
+
+def write_ast(nodes, out_file):
+    ASTEmitter(out_file).emit_statements(nodes)
+
+###### AST serialization
+# JSON is a list of to_dict() statements. The binary format is
+#   "TPHA" | u8 version | u32 string count | u32 float count | u32 word count | u32 statement count
+#   string table: u32 length + utf-8 bytes, per string
+#   float64 block: NumberNode values and TupleNode values back to back
+#   u32 words: one record per node in post-order (children before their parent),
+#              a tag followed by the fields below
+# all little-endian. Loading is a single loop over the words with a stack of built nodes.
+# Version 2 adds AST_SHARE / AST_REF: a subtree used more than once (hash-consed ASTs,
+# tph_hashcons.py) is written once, followed by AST_SHARE, and then referred to by slot.
+ast_file_magic = b"TPHA"
+ast_file_version = 2
+ast_file_versions = (1, 2)
+ast_file_header = struct.Struct("<4sBIIII")
+
+AST_REGISTER_OP = 0   # op_name string, prop count   (children: id_name, props)
+AST_PROP = 1          #                              (children: name, value)
+AST_NUMBER = 2        # float index
+AST_TUPLE = 3         # first float index, count     (values are inlined in the float block)
+AST_WHILE = 4         # statement count              (children: condition, statements)
+AST_IF = 5            # true count, false count      (children: condition, true_branch, false_branch)
+AST_BREAK = 6
+AST_ASSIGN = 7        #                              (children: variable, expression)
+AST_BINOP = 8         # operator string              (children: left, right)
+AST_VAR = 9           # name string
+AST_KEYWORD = 10      # name string
+AST_ID = 11           # name string
+AST_SHARE = 12        #                              (the node on top of the stack takes the next slot)
+AST_REF = 13          # slot                         (pushes the node of an earlier AST_SHARE)
+### leaves are never written once and referred back to, decode_ast(shared=True) makes
+### the equal ones one node again
+ast_leaf_classes = {AST_NUMBER: NumberNode, AST_ID: IDNode, AST_KEYWORD: KeyWordNode, AST_VAR: VarNode}
+
+class SharedLeaves(dict):
+    # (record tag, float or string) -> the one leaf node of that value
+    __slots__ = ()
+    def __missing__(self, key):
+        node = self[key] = ast_leaf_classes[key[0]](key[1])
+        return node
+
+def shared_node_counts(statements):
+    # id -> number of references of every node with children, a node is counted but
+    # not entered again once seen
+    counts = {}
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        cls = type(node)
+        if cls is NumberNode or cls is IDNode or cls is KeyWordNode or cls is VarNode or cls is BreakNode:
+            continue
+        count = counts.get(id(node), 0)
+        counts[id(node)] = count + 1
+        if count:
+            continue
+        if cls is BinOpNode:
+            stack.extend((node.left, node.right))
+        elif cls is AssignNode:
+            stack.extend((node.variable, node.expression))
+        elif cls is PropNode:
+            stack.extend((node.name, node.value))
+        elif cls is RegisterOpNode:
+            stack.append(node.id_name)
+            stack.extend(node.props)
+        elif cls is WhileNode:
+            stack.append(node.condition)
+            stack.extend(node.statements)
+        elif cls is IfNode:
+            stack.append(node.condition)
+            stack.extend(node.true_branch)
+            stack.extend(node.false_branch)
+    return counts
+
+class ASTEncoder:
+    # encode_ast one statement at a time, only the packed records are kept: streams are
+    # encoded while they are parsed. counts is shared_node_counts of all statements for
+    # a shared encoding
+    def __init__(self, counts=None):
+        self.strings = []
+        self.string_index = {}
+        self.string_bytes = 0
+        self.floats = array('d')
+        self.words = array('I')
+        self.statements = 0
+        self.counts = counts
+        # node id -> slot, for shared nodes already written
+        self.slots = {}
+
+    def intern(self, value):
+        index = self.string_index.get(value)
+        if index is None:
+            index = self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+            self.string_bytes += token_file_length.size + len(value.encode('utf-8'))
+        return index
+
+    def size(self):
+        # bytes of the encoding so far
+        return (ast_file_header.size + self.string_bytes + self.floats.itemsize * len(self.floats)
+                + self.words.itemsize * len(self.words))
+
+    def add(self, statement):
+        intern = self.intern
+        floats = self.floats
+        words = self.words
+        counts = self.counts
+        slots = self.slots
+        self.statements += 1
+        # explicit stack, entries are (node, children already emitted)
+        stack = [(statement, False)]
+        while stack:
+            node, expanded = stack.pop()
+            cls = type(node)
+            if counts is not None and not expanded:
+                slot = slots.get(id(node))
+                if slot is not None:
+                    words.extend((AST_REF, slot))
+                    continue
+            if cls is NumberNode:
+                words.extend((AST_NUMBER, len(floats)))
+                floats.append(node.value)
+            elif cls is TupleNode:
+                values = node.values
+                words.extend((AST_TUPLE, len(floats), len(values)))
+                if type(values) is NumberArray:
+                    floats.extend(values.floats())
                 else:
-                    ### other token types
-                    tokens.append(Token(file_word_to_tokens[parts[0]], token_value))
+                    floats.extend([value.value for value in values])
+            elif cls is IDNode:
+                words.extend((AST_ID, intern(node.name)))
+            elif cls is KeyWordNode:
+                words.extend((AST_KEYWORD, intern(node.name)))
+            elif cls is VarNode:
+                words.extend((AST_VAR, intern(node.name)))
+            elif cls is BreakNode:
+                words.append(AST_BREAK)
+            elif expanded:
+                if cls is BinOpNode:
+                    words.extend((AST_BINOP, intern(token_names[node.operator])))
+                elif cls is AssignNode:
+                    words.append(AST_ASSIGN)
+                elif cls is PropNode:
+                    words.append(AST_PROP)
+                elif cls is RegisterOpNode:
+                    words.extend((AST_REGISTER_OP, intern(node.op_name), len(node.props)))
+                elif cls is WhileNode:
+                    words.extend((AST_WHILE, len(node.statements)))
+                elif cls is IfNode:
+                    words.extend((AST_IF, len(node.true_branch), len(node.false_branch)))
             else:
-                print("Unknown token:", parts[0])
-                exit(0)
-    return tokens
+                if cls is BinOpNode:
+                    children = [node.left, node.right]
+                elif cls is AssignNode:
+                    children = [node.variable, node.expression]
+                elif cls is PropNode:
+                    children = [node.name, node.value]
+                elif cls is RegisterOpNode:
+                    children = [node.id_name] + node.props
+                elif cls is WhileNode:
+                    children = [node.condition] + node.statements
+                elif cls is IfNode:
+                    children = [node.condition] + node.true_branch + node.false_branch
+                else:
+                    raise TypeError(f"Cannot serialize {node!r}")
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children))
+                continue
+            # the record of node is complete
+            if counts is not None and counts.get(id(node), 0) > 1:
+                slots[id(node)] = len(slots)
+                words.append(AST_SHARE)
 
-if __name__ == "__main__":
+    def tobytes(self):
+        floats = self.floats
+        words = self.words
+        if sys.byteorder == "big":
+            floats = array('d', floats)
+            words = array('I', words)
+            floats.byteswap()
+            words.byteswap()
+        parts = [ast_file_header.pack(ast_file_magic, ast_file_version, len(self.strings), len(floats),
+                                      len(words), self.statements)]
+        for value in self.strings:
+            encoded = value.encode('utf-8')
+            parts.append(token_file_length.pack(len(encoded)))
+            parts.append(encoded)
+        parts.append(floats.tobytes())
+        parts.append(words.tobytes())
+        return b"".join(parts)
+
+def encode_ast(statements, shared=False):
+    # shared=True writes subtrees that occur more than once (by identity) only once
+    encoder = ASTEncoder(shared_node_counts(statements) if shared else None)
+    for statement in statements:
+        encoder.add(statement)
+    return encoder.tobytes()
+
+def decode_ast(data, shared=False):
+    # shared=True for the encoding of a hash-consed AST: equal leaves become one node
+    # too, so the statements come back hash-consed
+    view = memoryview(data)
+    magic, version, string_count, float_count, word_count, statement_count = ast_file_header.unpack_from(view, 0)
+    if magic != ast_file_magic or version not in ast_file_versions:
+        raise ValueError("Not a binary AST file")
+    offset = ast_file_header.size
+    strings = []
+    for _ in range(string_count):
+        (length,) = token_file_length.unpack_from(view, offset)
+        offset += token_file_length.size
+        strings.append(str(view[offset:offset + length], 'utf-8'))
+        offset += length
+    floats = array('d')
+    floats.frombytes(view[offset:offset + 8 * float_count])
+    offset += 8 * float_count
+    words = array('I')
+    words.frombytes(view[offset:offset + 4 * word_count])
+    if sys.byteorder == "big":
+        floats.byteswap()
+        words.byteswap()
+    # tuples are windows on the float block itself
+    column = NumberColumn(floats)
+
+    stack = []
+    slots = []
+    leaves = SharedLeaves() if shared else None
+    break_node = BreakNode() if shared else None
+    push = stack.append
+    i = 0
+    while i < word_count:
+        tag = words[i]
+        if leaves is not None and tag in ast_leaf_classes:
+            word = words[i + 1]
+            push(leaves[tag, floats[word] if tag == AST_NUMBER else strings[word]])
+            i += 2
+        elif tag == AST_NUMBER:
+            push(NumberNode(floats[words[i + 1]]))
+            i += 2
+        elif tag == AST_ID:
+            push(IDNode(strings[words[i + 1]]))
+            i += 2
+        elif tag == AST_TUPLE:
+            start = words[i + 1]
+            push(TupleNode(NumberArray(column, start, start + words[i + 2])))
+            i += 3
+        elif tag == AST_PROP:
+            value = stack.pop()
+            stack[-1] = PropNode(stack[-1], value)
+            i += 1
+        elif tag == AST_BINOP:
+            right = stack.pop()
+            stack[-1] = BinOpNode(stack[-1], token_kinds[strings[words[i + 1]]], right)
+            i += 2
+        elif tag == AST_ASSIGN:
+            expression = stack.pop()
+            stack[-1] = AssignNode(stack[-1], expression)
+            i += 1
+        elif tag == AST_REGISTER_OP:
+            count = words[i + 2]
+            props = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            stack[-1] = RegisterOpNode(strings[words[i + 1]], stack[-1], props)
+            i += 3
+        elif tag == AST_WHILE:
+            count = words[i + 1]
+            statements = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            stack[-1] = WhileNode(stack[-1], statements)
+            i += 2
+        elif tag == AST_IF:
+            true_count = words[i + 1]
+            count = true_count + words[i + 2]
+            branches = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            stack[-1] = IfNode(stack[-1], branches[:true_count], branches[true_count:])
+            i += 3
+        elif tag == AST_BREAK:
+            push(BreakNode() if break_node is None else break_node)
+            i += 1
+        elif tag == AST_KEYWORD:
+            push(KeyWordNode(strings[words[i + 1]]))
+            i += 2
+        elif tag == AST_VAR:
+            push(VarNode(strings[words[i + 1]]))
+            i += 2
+        elif tag == AST_SHARE:
+            slots.append(stack[-1])
+            i += 1
+        elif tag == AST_REF:
+            push(slots[words[i + 1]])
+            i += 2
+        else:
+            raise ValueError(f"Unknown AST record tag {tag}")
+    if len(stack) != statement_count:
+        raise ValueError("Corrupt binary AST file")
+    return stack
+
+def load_ast_bin(file_path):
+    with open(file_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return decode_ast(buffer)
+
+def write_ast_json(nodes, out_file):
+    # one statement per line inside a JSON list, written as the statements arrive
+    out_file.write("[")
+    separator = "\n"
+    for node in nodes:
+        out_file.write(separator)
+        json.dump(node.to_dict(), out_file, separators=(",", ":"))
+        separator = ",\n"
+    out_file.write("\n]\n")
+
+def load_ast_json(file_path):
+    with open(file_path, 'r') as file:
+        return [ASTNode.from_dict(data) for data in json.load(file)]
+
+output_formats = ("text", "json", "bin")
+output_extensions = {"text": ".ast.txt", "json": ".ast.json", "bin": ".ast.bin"}
+
+def write_output(nodes, out_file, output_format="text", shared=False):
+    # text and json go to a text file, bin to a binary file; shared writes the shared
+    # subtrees of a hash-consed AST once in the binary format
+    if active_profile is not None:
+        active_profile.write_output(emit_output, nodes, out_file, output_format, shared)
+    else:
+        emit_output(nodes, out_file, output_format, shared)
+
+def emit_output(nodes, out_file, output_format, shared=False):
+    if output_format == "json":
+        write_ast_json(nodes, out_file)
+    elif output_format == "bin":
+        if shared:
+            out_file.write(encode_ast(list(nodes), shared))
+        else:
+            encoder = ASTEncoder()
+            for node in nodes:
+                encoder.add(node)
+            out_file.write(encoder.tobytes())
+    else:
+        write_ast(nodes, out_file)
+
+###### AST cache
+### bump when the grammar or the node classes change, old cache entries are then never hit
+parser_version = "tph-ast-3"
+default_cache_dir = ".tph_cache"
+default_cache_bytes = 256 * 1024 * 1024
+### ASTs whose encoding grows past this share of the budget are not cached
+cache_entry_share = 8
+
+class ASTCache:
+    # content-addressed cache of parsed statements in the binary AST format: an entry is named by a hash of the
+    # parser version and the input bytes, entries are written atomically so several
+    # processes can share a directory, and least recently used entries are evicted
+    # once the directory grows past max_bytes
+    def __init__(self, cache_dir=default_cache_dir, max_bytes=default_cache_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // cache_entry_share
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def key(self, input_path, shared=False):
+        # hash-consed entries have keys of their own, so a hit is shared exactly when asked
+        digest = hashlib.sha256(parser_version.encode())
+        digest.update(b"source\0" if input_path.endswith(".hl") else b"tokens\0")
+        if shared:
+            digest.update(b"shared\0")
+        with open(input_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".ast")
+
+    def get(self, key, shared=False):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            # the modification time is the recency used for eviction
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_ast(data, shared)
+
+    def put(self, key, statements, shared=False):
+        self.write(key, encode_ast(statements, shared))
+
+    def write(self, key, data):
+        if len(data) > self.max_entry_bytes:
+            return
+        path = self.entry_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.writes += 1
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.entries())
+        else:
+            self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        # (mtime, size, path) of every entry in the cache directory
+        entries = []
+        for directory, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if file_name.endswith(".ast"):
+                    path = os.path.join(directory, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        # drop the least recently used entries down to 90% of the budget,
+        # so the directory isn't rescanned on every write near the limit
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 9 // 10
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+    def parse(self, input_path, recover=False, engine="rd", share=False):
+        # cached equivalent of start_parse without a cache, returns (statements, errors):
+        # a list on a hit, on a miss a generator that parses, yields and encodes one
+        # statement at a time and stores the entry at the end. Only ASTs without errors
+        # and below max_entry_bytes are stored. With share the statements are
+        # hash-consed (tph_hashcons.py) and stored with their sharing, which decode_ast
+        # restores on a hit, so a hit is not hash-consed again; the NodeTable keeps every
+        # node alive anyway, so a miss is collected into a list first.
+        key = self.key(input_path, share)
+        statements = self.get(key, share)
+        if statements is not None:
+            return statements, []
+        parser = make_parser(iter_tokens(input_path), recover, engine, cache_dir=self.cache_dir)
+        if share:
+            from tph_hashcons import share_iter
+            statements = list(share_iter(parser.parse_iter()))
+            if not parser.errors:
+                self.put(key, statements, share)
+            return statements, parser.errors
+        return self.stored_statements(key, parser), parser.errors
+
+    def stored_statements(self, key, parser):
+        # the statements of parser, encoded as they pass; the encoding is dropped as
+        # soon as it grows past max_entry_bytes
+        encoder = ASTEncoder()
+        for statement in parser.parse_iter():
+            if encoder is not None:
+                encoder.add(statement)
+                if encoder.size() > self.max_entry_bytes:
+                    encoder = None
+            yield statement
+        if encoder is not None and not parser.errors:
+            self.write(key, encoder.tobytes())
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evictions": self.evictions}
+
+### one cache object per (directory, budget) and process, used by batch workers
+open_caches = {}
+
+def get_cache(cache_options):
+    if cache_options not in open_caches:
+        open_caches[cache_options] = ASTCache(*cache_options)
+    return open_caches[cache_options]
+
+def start_parse(input_path, recover=False, cache=None, engine="rd", share=False):
+    # (statements, errors) for a file: a list from the cache, or a generator that parses
+    # while it is consumed and appends to errors in recovery mode. With share the
+    # statements are hash-consed (see share_statements), once: cache entries are stored
+    # that way and come back shared
+    if cache is not None:
+        if active_profile is not None:
+            return active_profile.cached_parse(cache, input_path, recover, engine, share)
+        return cache.parse(input_path, recover, engine, share)
+    parser = make_parser(iter_tokens(input_path), recover, engine)
+    statements = parser.parse_iter()
+    if share:
+        statements = share_statements(statements)
+    if active_profile is not None:
+        return active_profile.counted_statements(statements), parser.errors
+    return statements, parser.errors
+
+def locate_errors(errors, source_path=None, binary=False, source=None):
+    # add line and column to the ParseErrors with a source offset. The source is only
+    # read when one has: source_path as bytes for the offsets of `scanner -p`, as text
+    # for the in-process lexer, or the source text itself
+    located = [error for error in errors if isinstance(error, ParseError) and error.source_offset is not None]
+    if not located:
+        return
+    if source is None:
+        if source_path is None:
+            return
+        try:
+            with open(source_path, 'rb' if binary else 'r') as source_file:
+                source = source_file.read()
+        except OSError:
+            return
+    lines = LineIndex(source)
+    for error in located:
+        error.locate(lines)
+
+def share_statements(statements):
+    # hash-cons a stream of statements, identical subtrees become one shared node
+    from tph_hashcons import share_iter
+    return share_iter(statements)
+
+###### batch mode
+batch_input_extensions = (".hl", ".tok", ".txt")
+glob_magic = re.compile(r"[*?[]")
+
+def glob_root(pattern):
+    # the leading directories of a glob pattern that contain no wildcard
+    parts = []
+    for part in pattern.split(os.sep):
+        if glob_magic.search(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+def collect_inputs(paths):
+    # expand directories (recursively), globs and @list files into (root, path) pairs,
+    # root is the directory the output tree mirrors
+    inputs = []
+    for path in paths:
+        if path.startswith("@"):
+            with open(path[1:], 'r') as list_file:
+                listed = [line.strip() for line in list_file if line.strip()]
+            inputs.extend(collect_inputs(listed))
+        elif os.path.isdir(path):
+            for directory, _, file_names in sorted(os.walk(path)):
+                for file_name in sorted(file_names):
+                    if file_name.endswith(batch_input_extensions):
+                        inputs.append((path, os.path.join(directory, file_name)))
+        elif glob_magic.search(path):
+            root = glob_root(path)
+            for match in sorted(glob.glob(path, recursive=True)):
+                if os.path.isfile(match):
+                    inputs.append((root, match))
+        else:
+            inputs.append((os.path.dirname(path) or ".", path))
+    return inputs
+
+def batch_output_path(root, input_path, output_dir, output_format="text"):
+    relative = os.path.relpath(input_path, root)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + output_extensions[output_format])
+
+def parse_to_file(input_path, output_path, cache_options=None, output_format="text", recover=False,
+                  engine="rd", optimize=False, share=False):
+    # parse one file into output_path, returns (input_path, ok, message, cache hit),
+    # cache_options is None or (cache directory, byte budget). Failed outputs are removed
+    # unless recover is set, then they hold the partial AST.
+    cache = get_cache(cache_options) if cache_options is not None else None
+    hits = cache.hits if cache is not None else 0
+    errors = []
+    try:
+        # the optimizer builds new nodes, its output is what gets hash-consed then
+        statements, errors = start_parse(input_path, recover, cache, engine, share and not optimize)
+        if optimize:
+            from tph_optimize import optimize_iter
+            statements = optimize_iter(statements)
+            if share:
+                statements = share_statements(statements)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, 'wb' if output_format == "bin" else 'w') as out_file:
+            write_output(statements, out_file, output_format, share)
+    except ParseError as error:
+        errors.append(error)
+    except Exception as exception:
+        errors.append(f"{type(exception).__name__}: {exception}")
+        recover = False
+    hit = cache is not None and cache.hits > hits
+    if not errors:
+        return input_path, True, "", hit
+    if input_path.endswith(".hl"):
+        locate_errors(errors, input_path)
+    if not recover and os.path.exists(output_path):
+        os.remove(output_path)
+    return input_path, False, "; ".join(str(error) for error in errors), hit
+
+def parse_chunk(jobs, cache_options=None, output_format="text", recover=False, engine="rd", optimize=False,
+                share=False):
+    return [parse_to_file(input_path, output_path, cache_options, output_format, recover, engine, optimize,
+                          share)
+            for input_path, output_path in jobs]
+
+def run_batch(paths, output_dir, workers=None, chunk_size=None, report=print, cache_options=None,
+              output_format="text", recover=False, engine="rd", optimize=False, share=False):
+    # parse many files over a process pool, returns the number of failed files
+    jobs = [(input_path, batch_output_path(root, input_path, output_dir, output_format))
+            for root, input_path in collect_inputs(paths)]
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(jobs) // (workers * 4)))
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    failed = 0
+    hits = 0
+    def record(results):
+        nonlocal failed, hits
+        for input_path, ok, message, hit in results:
+            hits += hit
+            if ok:
+                report(f"ok    {input_path}")
+            else:
+                failed += 1
+                report(f"FAIL  {input_path}: {message}")
+
+    if workers == 1:
+        for chunk in chunks:
+            record(parse_chunk(chunk, cache_options, output_format, recover, engine, optimize, share))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(parse_chunk, chunk, cache_options, output_format, recover, engine,
+                                       optimize, share)
+                       for chunk in chunks]
+            for future in as_completed(futures):
+                record(future.result())
+    report(f"{len(jobs)} files, {len(jobs) - failed} ok, {failed} failed")
+    if cache_options is not None:
+        report(f"cache: {hits} hits, {len(jobs) - hits} misses")
+    return failed
+
+###### pipelined scanning
+# --pipeline runs ./scanner on every .hl input as an asyncio subprocess and parses its
+# stdout while the scanner is still writing it, nothing but the ASTs touches the disk.
+# At most `jobs` scanners run at once. Each stream goes through a bounded queue to a
+# parser thread, so a slow parser pauses the reads of its scanner (and the pipe then
+# pauses the scanner) instead of buffering the whole token stream. Scanners are C++
+# processes, so scanning overlaps with parsing both across files and within a file.
+pipeline_chunk_bytes = 1 << 16
+pipeline_queue_chunks = 8
+### printed by every scanner run without -o
+scanner_stdout_notice = "output file not specified, use stdout as default"
+
+def pipeline_inputs(paths):
+    # (root, path) of the .hl sources among the inputs
+    return [(root, path) for root, path in collect_inputs(paths) if path.endswith(".hl")]
+
+async def scan_into(process, queue):
+    # stdout of a scanner process to queue as lists of complete lines, None at the end
+    import asyncio
+    tail = b""
+    try:
+        while True:
+            chunk = await process.stdout.read(pipeline_chunk_bytes)
+            if not chunk:
+                break
+            complete, newline, tail = (tail + chunk).rpartition(b"\n")
+            if newline:
+                await queue.put((complete + newline).decode('utf-8').splitlines(True))
+        if tail:
+            await queue.put([tail.decode('utf-8') + "\n"])
+    except asyncio.CancelledError:
+        # the parser stopped early and reads nothing more
+        raise
+    except BaseException:
+        await queue.put(None)
+        raise
+    await queue.put(None)
+
+def queued_lines(queue, loop):
+    # lines from the queue of scan_into, read from a worker thread
+    import asyncio
+    while True:
+        lines = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+        if lines is None:
+            return
+        yield from lines
+
+def parse_lines_to_file(lines, output_path, output_format="text", recover=False, engine="rd", optimize=False,
+                        share=False):
+    # parse_to_file for scanner output lines, returns the list of errors
+    errors = []
+    try:
+        parser = make_parser(iter_token_lines(lines), recover, engine)
+        errors = parser.errors
+        statements = parser.parse_iter()
+        if optimize:
+            from tph_optimize import optimize_iter
+            statements = optimize_iter(statements)
+        if share:
+            statements = share_statements(statements)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, 'wb' if output_format == "bin" else 'w') as out_file:
+            write_output(statements, out_file, output_format, share)
+    except ParseError as error:
+        errors.append(error)
+    except Exception as exception:
+        errors.append(f"{type(exception).__name__}: {exception}")
+    return errors
+
+async def pipeline_file(input_path, output_path, slots, executor, scanner, options):
+    # scan and parse one file, returns (input_path, ok, message); options are the
+    # arguments of parse_lines_to_file after output_path
+    import asyncio
+    async with slots:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                scanner, "-p", input_path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except OSError as error:
+            return input_path, False, f"cannot run {scanner}: {error}"
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(pipeline_queue_chunks)
+        reading = asyncio.ensure_future(scan_into(process, queue))
+        warnings = asyncio.ensure_future(process.stderr.read())
+        errors = await loop.run_in_executor(executor, parse_lines_to_file, queued_lines(queue, loop),
+                                            output_path, *options)
+        stopped = not reading.done()
+        if stopped:
+            # the parser gave up before the end of the stream
+            reading.cancel()
+            process.kill()
+        (read_error,) = await asyncio.gather(reading, return_exceptions=True)
+        if stopped:
+            # wait() returns once stdout is at EOF, drain what the killed scanner left
+            await process.stdout.read()
+        status = await process.wait()
+        locate_errors(errors, input_path, binary=True)
+        errors = [str(error) for error in errors]
+        if isinstance(read_error, Exception):
+            errors.append(f"reading scanner output: {read_error}")
+        if not stopped and status != 0:
+            errors.append(f"scanner exited with status {status}")
+        for line in (await warnings).decode('utf-8', 'replace').splitlines():
+            if line and line != scanner_stdout_notice:
+                print(f"{input_path}: {line}", file=sys.stderr)
+    recover = options[1]
+    if errors and not recover and os.path.exists(output_path):
+        os.remove(output_path)
+    return input_path, not errors, "; ".join(errors)
+
+async def run_pipeline_async(jobs, workers, scanner, options, record):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    slots = asyncio.Semaphore(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tasks = [asyncio.ensure_future(pipeline_file(input_path, output_path, slots, executor, scanner, options))
+                 for input_path, output_path in jobs]
+        for task in asyncio.as_completed(tasks):
+            record(await task)
+
+def run_pipeline(paths, output_dir, workers=None, report=print, output_format="text", recover=False,
+                 engine="rd", optimize=False, share=False, scanner="./scanner"):
+    # scan and parse .hl files through scanner subprocesses, returns the number of failed files
+    import asyncio
+    jobs = [(input_path, batch_output_path(root, input_path, output_dir, output_format))
+            for root, input_path in pipeline_inputs(paths)]
+    failed = 0
+    def record(result):
+        nonlocal failed
+        input_path, ok, message = result
+        if ok:
+            report(f"ok    {input_path}")
+        else:
+            failed += 1
+            report(f"FAIL  {input_path}: {message}")
+
+    options = (output_format, recover, engine, optimize, share)
+    asyncio.run(run_pipeline_async(jobs, workers or os.cpu_count() or 1, scanner, options, record))
+    report(f"{len(jobs)} files, {len(jobs) - failed} ok, {failed} failed")
+    return failed
+
+def main(argv=None):
     arg_parse = argparse.ArgumentParser(description="A simple argument parser example")
 
     ####### using parser
-    arg_parse.add_argument("-o", "--output", type=str, help="Output file name")
-    arg_parse.add_argument("filename", nargs="?", type=str, help="Input file")
+    arg_parse.add_argument("-o", "--output", type=str, help="Output file name (output directory with --batch)")
+    arg_parse.add_argument("filename", nargs="*", type=str,
+                           help="Input token file or .hl source (directories, globs or @list files with --batch)")
+    arg_parse.add_argument("--batch", action="store_true", help="Parse many files, writing a mirrored output tree")
+    arg_parse.add_argument("-j", "--jobs", type=int,
+                           help="Number of worker processes for --batch (implies --batch) or --serve, "
+                                "scanners in flight for --pipeline")
+    arg_parse.add_argument("--pipeline", action="store_true",
+                           help="Scan .hl inputs with --scanner subprocesses and parse their output as it "
+                                "arrives, -j scanners at a time, outputs like --batch")
+    arg_parse.add_argument("--scanner", type=str, default="./scanner", help="Scanner executable for --pipeline")
+    arg_parse.add_argument("--source", type=str,
+                           help="Source of a token file written by `scanner -p`, for the line and column of errors")
+    arg_parse.add_argument("--format", choices=output_formats, default="text",
+                           help="AST output format: indented text, JSON, or the binary AST format")
+    arg_parse.add_argument("--recover", action="store_true",
+                           help="Report every syntax error and keep the partial AST instead of stopping at the first")
+    arg_parse.add_argument("--engine", choices=parser_engines, default="rd",
+                           help="Parsing engine: recursive descent or the table-driven LL(1) parser")
+    arg_parse.add_argument("--optimize", action="store_true",
+                           help="Fold constants and remove dead branches and loops before output, "
+                                "the report goes to stderr")
+    arg_parse.add_argument("--hash-cons", action="store_true",
+                           help="Share identical subtrees, written once in the binary format and the cache")
+    arg_parse.add_argument("--index", type=str,
+                           help="Write a query index of the AST (tph_index.py) to this JSON file")
+    arg_parse.add_argument("--profile", action="store_true",
+                           help="Print time per phase, production counts, node counts and output size to stderr")
+    arg_parse.add_argument("--profile-format", choices=("table", "json"), default="table",
+                           help="Report format of --profile")
+    arg_parse.add_argument("--serve", action="store_true",
+                           help="Keep running and answer JSON-lines requests from stdin (or --socket), see tph_server.py")
+    arg_parse.add_argument("--socket", type=str, help="Unix socket path for --serve")
+    arg_parse.add_argument("--cache", action="store_true",
+                           help="Read and write the AST cache (parsed inputs are stored in --cache-dir)")
+    arg_parse.add_argument("--no-cache", action="store_true", help="Don't use the AST cache (the default)")
+    arg_parse.add_argument("--cache-dir", type=str, default=default_cache_dir, help="AST cache directory")
+    arg_parse.add_argument("--cache-size", type=int, default=default_cache_bytes // (1024 * 1024),
+                           help="AST cache budget in MB")
 
-    input_file_name = arg_parse.parse_args().filename
-    output_file_name = arg_parse.parse_args().output
+    args = arg_parse.parse_args(argv)
+    if args.recover and args.engine == "ll1":
+        arg_parse.error("--recover needs the rd engine")
+    output_file_name = args.output
+    cache_options = (args.cache_dir, args.cache_size * 1024 * 1024) if args.cache and not args.no_cache else None
 
-    if input_file_name is None:
-        input_file_name = "simple1.txt"
-    
-    my_tokens= parse_file(input_file_name)
+    if args.serve:
+        from tph_server import serve
+        serve(args.socket, args.jobs, cache_options)
+        return
 
-    # read tokens and parse
-    parser = Parser(my_tokens)
-    ast = parser.parse()
+    if args.pipeline:
+        if not args.filename:
+            arg_parse.error("--pipeline needs at least one input")
+        if args.profile or args.index:
+            arg_parse.error("--profile and --index work on a single input")
+        failed = run_pipeline(args.filename, output_file_name or "ast_outputs", args.jobs,
+                              output_format=args.format, recover=args.recover, engine=args.engine,
+                              optimize=args.optimize, share=args.hash_cons, scanner=args.scanner)
+        sys.exit(1 if failed else 0)
+
+    if args.batch or args.jobs is not None:
+        if not args.filename:
+            arg_parse.error("--batch needs at least one input")
+        if args.profile or args.index:
+            arg_parse.error("--profile and --index work on a single input")
+        failed = run_batch(args.filename, output_file_name or "ast_outputs", args.jobs,
+                           cache_options=cache_options, output_format=args.format, recover=args.recover,
+                           engine=args.engine, optimize=args.optimize, share=args.hash_cons)
+        sys.exit(1 if failed else 0)
+
+    if len(args.filename) > 1:
+        arg_parse.error("multiple inputs need --batch")
+    input_file_name = args.filename[0] if args.filename else "simple1.txt"
     
-    # print the AST
-    if output_file_name is not None:
-        with open(output_file_name, 'w') as out_file:
-            for node in ast:
-                node.output_parse(0, out_file)
-                out_file.write("\n")
+    # stream tokens into the parser and print each statement as soon as it is parsed,
+    # or take the whole AST from the cache
+    cache = get_cache(cache_options) if cache_options is not None else None
+    profile = None
+    if args.profile:
+        from tph_profile import profile_parse
+        profile = profile_parse()
+    optimize_report = None
+    index = None
+    errors = []
+    with profile or nullcontext():
+        try:
+            # hash-consed once: by start_parse, or after the optimizer, which builds new nodes
+            statements, errors = start_parse(input_file_name, args.recover, cache, args.engine,
+                                             args.hash_cons and not args.optimize)
+            if args.optimize:
+                from tph_optimize import OptimizeReport, optimize_iter
+                optimize_report = OptimizeReport()
+                statements = optimize_iter(statements, optimize_report)
+                if args.hash_cons:
+                    statements = share_statements(statements)
+            if args.index:
+                from tph_index import ASTIndex, index_iter
+                index = ASTIndex()
+                statements = index_iter(statements, index)
+
+            # print the AST
+            if output_file_name is not None:
+                with open(output_file_name, 'wb' if args.format == "bin" else 'w') as out_file:
+                    write_output(statements, out_file, args.format, args.hash_cons)
+            elif args.format == "bin":
+                write_output(statements, sys.stdout.buffer, args.format, args.hash_cons)
+            else:
+                write_output(statements, sys.stdout, args.format)
+        except (OSError, ParseError) as error:
+            errors.append(error)
+
+    sys.stdout.flush()
+    if index is not None:
+        from tph_index import write_index
+        with open(args.index, 'w') as index_file:
+            write_index(index, index_file)
+    if optimize_report is not None:
+        optimize_report.print()
+    if profile is not None:
+        if args.profile_format == "json":
+            profile.print_json()
+        else:
+            profile.print_table()
+
+    # diagnostics go to stderr after the (partial) AST
+    if input_file_name.endswith(".hl"):
+        locate_errors(errors, input_file_name)
     else:
-        for node in ast:
-            node.print_parse(0)
-            print("")
+        locate_errors(errors, args.source, binary=True)
+    for error in errors:
+        print(error, file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    # run through the importable module so batch workers and cached ASTs use tph_parser classes
+    import tph_parser
+    tph_parser.main()
+
@@ -0,0 +1,237 @@
+# Opt-in instrumentation of the parsing pipeline
+#
+#   with profile_parse() as profile:
+#       statements, errors = start_parse("input.hl")
+#       write_output(statements, out_file)
+#   profile.print_table()
+#
+# While a Profile is active tph_parser.active_profile points to it and make_parser,
+# start_parse and write_output report to it; otherwise they only test that one
+# global per file, so the pipeline keeps its speed with profiling off.
+#
+# Phase times are exclusive, the time spent pulling tokens while parsing is `load` and
+# not `parse`, the time spent parsing while the AST is written is not `emit`:
+#   load   reading and decoding tokens
+#   parse  Parser / LL1Parser work
+#   emit   writing the AST in the output format
+#   cache  AST cache lookups, decoding and storing
+# Productions count calls, consumed tokens and seconds of every parse_* method of the
+# recursive-descent Parser, including the productions they call.
+# Nodes are counted per class as they pass; the numbers of a packed tuple are one
+# NumberArray, not a NumberNode each. max_statement_nodes is the node count of the
+# largest top-level statement.
+
+import json
+import sys
+import time
+
+import tph_parser
+from tph_arena import node_fields
+from tph_parser import NumberArray, NumberNode, Parser, TupleNode, token_buffers
+
+profile_phases = ("load", "parse", "emit", "cache")
+
+class CountingFile:
+    # passes writes through and counts the characters (bytes for binary files)
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self.out_file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.out_file, name)
+
+class Profile:
+    def __init__(self):
+        self.seconds = dict.fromkeys(profile_phases, 0.0)
+        self.wall = 0.0
+        self.tokens = 0
+        self.statements = 0
+        self.bytes_written = 0
+        # production name -> [calls, tokens, seconds]
+        self.productions = {}
+        self.nodes = {}
+        self.max_statement_nodes = {}
+        self.stack = []
+        self.mark = 0.0
+        self.parser_class = self.profiled_parser_class()
+
+    ### exclusive phase timers, the phase on top of the stack is charged
+    def push(self, phase):
+        now = time.perf_counter()
+        if self.stack:
+            self.seconds[self.stack[-1]] += now - self.mark
+        self.stack.append(phase)
+        self.mark = now
+
+    def pop(self):
+        now = time.perf_counter()
+        self.seconds[self.stack.pop()] += now - self.mark
+        self.mark = now
+
+    def __enter__(self):
+        self.previous = tph_parser.active_profile
+        tph_parser.active_profile = self
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall += time.perf_counter() - self.started
+        tph_parser.active_profile = self.previous
+        return False
+
+    ###### hooks called by tph_parser
+    def profiled_parser_class(self):
+        # a Parser subclass whose parse_* productions update self.productions
+        def wrap(name, method):
+            stats = self.productions.setdefault(name, [0, 0, 0.0])
+            def production(parser, *args):
+                start_pos = parser.pos
+                start = time.perf_counter()
+                try:
+                    return method(parser, *args)
+                finally:
+                    stats[0] += 1
+                    stats[1] += parser.pos - start_pos
+                    stats[2] += time.perf_counter() - start
+            return production
+
+        methods = {name: wrap(name, method) for name, method in vars(Parser).items()
+                   if name.startswith("parse_") and name != "parse_iter" and callable(method)}
+        return type("ProfiledParser", (Parser,), methods)
+
+    def make_parser(self, tokens, recover, engine, cache_dir):
+        tokens = self.timed_tokens(tokens)
+        if engine == "ll1":
+            from tph_ll1 import LL1Parser
+            parser = LL1Parser(tokens, cache_dir=cache_dir)
+        else:
+            parser = self.parser_class(tokens, recover)
+        parser.parse_iter = self.timed_statements(parser.parse_iter)
+        return parser
+
+    def timed_tokens(self, tokens):
+        # TokenBuffer chunks, the time to read and decode each one is `load`
+        chunks = token_buffers(tokens)
+        while True:
+            self.push("load")
+            try:
+                chunk = next(chunks, None)
+            finally:
+                self.pop()
+            if chunk is None:
+                return
+            self.tokens += len(chunk)
+            yield chunk
+
+    def timed_statements(self, parse_iter):
+        def statements():
+            steps = parse_iter()
+            while True:
+                self.push("parse")
+                try:
+                    statement = next(steps, None)
+                finally:
+                    self.pop()
+                if statement is None:
+                    return
+                yield statement
+        return statements
+
+    def cached_parse(self, cache, input_path, recover, engine, share):
+        # a hit (or a hash-consed miss) is a whole list, so all of its nodes are held at
+        # once; other misses are streamed
+        self.push("cache")
+        try:
+            statements, errors = cache.parse(input_path, recover, engine, share)
+        finally:
+            self.pop()
+        if type(statements) is list:
+            self.count_nodes(statements)
+            return statements, errors
+        return self.counted_statements(statements), errors
+
+    def counted_statements(self, statements):
+        for statement in statements:
+            self.count_nodes([statement])
+            yield statement
+
+    def write_output(self, write, nodes, out_file, output_format, shared):
+        out_file = CountingFile(out_file)
+        self.push("emit")
+        try:
+            write(nodes, out_file, output_format, shared)
+        finally:
+            self.pop()
+            self.bytes_written += out_file.written
+
+    ###### node counts
+    def count_nodes(self, statements):
+        # counts by class, and the counts of the largest statement
+        largest = sum(self.max_statement_nodes.values())
+        for statement in statements:
+            self.statements += 1
+            counts = {}
+            stack = [statement]
+            while stack:
+                node = stack.pop()
+                cls = type(node)
+                if cls is TupleNode and type(node.values) is NumberArray:
+                    counts["TupleNode"] = counts.get("TupleNode", 0) + 1
+                    counts["NumberArray"] = counts.get("NumberArray", 0) + 1
+                    continue
+                name = cls.__name__
+                counts[name] = counts.get(name, 0) + 1
+                if cls is not NumberNode:
+                    stack.extend(node_fields(node)[1])
+            for name, count in counts.items():
+                self.nodes[name] = self.nodes.get(name, 0) + count
+            total = sum(counts.values())
+            if total > largest:
+                largest = total
+                self.max_statement_nodes = counts
+
+    ###### reports
+    def to_dict(self):
+        return {
+            "wall_seconds": self.wall,
+            "phase_seconds": dict(self.seconds),
+            "tokens": self.tokens,
+            "statements": self.statements,
+            "bytes_written": self.bytes_written,
+            "productions": {name: {"calls": calls, "tokens": tokens, "seconds": seconds}
+                            for name, (calls, tokens, seconds) in self.productions.items() if calls},
+            "nodes": dict(self.nodes),
+            "max_statement_nodes": dict(self.max_statement_nodes),
+        }
+
+    def print_json(self, out_file=sys.stderr):
+        json.dump(self.to_dict(), out_file, indent=2)
+        out_file.write("\n")
+
+    def print_table(self, out_file=sys.stderr):
+        def line(text=""):
+            out_file.write(text + "\n")
+        line(f"wall {self.wall * 1e3:.2f} ms, {self.tokens} tokens, {self.statements} statements, "
+             f"{self.bytes_written} bytes written")
+        line(f"{'phase':12} {'ms':>10}")
+        for phase in profile_phases:
+            line(f"{phase:12} {self.seconds[phase] * 1e3:10.2f}")
+        productions = sorted(((name, stats) for name, stats in self.productions.items() if stats[0]),
+                             key=lambda item: -item[1][2])
+        if productions:
+            line()
+            line(f"{'production':26} {'calls':>9} {'tokens':>10} {'ms':>10}")
+            for name, (calls, tokens, seconds) in productions:
+                line(f"{name:26} {calls:9} {tokens:10} {seconds * 1e3:10.2f}")
+        if self.nodes:
+            line()
+            line(f"{'node class':16} {'nodes':>10} {'max stmt':>10}")
+            for name in sorted(self.nodes, key=lambda name: -self.nodes[name]):
+                line(f"{name:16} {self.nodes[name]:10} {self.max_statement_nodes.get(name, 0):10}")
+
+def profile_parse():
+    return Profile()
@@ -0,0 +1,163 @@
+# Persistent parser process, started with `tph_parser.py --serve`
+#
+# Requests and responses are JSON objects, one per line, read from stdin (answers on
+# stdout, in completion order) or from the connections of a Unix socket (--socket,
+# answers in request order per connection). A request is
+#   {"id": 1, "path": "input.hl"}                or  {"id": 1, "source": "register_op ..."}
+# with the optional fields "format" (text / json / bin), "recover" and "engine", and
+# the answer is
+#   {"id": 1, "ok": true, "ast": "...", "errors": []}
+# where a bin AST is base64 encoded ("encoding": "base64"). {"op": "ping"} answers
+# {"ok": true}, {"op": "shutdown"} stops a socket server. Requests are parsed by a pool
+# of warm worker processes, so concurrent clients are served in parallel.
+# tph_client.py is the matching client.
+
+import base64
+import io
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from tph_parser import (
+    ParseError, get_cache, locate_errors, make_parser, output_formats, parser_engines, start_parse,
+    tokenize_source, write_output
+)
+
+def handle_request(request, cache_options=None):
+    # parse one request into its response, runs in a worker process
+    response = {"id": request.get("id")}
+    output_format = request.get("format", "text")
+    recover = bool(request.get("recover", False))
+    engine = request.get("engine", "rd")
+    errors = []
+    try:
+        if output_format not in output_formats:
+            raise ValueError(f"Unknown format: {output_format}")
+        if engine not in parser_engines:
+            raise ValueError(f"Unknown engine: {engine}")
+        if "source" in request:
+            cache_dir = cache_options[0] if cache_options is not None else None
+            parser = make_parser(tokenize_source(request["source"]), recover, engine, cache_dir=cache_dir)
+            statements, errors = parser.parse_iter(), parser.errors
+        elif "path" in request:
+            cache = get_cache(cache_options) if cache_options is not None else None
+            statements, errors = start_parse(request["path"], recover, cache, engine)
+        else:
+            raise ValueError("Request needs a 'path' or a 'source'")
+        out_file = io.BytesIO() if output_format == "bin" else io.StringIO()
+        try:
+            write_output(statements, out_file, output_format)
+        except ParseError as error:
+            errors.append(error)
+        if output_format == "bin":
+            response["ast"] = base64.b64encode(out_file.getvalue()).decode("ascii")
+            response["encoding"] = "base64"
+        else:
+            response["ast"] = out_file.getvalue()
+    except ParseError as error:
+        errors.append(error)
+    except Exception as exception:
+        errors.append(f"{type(exception).__name__}: {exception}")
+    if "source" in request:
+        locate_errors(errors, source=request["source"])
+    elif str(request.get("path")).endswith(".hl"):
+        locate_errors(errors, request["path"])
+    response["ok"] = not errors
+    response["errors"] = [str(error) for error in errors]
+    return response
+
+def decode_request(line):
+    # (request, None) or (None, error response) for a line that is not a JSON object
+    try:
+        request = json.loads(line)
+    except ValueError as exception:
+        return None, {"id": None, "ok": False, "errors": [f"Bad request: {exception}"]}
+    if not isinstance(request, dict):
+        return None, {"id": None, "ok": False, "errors": ["Bad request: expected a JSON object"]}
+    return request, None
+
+class ParseServer:
+    def __init__(self, workers=None, cache_options=None):
+        self.cache_options = cache_options
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+
+    def submit(self, request):
+        return self.executor.submit(handle_request, request, self.cache_options)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def serve_stdio(self, in_file=sys.stdin, out_file=sys.stdout):
+        # answers are written as soon as they are ready, so they can come out of order
+        lock = threading.Lock()
+        def answer(response):
+            with lock:
+                out_file.write(json.dumps(response) + "\n")
+                out_file.flush()
+
+        futures = []
+        for line in in_file:
+            if not line.strip():
+                continue
+            request, error = decode_request(line)
+            if error is not None:
+                answer(error)
+            elif request.get("op") == "ping":
+                answer({"id": request.get("id"), "ok": True})
+            elif request.get("op") == "shutdown":
+                break
+            else:
+                future = self.submit(request)
+                future.add_done_callback(lambda done: answer(done.result()))
+                futures.append(future)
+        for future in futures:
+            future.result()
+
+    def serve_socket(self, socket_path):
+        server_ref = self
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    request, response = decode_request(line)
+                    if request is not None:
+                        if request.get("op") == "ping":
+                            response = {"id": request.get("id"), "ok": True}
+                        elif request.get("op") == "shutdown":
+                            self.wfile.write(b'{"ok": true}\n')
+                            threading.Thread(target=self.server.shutdown).start()
+                            return
+                        else:
+                            response = server_ref.submit(request).result()
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        # a socket left behind by a previous server is replaced
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.remove(socket_path)
+        with Server(socket_path, Handler) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(socket_path)
+
+def serve(socket_path=None, workers=None, cache_options=None):
+    server = ParseServer(workers, cache_options)
+    try:
+        if socket_path is None:
+            server.serve_stdio()
+        else:
+            print(f"serving on {socket_path}", file=sys.stderr)
+            server.serve_socket(socket_path)
+    finally:
+        server.close()